@@ -0,0 +1,73 @@
+"""回测基准: 逐 K 线循环 + pandas vs 向量化回测内核
+
+对比在 10k/100k 根 K 线上运行 RSI/BOLL/KDJ 策略 (生成持仓信号并计算净值、回撤、胜率) 的耗时:
+
+- loop: 原实现，逐 K 线 Python 循环生成持仓，pandas 计算收益
+- vector: 信号数组 + 前向填充生成持仓，NumPy 计算收益
+
+    python -m benchmarks.bench_backtest
+    python -m benchmarks.bench_backtest --sizes 10000 100000 1000000 --repeat 1
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from mcp_aktools.shared.backtest import STRATEGIES, backtest_pandas, positions_loop, run_backtest, strategy_values
+from mcp_aktools.shared.kernels import indicator_block
+
+STATEFUL = ["RSI", "BOLL", "KDJ"]
+
+
+def fake_bars(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    close = 100 + rng.standard_normal(rows).cumsum() * 0.5
+    low = close - rng.random(rows)
+    high = close + rng.random(rows)
+    block, _ = indicator_block(close, low, high, ["DIF", "DEA", "KDJ.K", "KDJ.D", "RSI", "BOLL.U", "BOLL.L"])
+    return pd.DataFrame(block, columns=["dif", "dea", "kdj_k", "kdj_d", "rsi", "boll_u", "boll_l"]).assign(close=close)
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def with_loop(data: pd.DataFrame, key: str) -> None:
+    values = strategy_values(data, STRATEGIES[key])
+    backtest_pandas(data["close"], pd.Series(positions_loop(key, values), index=data.index))
+
+
+def with_vector(data: pd.DataFrame, key: str) -> None:
+    values = strategy_values(data, STRATEGIES[key])
+    run_backtest(values["close"], STRATEGIES[key].signal(values))
+
+
+def bench(rows: int, key: str, repeat: int) -> dict:
+    data = fake_bars(rows)
+    loop_ms = timed(lambda: with_loop(data, key), repeat)
+    vector_ms = timed(lambda: with_vector(data, key), repeat)
+    return {"bars": rows, "strategy": key, "loop_ms": loop_ms, "vector_ms": vector_ms, "speedup": loop_ms / vector_ms}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = [bench(size, key, args.repeat) for size in args.sizes for key in STATEFUL]
+    print(f"(最佳 {args.repeat} 次)")
+    print(pd.DataFrame(rows).round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
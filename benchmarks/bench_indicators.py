@@ -0,0 +1,95 @@
+"""技术指标基准: pandas ewm/rolling vs NumPy 内核 vs 增量计算
+
+对比在 1k/10k/100k 根 K 线上计算 MACD/KDJ/RSI/BOLL 并写入 DataFrame 的耗时:
+
+- pandas: 原 pandas 实现，逐列写入调用方 DataFrame
+- kernel: NumPy 内核一次写入 (安装 numba 时 EMA 递推使用编译循环)
+- append: 已有状态时追加 1 根新 K 线的增量计算
+
+    python -m benchmarks.bench_indicators
+    python -m benchmarks.bench_indicators --sizes 1000 10000 --repeat 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from mcp_aktools.shared import indicators, kernels
+from mcp_aktools.shared.indicators import COLUMNS, add_technical_indicators, compute_pandas
+
+
+def fake_bars(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    close = 100 + rng.standard_normal(rows).cumsum() * 0.5
+    return pd.DataFrame(
+        {
+            "日期": pd.date_range("2000-01-01", periods=rows, freq="min"),
+            "收盘": close,
+            "最高": close + rng.random(rows),
+            "最低": close - rng.random(rows),
+        }
+    )
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def with_pandas(df: pd.DataFrame) -> None:
+    out = compute_pandas(df["收盘"], df["最低"], df["最高"])
+    for col in COLUMNS:
+        df[col] = out[col]
+
+
+def with_kernel(df: pd.DataFrame) -> None:
+    add_technical_indicators(df, df["收盘"], df["最低"], df["最高"])
+
+
+def bench(rows: int, repeat: int) -> dict:
+    df = fake_bars(rows + 1)
+    head = df.iloc[:rows].copy()
+    pandas_ms = timed(lambda: with_pandas(head.copy()), repeat)
+    kernel_ms = timed(lambda: with_kernel(head.copy()), repeat)
+
+    def append():
+        indicators._STATES.clear()
+        add_technical_indicators(head, head["收盘"], head["最低"], head["最高"], key="bench", times=head["日期"])
+        frame = df.copy()
+        start = time.perf_counter()
+        add_technical_indicators(frame, frame["收盘"], frame["最低"], frame["最高"], key="bench", times=frame["日期"])
+        return time.perf_counter() - start
+
+    append_ms = min(append() for _ in range(repeat)) * 1000
+    return {
+        "bars": rows,
+        "pandas_ms": pandas_ms,
+        "kernel_ms": kernel_ms,
+        "speedup": pandas_ms / kernel_ms,
+        "append_1_ms": append_ms,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    # 预热 (numba 首次调用需要编译)
+    with_kernel(fake_bars(100))
+    rows = [bench(size, args.repeat) for size in args.sizes]
+    print(f"numba: {'已启用' if kernels.NUMBA else '未安装'}  (最佳 {args.repeat} 次)")
+    print(pd.DataFrame(rows).round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""L2 缓存序列化基准: pickle vs Arrow/Feather (FrameDisk)
+
+对比 diskcache 默认 pickle 与 FrameDisk 在典型 akshare 数据上的写入/读取延迟、
+只读三列 (如 收盘/最高/最低) 的投影读取延迟以及磁盘占用。
+
+    python -m benchmarks.bench_l2_serializer            # 使用仿真数据
+    python -m benchmarks.bench_l2_serializer --live     # 通过 akshare 拉取真实数据
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+
+import diskcache
+import numpy as np
+import pandas as pd
+
+from mcp_aktools import cache as cache_module
+from mcp_aktools.cache import CacheKey, FrameDisk, feather
+
+PROJECTIONS = {
+    "stock_zh_a_hist": ["收盘", "最高", "最低"],
+    "fund_open_fund_rank_em": ["基金代码", "单位净值", "日增长率"],
+}
+
+
+def fake_stock_zh_a_hist(rows: int = 6000) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    close = 10 + rng.standard_normal(rows).cumsum() * 0.1
+    return pd.DataFrame(
+        {
+            "日期": pd.bdate_range("2000-01-04", periods=rows).date,
+            "股票代码": "600519",
+            "开盘": close + rng.normal(0, 0.05, rows),
+            "收盘": close,
+            "最高": close + rng.random(rows) * 0.2,
+            "最低": close - rng.random(rows) * 0.2,
+            "成交量": rng.integers(10_000, 1_000_000, rows),
+            "成交额": rng.random(rows) * 1e9,
+            "振幅": rng.random(rows) * 5,
+            "涨跌幅": rng.normal(0, 2, rows),
+            "涨跌额": rng.normal(0, 0.2, rows),
+            "换手率": rng.random(rows) * 3,
+        }
+    )
+
+
+def fake_fund_open_fund_rank_em(rows: int = 19000) -> pd.DataFrame:
+    rng = np.random.default_rng(1)
+    periods = ["近1周", "近1月", "近3月", "近6月", "近1年", "近2年", "近3年", "今年来", "成立来"]
+    data = {
+        "序号": np.arange(1, rows + 1),
+        "基金代码": [f"{i:06d}" for i in range(rows)],
+        "基金简称": [f"测试混合基金{i}号A" for i in range(rows)],
+        "日期": "2025-01-10",
+        "单位净值": rng.random(rows) * 3,
+        "累计净值": rng.random(rows) * 5,
+        "日增长率": rng.normal(0, 1, rows),
+    }
+    for name in periods:
+        data[name] = rng.normal(0, 20, rows)
+    data["手续费"] = "0.15%"
+    return pd.DataFrame(data)
+
+
+def live_frames() -> dict[str, pd.DataFrame]:
+    import akshare as ak
+
+    return {
+        "stock_zh_a_hist": ak.stock_zh_a_hist(symbol="600519", period="daily", start_date="19700101"),
+        "fund_open_fund_rank_em": ak.fund_open_fund_rank_em(symbol="全部"),
+    }
+
+
+def disk_usage(directory: str) -> int:
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith(".db") or name.endswith(".db-wal") or name.endswith(".db-shm"):
+                continue
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench(name: str, df: pd.DataFrame, disk: type[diskcache.Disk], repeat: int) -> dict:
+    columns = PROJECTIONS[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        # min_file_size=0 保证 pickle 也落到独立文件，便于比较磁盘占用
+        store = diskcache.Cache(tmp, disk=disk, disk_min_file_size=0)
+        write = timed(lambda: store.set("k", df), repeat)
+        read = timed(lambda: store.get("k"), repeat)
+
+        def projected():
+            if disk is FrameDisk:
+                cache_module._projection.columns = columns
+                try:
+                    return store.get("k")
+                finally:
+                    cache_module._projection.columns = None
+            return store.get("k")[columns]
+
+        project = timed(projected, repeat)
+        size = disk_usage(tmp)
+        store.close()
+    return {
+        "frame": name,
+        "disk": disk.__name__,
+        "write_ms": write,
+        "read_ms": read,
+        "read_3col_ms": project,
+        "kb": size / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="通过 akshare 拉取真实数据")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if feather is None:
+        raise SystemExit("需要安装 pyarrow: pip install pyarrow")
+    frames = (
+        live_frames()
+        if args.live
+        else {
+            "stock_zh_a_hist": fake_stock_zh_a_hist(),
+            "fund_open_fund_rank_em": fake_fund_open_fund_rank_em(),
+        }
+    )
+    rows = []
+    for name, df in frames.items():
+        for disk in (diskcache.Disk, FrameDisk):
+            rows.append(bench(name, df, disk, args.repeat))
+    out = pd.DataFrame(rows).round(2)
+    print(f"L2 压缩算法: {os.getenv('AKTOOLS_L2_COMPRESSION') or 'zstd'}  (最佳 {args.repeat} 次)")
+    print(out.to_string(index=False))
+    CacheKey.close_all()
+
+
+if __name__ == "__main__":
+    main()
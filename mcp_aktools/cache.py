@@ -1,76 +1,327 @@
 from __future__ import annotations
 
 import atexit
+import dataclasses
+import json
+import os
 import pathlib
 import sys
-from typing import Any, ClassVar, Dict
+import threading
+import time
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, ClassVar, Dict, Iterable
 
 import diskcache
-from cachetools import TTLCache
+import pandas as pd
+from cachetools import TLRUCache
+
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+except ImportError:  # pragma: no cover - 可选依赖
+    pa = None
+    feather = None
+
+FRESH = "fresh"
+STALE = "stale"
+EXPIRED = "expired"
+
+# DataFrame.attrs 中的过期标记，由 normalize 输出到 source 列
+STALE_ATTR = "stale"
+
+
+# 列式存储的 DataFrame 文件后缀及 schema 中保存 DataFrame.attrs 的元数据键
+FRAME_SUFFIX = ".arrow"
+FRAME_ATTRS = b"mcp_aktools.attrs"
+
+_projection = threading.local()
+
+
+class FrameDisk(diskcache.Disk):
+    """diskcache serializer storing DataFrames as Arrow/Feather files.
+
+    Frames are written column-wise (zstd by default, see ``AKTOOLS_L2_COMPRESSION``)
+    and read back through a memory map, optionally only the requested columns.
+    Everything else, and frames Arrow cannot represent, keeps the pickle path.
+    """
+
+    def store(self, value, read, key=diskcache.core.UNKNOWN):
+        if not read and feather is not None and isinstance(value, pd.DataFrame):
+            filename, full_path = self.filename(key, value)
+            filename = filename[: -len(".val")] + FRAME_SUFFIX
+            full_path = full_path[: -len(".val")] + FRAME_SUFFIX
+            try:
+                table = pa.Table.from_pandas(value)
+                if value.attrs:
+                    meta = dict(table.schema.metadata or {})
+                    meta[FRAME_ATTRS] = json.dumps(value.attrs).encode()
+                    table = table.replace_schema_metadata(meta)
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                feather.write_feather(table, full_path, compression=_frame_compression())
+                return os.path.getsize(full_path), diskcache.core.MODE_BINARY, filename, None
+            except Exception:
+                # 混合类型的 object 列等 Arrow 无法表示的数据退回 pickle
+                self.remove(filename)
+        return super().store(value, read, key=key)
+
+    def fetch(self, mode, filename, value, read):
+        if mode == diskcache.core.MODE_BINARY and not read and filename and filename.endswith(FRAME_SUFFIX):
+            return read_frame(os.path.join(self._directory, filename), getattr(_projection, "columns", None))
+        return super().fetch(mode, filename, value, read)
+
+
+def _frame_compression() -> str:
+    codec = os.getenv("AKTOOLS_L2_COMPRESSION") or "zstd"
+    if codec != "uncompressed" and not pa.Codec.is_available(codec):
+        return "uncompressed"
+    return codec
+
+
+def read_frame(path: str, columns: Iterable[str] | None = None) -> pd.DataFrame:
+    """Read a frame written by :class:`FrameDisk`, materializing only ``columns``."""
+    if columns is not None:
+        with pa.memory_map(path) as source:
+            schema = pa.ipc.open_file(source).schema
+        index = [c for c in (schema.pandas_metadata or {}).get("index_columns", []) if isinstance(c, str)]
+        columns = [c for c in columns if c in schema.names] + index
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    df = table.to_pandas()
+    meta = table.schema.metadata or {}
+    if FRAME_ATTRS in meta:
+        df.attrs = json.loads(meta[FRAME_ATTRS])
+    return df
+
+
+def _project(val: Any, columns: Iterable[str] | None) -> Any:
+    if columns is None or not isinstance(val, pd.DataFrame):
+        return val
+    return val[[c for c in columns if c in val.columns]]
+
+
+def sizeof(val: Any) -> int:
+    """Estimate the in-memory footprint of a cached value in bytes."""
+    if isinstance(val, pd.DataFrame):
+        return int(val.memory_usage(index=True, deep=True).sum())
+    if isinstance(val, pd.Series):
+        return int(val.memory_usage(index=True, deep=True))
+    if isinstance(val, dict):
+        return sys.getsizeof(val) + sum(sizeof(k) + sizeof(v) for k, v in val.items())
+    if isinstance(val, (list, tuple, set)):
+        return sys.getsizeof(val) + sum(sizeof(v) for v in val)
+    if dataclasses.is_dataclass(val) and not isinstance(val, type):
+        # 代码索引、搜索引擎等由字段中的容器组成，按字段逐一计入
+        return sys.getsizeof(val) + sum(sizeof(getattr(val, f.name)) for f in dataclasses.fields(val))
+    return sys.getsizeof(val)
+
+
+class _TLRU(TLRUCache):
+    """TLRUCache reporting every evicted or expired key to ``on_evict``."""
+
+    def __init__(self, maxsize: int, on_evict: Callable[[str], None], timer: Callable[[], float]) -> None:
+        super().__init__(
+            maxsize, ttu=lambda _key, item, now: now + item[1], timer=timer, getsizeof=lambda item: item[2]
+        )
+        self.on_evict = on_evict
+
+    def popitem(self):
+        key, item = super().popitem()
+        self.on_evict(key)
+        return key, item
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for key, _ in expired:
+            self.on_evict(key)
+        return expired
+
+
+class MemoryCache:
+    """In-memory cache bounded by estimated bytes, e.g. the process-wide L1.
+
+    Entries expire after their key's ``ttl``; when the byte budget is exceeded
+    the least recently used ones are evicted first. Both are reported to
+    ``on_evict``: the L1 releases the key from ``CacheKey.ALL`` so that neither
+    the value nor its registry entry lingers.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        timer: Callable[[], float] = time.monotonic,
+        on_evict: Callable[[str], None] | None = None,
+    ) -> None:
+        self._lock = threading.RLock()
+        self._data = _TLRU(max_bytes, on_evict or (lambda _key: None), timer)
+
+    @property
+    def maxsize(self) -> int:
+        return int(self._data.maxsize)
+
+    @property
+    def currsize(self) -> int:
+        with self._lock:
+            return int(self._data.currsize)
+
+    def put(self, key: str, val: Any, ttl: int) -> None:
+        size = sizeof(val)
+        with self._lock:
+            if size > self._data.maxsize:
+                # 超出整个预算的值只放在磁盘缓存
+                self._data.pop(key, None)
+                return
+            self._data[key] = (val, ttl, size)
+
+    def __getitem__(self, key: str) -> Any:
+        with self._lock:
+            return self._data[key][0]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+        return default if item is None else item[0]
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
 
 
 class CacheKey:
+    """Cache entry with a soft TTL (``ttl``) and a hard TTL (``ttl2``).
+
+    Values younger than ``ttl`` are fresh. Between ``ttl`` and ``ttl2`` they are
+    stale: still served, but callers should revalidate in the background. After
+    ``ttl2`` they are expired, yet kept on disk for another ``stale_ttl`` seconds
+    so that a failing upstream can fall back to the last good value.
+
+    ``set`` may override both TTLs per value (e.g. from a trading-session
+    policy); the fresh deadline is stored with the entry as its disk tag.
+    """
+
     ALL: ClassVar[Dict[str, "CacheKey"]] = {}
+    # 注册表上限，超出时按注册顺序淘汰最早的键 (内存值同样受 L1 预算约束)
+    MAX_KEYS: ClassVar[int] = 4096
 
     key: str
     ttl: int
     ttl2: int
-    cache1: TTLCache[str, Any]
-    cache2: diskcache.Cache
+    stale_ttl: int
+    cache1: MemoryCache
+    cache2: diskcache.FanoutCache
 
-    def __init__(self, key: str, ttl: int = 600, ttl2: int | None = None, maxsize: int = 100) -> None:
+    def __init__(
+        self,
+        key: str,
+        ttl: int = 600,
+        ttl2: int | None = None,
+        stale_ttl: int | None = None,
+    ) -> None:
         self.key = key
         self.ttl = ttl
         self.ttl2 = ttl2 or (ttl * 2)
-        self.cache1 = TTLCache(maxsize=maxsize, ttl=ttl)
-        self.cache2 = diskcache.Cache(self.get_cache_dir())
+        self.stale_ttl = stale_ttl if stale_ttl is not None else max(self.ttl2, 86400)
+        self.cache1 = L1
+        self.cache2 = shared_disk()
 
     @staticmethod
-    def init(key: str, ttl: int = 600, ttl2: int | None = None, maxsize: int = 100) -> "CacheKey":
+    def init(
+        key: str,
+        ttl: int = 600,
+        ttl2: int | None = None,
+        stale_ttl: int | None = None,
+    ) -> "CacheKey":
         if key in CacheKey.ALL:
             return CacheKey.ALL[key]
-        cache = CacheKey(key, ttl, ttl2, maxsize)
+        cache = CacheKey(key, ttl, ttl2, stale_ttl)
+        while len(CacheKey.ALL) >= CacheKey.MAX_KEYS:
+            CacheKey.ALL.pop(next(iter(CacheKey.ALL)), None)
         return CacheKey.ALL.setdefault(key, cache)
 
-    def get(self) -> Any:
+    def lookup(self, columns: Iterable[str] | None = None) -> tuple[Any, str | None]:
+        """Return the cached value and its state: fresh, stale, expired or None on miss.
+
+        ``columns`` limits a cached DataFrame to those columns; on an L2 hit
+        only they are read from disk.
+        """
+        columns = None if columns is None else list(columns)
         try:
-            return self.cache1[self.key]
+            return _project(self.cache1[self.key], columns), FRESH
         except KeyError:
             pass
-        return self.cache2.get(self.key)
+        _projection.columns = columns
+        try:
+            val, expire_at, fresh_until = self.cache2.get(self.key, expire_time=True, tag=True, retry=True)
+        finally:
+            _projection.columns = None
+        val = _project(val, columns)
+        if val is None:
+            return None, None
+        if expire_at is None:
+            return val, FRESH
+        stale_until = expire_at - self.stale_ttl
+        if fresh_until is None:
+            fresh_until = stale_until - self.ttl2 + self.ttl
+        now = time.time()
+        if now <= fresh_until:
+            return val, FRESH
+        if now <= stale_until:
+            return val, STALE
+        return val, EXPIRED
+
+    def get(self, columns: Iterable[str] | None = None) -> Any:
+        val, state = self.lookup(columns)
+        if state in (FRESH, STALE):
+            return val
+        return None
 
-    def set(self, val: Any) -> Any:
-        self.cache1[self.key] = val
-        self.cache2.set(self.key, val, expire=self.ttl2)
+    def get_stale(self) -> Any:
+        """Return the last stored value, even past the hard TTL."""
+        val, _ = self.lookup()
+        return val
+
+    def set(self, val: Any, ttl: int | None = None, ttl2: int | None = None) -> Any:
+        if ttl is None:
+            ttl, ttl2 = self.ttl, self.ttl2
+        ttl2 = max(ttl2 or ttl * 2, ttl)
+        fresh_until = time.time() + ttl
+        self.cache1.put(self.key, val, ttl)
+        self.cache2.set(self.key, val, expire=ttl2 + self.stale_ttl, tag=fresh_until, retry=True)
         return val
 
     def delete(self) -> None:
         self.cache1.pop(self.key, None)
-        self.cache2.delete(self.key)
-
-    def close(self) -> None:
-        try:
-            self.cache2.close()
-        except Exception:
-            pass
+        self.cache2.delete(self.key, retry=True)
 
-    def __del__(self) -> None:
-        try:
-            self.close()
-        except Exception:
-            pass
+    @staticmethod
+    def release(key: str) -> None:
+        """Drop ``key`` from the registry once its L1 entry is gone."""
+        CacheKey.ALL.pop(key, None)
 
     @classmethod
     def close_all(cls) -> None:
-        for obj in list(cls.ALL.values()):
-            close = getattr(obj, "close", None)
-            if callable(close):
-                try:
-                    close()
-                except Exception:
-                    pass
-
-    def get_cache_dir(self) -> pathlib.Path:
+        global _L2
+        with _L2_LOCK:
+            disk, _L2 = _L2, None
+        if disk is not None:
+            try:
+                disk.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def get_cache_dir() -> pathlib.Path:
         home = pathlib.Path.home()
         name = __package__ or "mcp_aktools"
         if sys.platform == "win32":
@@ -78,4 +329,155 @@ class CacheKey:
         return home / ".cache" / name
 
 
+_L2: diskcache.FanoutCache | None = None
+_L2_LOCK = threading.Lock()
+
+
+def shared_disk() -> diskcache.FanoutCache:
+    """Return the process-wide L2 handle, opening it on first use.
+
+    All cache keys share one sharded diskcache so that the number of SQLite
+    connections and open files no longer grows with the number of keys.
+    """
+    global _L2
+    with _L2_LOCK:
+        if _L2 is None:
+            _L2 = diskcache.FanoutCache(
+                str(CacheKey.get_cache_dir()),
+                shards=int(os.getenv("AKTOOLS_L2_SHARDS") or 8),
+                timeout=1,
+                disk=FrameDisk,
+                size_limit=int(float(os.getenv("AKTOOLS_L2_SIZE_LIMIT_MB") or 1024) * 1024 * 1024),
+                cull_limit=int(os.getenv("AKTOOLS_L2_CULL_LIMIT") or 10),
+                eviction_policy=os.getenv("AKTOOLS_L2_EVICTION") or "least-recently-stored",
+            )
+        return _L2
+
+
+def mark_stale(val: Any) -> Any:
+    """Return ``val`` flagged as served past its TTL (DataFrames only)."""
+    if isinstance(val, pd.DataFrame):
+        val = val.copy(deep=False)
+        val.attrs[STALE_ATTR] = True
+    return val
+
+
+def is_stale(val: Any) -> bool:
+    attrs = getattr(val, "attrs", None)
+    return bool(isinstance(attrs, dict) and attrs.get(STALE_ATTR))
+
+
+class SingleFlight:
+    """Coalesce concurrent loads of the same key onto one in-flight future.
+
+    The first caller for a key becomes the leader and runs the loader, later
+    callers wait on the leader's future instead of hitting upstream again. A
+    blocking waiter whose leader is still queued on an executor runs the
+    loader itself, so waiters on a saturated pool cannot starve the leader.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        # 已登记但尚未开始运行的加载函数
+        self._pending: Dict[Future, Callable[[], Any]] = {}
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run ``fn`` in the calling thread, or wait for the in-flight call."""
+        future, _ = self._join(key, fn)
+        # 领头者或仍在排队的加载都在本线程执行
+        self._run(key, future)
+        return future.result()
+
+    def submit(self, key: str, fn: Callable[[], Any], executor: Executor) -> Future:
+        """Schedule ``fn`` on ``executor``, or return the in-flight future."""
+        future, leader = self._join(key, fn)
+        if leader:
+            executor.submit(self._run, key, future)
+        return future
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def _join(self, key: str, fn: Callable[[], Any]) -> tuple[Future, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self._pending[future] = fn
+            return future, True
+
+    def _forget(self, key: str, future: Future) -> None:
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def _run(self, key: str, future: Future) -> None:
+        with self._lock:
+            fn = self._pending.pop(future, None)
+        if fn is None:
+            # 已由其他线程运行
+            return
+        if not future.set_running_or_notify_cancel():
+            self._forget(key, future)
+            return
+        try:
+            result = fn()
+        except BaseException as exc:
+            self._forget(key, future)
+            future.set_exception(exc)
+            return
+        self._forget(key, future)
+        future.set_result(result)
+
+
+class ResultCache:
+    """In-memory memo for derived tool outputs (backtest reports etc.), counting hits.
+
+    Keys must name the version of the input data (a content hash or the last
+    bar's time) as well as the computation, so new or revised bars produce a
+    new key: an outdated result is never served, it just ages out of the
+    byte budget.
+    """
+
+    def __init__(self, max_bytes: int, ttl: int = 86400, timer: Callable[[], float] = time.monotonic) -> None:
+        self.ttl = ttl
+        self._data = MemoryCache(max_bytes, timer)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Any:
+        val = self._data.get(key)
+        with self._lock:
+            if val is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return val
+
+    def set(self, key: str, val: Any) -> Any:
+        self._data.put(key, val, self.ttl)
+        return val
+
+    def hit_ratio(self) -> float | None:
+        with self._lock:
+            total = self.hits + self.misses
+            return self.hits / total if total else None
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+L1 = MemoryCache(int(float(os.getenv("AKTOOLS_L1_MAX_MB") or 256) * 1024 * 1024), on_evict=CacheKey.release)
+RESULTS = ResultCache(int(float(os.getenv("AKTOOLS_RESULTS_MAX_MB") or 32) * 1024 * 1024))
+
 atexit.register(CacheKey.close_all)
@@ -0,0 +1,291 @@
+"""Vectorized backtest core shared by the stock and crypto backtest tools.
+
+Strategies turn their inputs into a 0/1 position signal with array operations:
+stateful enter/exit rules (RSI thresholds, BOLL bands, KDJ crosses) mark the
+bars where the state changes and forward-fill between them. ``run_backtest``
+then trades the signal one bar late and computes equity, drawdown and win rate
+in NumPy, matching the former pandas/per-bar implementation exactly.
+"""
+
+from __future__ import annotations
+
+import re
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class BacktestResult:
+    """Outcome of trading a position signal over a close series."""
+
+    returns: np.ndarray  # 每根 K 线的策略收益
+    equity: np.ndarray  # 净值曲线，从 1 开始
+    cumulative_return: float
+    max_drawdown: float
+    win_rate: float | None  # 有持仓收益的 K 线中盈利的占比，无交易为 None
+
+    @property
+    def bars(self) -> int:
+        return len(self.equity)
+
+
+def hold_signal(enter: np.ndarray, exit: np.ndarray) -> np.ndarray:
+    """Position that turns 1 on ``enter``, 0 on ``exit`` and otherwise keeps the previous state.
+
+    Starts flat; ``enter`` wins when both fire on the same bar.
+    """
+    state = np.where(enter, 1.0, np.where(exit, 0.0, np.nan))
+    # 前向填充: 每根 K 线取最近一次状态变化的位置
+    last = np.where(np.isnan(state), -1, np.arange(len(state)))
+    np.maximum.accumulate(last, out=last)
+    return np.where(last >= 0, state[np.maximum(last, 0)], 0.0)
+
+
+def sma_signal(close: np.ndarray, short: int, long: int) -> np.ndarray:
+    """Long while the short moving average is above the long one."""
+    ma_short = pd.Series(close).rolling(short).mean().to_numpy()
+    ma_long = pd.Series(close).rolling(long).mean().to_numpy()
+    return (ma_short > ma_long).astype(np.float64)
+
+
+def threshold_signal(values: np.ndarray, lower: float, upper: float) -> np.ndarray:
+    """Enter below ``lower``, exit above ``upper`` (e.g. RSI 30/70); NaN keeps the state."""
+    return hold_signal(values < lower, values > upper)
+
+
+def band_signal(close: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """Enter at or below the lower band, exit at or above the upper band."""
+    valid = ~(np.isnan(lower) | np.isnan(upper))
+    return hold_signal(valid & (close <= lower), valid & (close >= upper))
+
+
+def cross_signal(fast: np.ndarray, slow: np.ndarray) -> np.ndarray:
+    """Enter when ``fast`` crosses above ``slow``, exit when it crosses below."""
+    prev_fast = np.concatenate(([np.nan], fast[:-1]))
+    prev_slow = np.concatenate(([np.nan], slow[:-1]))
+    # NaN 参与比较为 False，前后任一根缺失时不产生信号
+    golden = (prev_fast <= prev_slow) & (fast > slow)
+    death = (prev_fast >= prev_slow) & (fast < slow)
+    return hold_signal(golden, death)
+
+
+def _nancumprod(x: np.ndarray) -> np.ndarray:
+    # 与 pandas cumprod(skipna=True) 一致: 缺失值位置仍为 NaN，但不中断累乘
+    missing = np.isnan(x)
+    out = np.cumprod(np.where(missing, 1.0, x), axis=0)
+    out[missing] = np.nan
+    return out
+
+
+def strategy_returns(close: np.ndarray, signal: np.ndarray) -> np.ndarray:
+    """Per-bar returns of holding ``signal`` from the bar after it is set.
+
+    Bars run along axis 0; 2-D inputs hold one column per symbol.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    returns = np.zeros_like(close)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns[1:] = close[1:] / close[:-1] - 1
+    returns[np.isnan(returns)] = 0.0
+    position = np.zeros_like(close)
+    position[1:] = signal[:-1]
+    return returns * position
+
+
+def _stats(strat: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # 沿 axis 0 计算净值、累计收益、最大回撤与胜率 (无交易时胜率为 NaN)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        equity = _nancumprod(1 + strat)
+        drawdown = equity / np.fmax.accumulate(equity, axis=0) - 1
+        active = strat != 0
+        win_rate = ((strat > 0) & active).sum(axis=0) / active.sum(axis=0)
+    return equity, equity[-1] - 1, np.fmin.reduce(drawdown, axis=0), win_rate
+
+
+def _result(strat: np.ndarray) -> BacktestResult:
+    if not len(strat):
+        return BacktestResult(strat, strat, float("nan"), float("nan"), None)
+    equity, cumulative, drawdown, win_rate = _stats(strat)
+    return BacktestResult(
+        returns=strat,
+        equity=equity,
+        cumulative_return=float(cumulative),
+        max_drawdown=float(drawdown),
+        win_rate=None if np.isnan(win_rate) else float(win_rate),
+    )
+
+
+def run_backtest(close: np.ndarray, signal: np.ndarray) -> BacktestResult:
+    """Trade ``signal`` (position decided at each close, held from the next bar) over ``close``."""
+    return _result(strategy_returns(close, signal))
+
+
+def panel_backtest(
+    close: pd.DataFrame, signal: pd.DataFrame, weights: np.ndarray
+) -> tuple[pd.DataFrame, BacktestResult]:
+    """Backtest one signal column per symbol over a date-aligned close panel, and their weighted portfolio.
+
+    Dates a symbol has no bar for (another market's trading days, before its
+    first bar) carry its last close and position, so each column's metrics
+    equal a single-symbol backtest on its own bars. The portfolio holds fixed
+    ``weights`` of the symbols' strategy returns, rebalanced every bar; weight
+    of a symbol without bars yet stays in cash.
+    """
+    prices = close.ffill().to_numpy(dtype=np.float64)
+    positions = signal.reindex_like(close).ffill().fillna(0).to_numpy(dtype=np.float64)
+    strat = strategy_returns(prices, positions)
+    _, cumulative, drawdown, win_rate = _stats(strat)
+    per_symbol = pd.DataFrame(
+        {
+            "bars": close.notna().sum().to_numpy(),
+            "weight": weights,
+            "return": cumulative,
+            "max_drawdown": drawdown,
+            "win_rate": win_rate,
+        },
+        index=close.columns,
+    )
+    return per_symbol, _result(strat @ np.asarray(weights, dtype=np.float64))
+
+
+def portfolio_weights(rule: str, close: pd.DataFrame) -> np.ndarray:
+    """Weights (summing to 1) over ``close``'s columns from a weighting rule.
+
+    ``equal``; ``inverse_vol`` (inversely proportional to each symbol's return
+    volatility over the panel); or explicit ``600519.sh=0.6,000001.sz=0.4``,
+    normalized, with unlisted symbols at 0. Raises ``ValueError`` on bad input.
+    """
+    rule = (rule or "equal").strip()
+    n = close.shape[1]
+    if rule.lower() == "equal":
+        return np.full(n, 1 / n)
+    if rule.lower() == "inverse_vol":
+        vol = close.ffill().pct_change(fill_method=None).std().to_numpy(dtype=np.float64)
+        with np.errstate(divide="ignore"):
+            inverse = np.where(vol > 0, 1 / vol, 0.0)
+        return inverse / inverse.sum() if inverse.sum() > 0 else np.full(n, 1 / n)
+    columns = {str(col).lower(): i for i, col in enumerate(close.columns)}
+    weights = np.zeros(n)
+    for item in re.split(r"[\s,，;]+", rule):
+        if not item:
+            continue
+        name, sep, value = item.partition("=")
+        try:
+            weight = float(value)
+        except ValueError:
+            weight = -1.0
+        if not sep or weight < 0:
+            raise ValueError(f"invalid weight: {item}")
+        if name.strip().lower() not in columns:
+            raise ValueError(f"weight for unknown symbol: {name}")
+        weights[columns[name.strip().lower()]] = weight
+    if weights.sum() <= 0:
+        raise ValueError("weights must sum to a positive value")
+    return weights / weights.sum()
+
+
+@dataclass(frozen=True)
+class Strategy:
+    """A backtest strategy: the indicators it reads and how it turns them into a signal."""
+
+    name: str  # 报告中的策略说明
+    indicators: str  # 传给价格接口的 indicators 参数
+    columns: tuple[str, ...]  # 除 close 外需要的列
+    signal: Callable[[dict[str, np.ndarray]], np.ndarray]
+
+
+STRATEGIES: dict[str, Strategy] = {
+    "SMA": Strategy("SMA5/20", "none", (), lambda v: sma_signal(v["close"], 5, 20)),
+    "RSI": Strategy("RSI(30/70)", "rsi", ("rsi",), lambda v: threshold_signal(v["rsi"], 30, 70)),
+    "MACD": Strategy("MACD(DIF/DEA)", "macd", ("dif", "dea"), lambda v: (v["dif"] > v["dea"]).astype(np.float64)),
+    "BOLL": Strategy(
+        "BOLL(突破下轨买入/上轨卖出)",
+        "boll",
+        ("boll_u", "boll_l"),
+        lambda v: band_signal(v["close"], v["boll_l"], v["boll_u"]),
+    ),
+    "MA_CROSS": Strategy("MA_CROSS(10/30)", "none", (), lambda v: sma_signal(v["close"], 10, 30)),
+    "KDJ": Strategy(
+        "KDJ(金叉买入/死叉卖出)", "kdj", ("kdj_k", "kdj_d"), lambda v: cross_signal(v["kdj_k"], v["kdj_d"])
+    ),
+}
+STRATEGIES["MACROSS"] = STRATEGIES["MA_CROSS"]
+
+
+def strategy_values(data: pd.DataFrame, strategy: Strategy) -> dict[str, np.ndarray]:
+    """The float64 columns ``strategy`` reads from ``data``; raises ``KeyError`` if one is missing."""
+    return {
+        col: pd.to_numeric(data[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        for col in ("close", *strategy.columns)
+    }
+
+
+def backtest_frame(data: pd.DataFrame, strategy: Strategy) -> BacktestResult:
+    """Run ``strategy`` over price bars with a ``close`` column and its indicator columns."""
+    values = strategy_values(data, strategy)
+    return run_backtest(values["close"], strategy.signal(values))
+
+
+def positions_loop(key: str, values: dict[str, np.ndarray]) -> np.ndarray:
+    """Reference per-bar implementation of the stateful strategies, kept for parity tests and benchmarks."""
+    positions = []
+    position = 0
+    if key == "RSI":
+        for value in values["rsi"].tolist():
+            if pd.isna(value):
+                positions.append(position)
+                continue
+            if value < 30:
+                position = 1
+            elif value > 70:
+                position = 0
+            positions.append(position)
+    elif key == "BOLL":
+        boll_u, boll_l = pd.Series(values["boll_u"]), pd.Series(values["boll_l"])
+        for i, price in enumerate(values["close"].tolist()):
+            if pd.isna(boll_u.iloc[i]) or pd.isna(boll_l.iloc[i]):
+                positions.append(position)
+                continue
+            if price <= boll_l.iloc[i]:
+                position = 1
+            elif price >= boll_u.iloc[i]:
+                position = 0
+            positions.append(position)
+    elif key == "KDJ":
+        kdj_k, kdj_d = pd.Series(values["kdj_k"]), pd.Series(values["kdj_d"])
+        prev_k, prev_d = None, None
+        for i in range(len(kdj_k)):
+            k_val, d_val = kdj_k.iloc[i], kdj_d.iloc[i]
+            if pd.isna(k_val) or pd.isna(d_val):
+                positions.append(position)
+                prev_k, prev_d = k_val, d_val
+                continue
+            if prev_k is not None and prev_d is not None:
+                if not pd.isna(prev_k) and not pd.isna(prev_d):
+                    if prev_k <= prev_d and k_val > d_val:
+                        position = 1
+                    elif prev_k >= prev_d and k_val < d_val:
+                        position = 0
+            positions.append(position)
+            prev_k, prev_d = k_val, d_val
+    else:
+        raise ValueError(f"no per-bar reference for {key}")
+    return np.asarray(positions, dtype=np.float64)
+
+
+def backtest_pandas(close: pd.Series, signal: pd.Series) -> dict:
+    """Reference pandas implementation of ``run_backtest``, kept for parity tests and benchmarks."""
+    returns = close.pct_change().fillna(0)
+    position = signal.shift(1).fillna(0)
+    strat_returns = returns.mul(position)
+    equity = (1 + strat_returns).cumprod()
+    drawdown = equity / equity.cummax() - 1
+    active = strat_returns[strat_returns != 0]
+    return {
+        "cumulative_return": equity.iloc[-1] - 1,
+        "max_drawdown": drawdown.min(),
+        "win_rate": (active > 0).mean() if len(active) else None,
+    }
@@ -5,3 +5,7 @@ field_market = Field(
     "sh",
     description="股票市场，仅支持: sh(上证), sz(深证), hk(港股), us(美股), 不支持加密货币",
 )
+field_indicators = Field(
+    "all",
+    description="技术指标，逗号分隔: macd, kdj, rsi, boll，或单列如 rsi/kdj_k；all 为全部，none 为不计算 (响应更短)",
+)
@@ -0,0 +1,194 @@
+"""Range-aware bar history store.
+
+One cache entry is kept per series (e.g. symbol/market/period/asset). It holds
+the widest date range fetched so far, so any shorter ``start_date`` is served by
+slicing, and a wider request only fetches the missing head of the range.
+
+When an entry goes stale, ranged sources are refreshed incrementally: only bars
+from the last closed stored bar onward are requested and merged in. If that
+overlapping bar no longer matches (e.g. prices were re-adjusted), the whole
+range is fetched again.
+
+Every returned range carries a version (``HISTORY_VERSION``): its length, last
+bar and content hash. Results derived from the bars can be memoized per version
+without reloading them, and stay valid while the stored range grows elsewhere.
+"""
+
+from __future__ import annotations
+
+import logging
+from functools import partial
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from ..cache import FRESH, STALE, CacheKey, mark_stale
+from .utils import _executor, inflight
+
+_LOGGER = logging.getLogger(__name__)
+
+# DataFrame.attrs 中记录已覆盖区间的起始日期 (YYYYMMDD)
+HISTORY_START = "history_start"
+# DataFrame.attrs 中记录内容哈希，新增或修订的 K 线都会改变它
+HISTORY_VERSION = "history_version"
+
+
+def _history_start(df: object) -> str | None:
+    if not isinstance(df, pd.DataFrame):
+        return None
+    return df.attrs.get(HISTORY_START)
+
+
+def _covers(df: object, start_date: str) -> bool:
+    stored_start = _history_start(df)
+    return stored_start is not None and stored_start <= start_date
+
+
+def _since(df: pd.DataFrame, start_date: str, date_col: str) -> pd.DataFrame:
+    if date_col not in df.columns:
+        data = df.copy()
+    else:
+        dates = pd.to_datetime(df[date_col], errors="coerce")
+        data = df.loc[(dates >= pd.Timestamp(start_date)).to_numpy()].copy()
+    # 版本只反映返回的区间，存储区间向前扩展或其他窗口的变化不影响它
+    data.attrs[HISTORY_VERSION] = _version(data, date_col)
+    return data
+
+
+def _merge(parts: list[pd.DataFrame | None], date_col: str, start_date: str) -> pd.DataFrame | None:
+    frames = [p for p in parts if isinstance(p, pd.DataFrame) and not p.empty]
+    if not frames:
+        return None
+    data = pd.concat(frames, ignore_index=True)
+    if date_col in data.columns:
+        dates = pd.to_datetime(data[date_col], errors="coerce")
+        data = data.assign(_bar_date=dates)
+        data = data.drop_duplicates("_bar_date", keep="last").sort_values("_bar_date")
+        data = data.drop(columns="_bar_date").reset_index(drop=True)
+    data.attrs = {HISTORY_START: start_date}
+    return data
+
+
+def _version(data: pd.DataFrame, date_col: str) -> str | None:
+    try:
+        digest = int(pd.util.hash_pandas_object(data, index=False).sum())
+    except TypeError:
+        # 含不可哈希的单元格时不记录版本，派生结果不做缓存
+        return None
+    last = data[date_col].iloc[-1] if date_col in data.columns and len(data) else ""
+    return f"{len(data)}-{last}-{digest:016x}"
+
+
+def _same_bar(old: pd.Series, new: pd.Series) -> bool:
+    for col, val in old.items():
+        if col not in new.index or not pd.api.types.is_number(val):
+            continue
+        other = pd.to_numeric(new[col], errors="coerce")
+        if not np.isclose(float(val), float(other), equal_nan=True):
+            return False
+    return True
+
+
+def _append_tail(fun, stored: pd.DataFrame, date_col: str, kwargs: dict) -> pd.DataFrame | None:
+    """Merge bars since the last closed stored bar, or None if history was revised."""
+    if date_col not in stored.columns or len(stored) < 2:
+        return None
+    anchor = pd.to_datetime(stored[date_col], errors="coerce").iloc[-2]
+    if pd.isna(anchor):
+        return None
+    _LOGGER.info("Request akshare history tail: %s", [anchor.strftime("%Y%m%d"), kwargs])
+    tail = fun(start_date=anchor.strftime("%Y%m%d"), **kwargs)
+    if not isinstance(tail, pd.DataFrame) or tail.empty or date_col not in tail.columns:
+        return None
+    overlap = tail.loc[(pd.to_datetime(tail[date_col], errors="coerce") == anchor).to_numpy()]
+    if overlap.empty or not _same_bar(stored.iloc[-2], overlap.iloc[0]):
+        _LOGGER.info("History revised since %s, refetching full range", anchor)
+        return None
+    return _merge([stored, tail], date_col, stored.attrs[HISTORY_START])
+
+
+def _fetch(
+    cache: CacheKey,
+    fun,
+    start_date: str,
+    ttl: int,
+    date_col: str,
+    ranged: bool,
+    kwargs: dict,
+) -> pd.DataFrame | None:
+    stored, state = cache.lookup()
+    if state == FRESH and _covers(stored, start_date):
+        return stored
+    stored_start = _history_start(stored)
+    try:
+        data = None
+        if ranged and stored_start:
+            # 过期时只追加最新的 K 线，新鲜时直接复用
+            data = stored if state == FRESH else _append_tail(fun, stored, date_col, kwargs)
+        if data is None:
+            widest = min(start_date, stored_start or start_date)
+            _LOGGER.info("Request akshare history: %s", [cache.key, widest])
+            return cache.set(_merge([fun(start_date=widest, **kwargs)], date_col, widest), ttl)
+        if not _covers(data, start_date):
+            # 仅补齐缺失的较早区间，已缓存部分保持不变
+            end_date = (pd.Timestamp(data.attrs[HISTORY_START]) - pd.Timedelta(days=1)).strftime("%Y%m%d")
+            _LOGGER.info("Request akshare history head: %s", [cache.key, start_date, end_date])
+            head = fun(start_date=start_date, end_date=end_date, **kwargs)
+            data = _merge([head, data], date_col, start_date)
+        return cache.set(data, ttl)
+    except Exception as exc:
+        _LOGGER.exception(str(exc))
+    if stored is None:
+        return None
+    return mark_stale(stored)
+
+
+def history_version(key: str, start_date: str, date_col: str = "日期") -> str | None:
+    """Version of the bars :func:`load_history` would return for ``key``, if it would serve them without fetching.
+
+    ``None`` when the stored range is missing, not fresh or too short.
+    """
+    stored, state = CacheKey.init(f"history-{key}").lookup()
+    if state != FRESH or not _covers(stored, start_date):
+        return None
+    return _since(stored, start_date, date_col).attrs[HISTORY_VERSION]
+
+
+def load_history(
+    fun,
+    key: str,
+    start_date: str,
+    ttl: int = 3600,
+    date_col: str = "日期",
+    ranged: bool = True,
+    columns: Iterable[str] | None = None,
+    **kwargs,
+) -> pd.DataFrame | None:
+    """Return bars since ``start_date`` from the shared history of one series.
+
+    ``fun`` must accept ``start_date`` (YYYYMMDD); when ``ranged`` it must also
+    accept ``end_date`` and actually honour both upstream, so that only the
+    missing head or the new tail is fetched. Unranged sources are refetched in
+    full when the entry expires. ``columns`` limits the returned bars to those
+    columns (and ``date_col``); a stored range is then read only for them.
+    """
+    projection = None if columns is None else [date_col, *columns]
+    cache = CacheKey.init(f"history-{key}", ttl)
+    stored, state = cache.lookup(projection)
+    loader = partial(_fetch, cache, fun, start_date, ttl, date_col, ranged, kwargs)
+    if state in (FRESH, STALE) and _covers(stored, start_date):
+        if state == STALE:
+            refresh = partial(_fetch, cache, fun, _history_start(stored), ttl, date_col, ranged, kwargs)
+            inflight.submit(cache.key, refresh, _executor)
+        return _since(stored, start_date, date_col)
+
+    data = inflight.do(cache.key, loader)
+    if data is not None and not _covers(data, start_date):
+        # 合并了他人发起的较窄请求，再补一次
+        data = inflight.do(cache.key, loader)
+    if data is None:
+        return None
+    if projection is not None:
+        data = data[[col for col in projection if col in data.columns]]
+    return _since(data, start_date, date_col)
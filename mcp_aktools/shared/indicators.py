@@ -1,30 +1,356 @@
-def add_technical_indicators(df, clos, lows, high):
+"""Technical indicators (MACD/KDJ/RSI/BOLL).
+
+``add_technical_indicators`` computes the indicators over the whole series
+with the NumPy kernels in ``kernels``. Given a ``key`` and the bar ``times`` it
+instead keeps per-series state: the bars seen so far with their indicator
+values, plus the EMA values and KDJ/RSI/BOLL rolling windows after them. A call
+whose bars continue that history, including a window that slid forward, only
+steps the bars after the last processed one, so polling a series that gained N
+bars costs O(N). Values are those of a computation from the first bar of the
+stored history; a window starting before it, or whose bars differ from it, is
+recomputed cold and becomes the new history.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass, field, replace
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+from .kernels import BOLL_WINDOW, COLUMNS, KDJ_WINDOW, RSI_WINDOW, indicator_block
+
+NAN = float("nan")
+
+# 工具输出列名 -> 指标列
+OUTPUT_NAMES = {
+    "macd": "MACD",
+    "dif": "DIF",
+    "dea": "DEA",
+    "kdj_k": "KDJ.K",
+    "kdj_d": "KDJ.D",
+    "kdj_j": "KDJ.J",
+    "rsi": "RSI",
+    "boll_u": "BOLL.U",
+    "boll_m": "BOLL.M",
+    "boll_l": "BOLL.L",
+}
+
+# 指标组，可在 indicators 参数中按组选择
+GROUPS = {
+    "macd": ["DIF", "DEA", "MACD"],
+    "kdj": ["KDJ.K", "KDJ.D", "KDJ.J"],
+    "rsi": ["RSI"],
+    "boll": ["BOLL.M", "BOLL.U", "BOLL.L"],
+}
+
+
+def _div(a: float, b: float) -> float:
+    # 按 IEEE 754 语义除法，与 pandas 的 inf/nan 结果保持一致
+    if b == 0:
+        if a != a or a == 0:
+            return NAN
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+@dataclass
+class Ewm:
+    """State of ``Series.ewm(alpha=..., adjust=False).mean()``, mirroring pandas' recurrence."""
+
+    alpha: float
+    weighted: float = NAN
+    old_wt: float = 1.0
+
+    def update(self, cur: float) -> float:
+        # pandas 将 ±inf 视为缺失值
+        observed = math.isfinite(cur)
+        if self.weighted == self.weighted:
+            self.old_wt *= 1.0 - self.alpha
+            if observed:
+                if self.weighted != cur:
+                    self.weighted = (self.old_wt * self.weighted + self.alpha * cur) / (self.old_wt + self.alpha)
+                self.old_wt = 1.0
+        elif observed:
+            self.weighted = cur
+        return self.weighted
+
+    @classmethod
+    def resume(cls, alpha: float, inputs: np.ndarray, outputs: np.ndarray) -> "Ewm":
+        """Rebuild the state after ``inputs`` from the pandas ``outputs``."""
+        if not len(outputs) or outputs[-1] != outputs[-1]:
+            return cls(alpha)
+        observed = np.flatnonzero(np.isfinite(inputs))
+        trailing = len(inputs) - 1 - observed[-1]
+        return cls(alpha, float(outputs[-1]), (1.0 - alpha) ** trailing)
+
+
+def select_indicators(spec: str | None) -> list[str]:
+    """Parse an ``indicators`` argument (``all``, ``none``, ``macd,rsi``, ``kdj_k``) into columns.
+
+    Groups and single output columns may be mixed. Raises ``ValueError`` for unknown names.
+    """
+    if not isinstance(spec, str):
+        # 通过 .fn 直接调用且未传参时为 FieldInfo
+        return list(COLUMNS)
+    names = [name for name in re.split(r"[\s,，]+", spec.strip().lower()) if name]
+    if not names or "all" in names:
+        return list(COLUMNS)
+    selected = set()
+    for name in names:
+        if name in GROUPS:
+            selected.update(GROUPS[name])
+        elif name in OUTPUT_NAMES:
+            selected.add(OUTPUT_NAMES[name])
+        elif name != "none":
+            raise ValueError(f"unknown indicator: {name}")
+    return [col for col in COLUMNS if col in selected]
+
+
+def indicator_map(columns: list[str]) -> dict[str, str]:
+    """``normalize_price_df`` indicator mapping restricted to ``columns``."""
+    return {name: col for name, col in OUTPUT_NAMES.items() if col in columns}
+
+
+def _window(values: np.ndarray, size: int) -> deque:
+    return deque(values[-size:].tolist(), maxlen=size)
+
+
+@dataclass
+class IndicatorState:
+    """Indicator state after the last stepped bar."""
+
+    ema12: Ewm = field(default_factory=lambda: Ewm(2 / 13))
+    ema26: Ewm = field(default_factory=lambda: Ewm(2 / 27))
+    dea: Ewm = field(default_factory=lambda: Ewm(2 / 10))
+    k: Ewm = field(default_factory=lambda: Ewm(1 / 3))
+    d: Ewm = field(default_factory=lambda: Ewm(1 / 3))
+    lows: deque = field(default_factory=lambda: deque(maxlen=KDJ_WINDOW))
+    highs: deque = field(default_factory=lambda: deque(maxlen=KDJ_WINDOW))
+    gains: deque = field(default_factory=lambda: deque(maxlen=RSI_WINDOW))
+    losses: deque = field(default_factory=lambda: deque(maxlen=RSI_WINDOW))
+    closes: deque = field(default_factory=lambda: deque(maxlen=BOLL_WINDOW))
+    prev_close: float = NAN
+
+    def copy(self) -> "IndicatorState":
+        return IndicatorState(
+            *(replace(ewm) for ewm in (self.ema12, self.ema26, self.dea, self.k, self.d)),
+            *(deque(w, maxlen=w.maxlen) for w in (self.lows, self.highs, self.gains, self.losses, self.closes)),
+            self.prev_close,
+        )
+
+    def step(self, close: float, low: float, high: float) -> tuple[float, ...]:
+        """Advance one bar and return its values in ``COLUMNS`` order."""
+        dif = self.ema12.update(close) - self.ema26.update(close)
+        dea = self.dea.update(dif)
+
+        self.lows.append(low)
+        self.highs.append(high)
+        lows = [v for v in self.lows if math.isfinite(v)]
+        highs = [v for v in self.highs if math.isfinite(v)]
+        low_min = min(lows) if lows else NAN
+        high_max = max(highs) if highs else NAN
+        rsv = _div(close - low_min, high_max - low_min) * 100
+        k = self.k.update(rsv)
+        d = self.d.update(k)
+
+        delta = close - self.prev_close
+        self.gains.append(delta if delta > 0 else 0.0)
+        self.losses.append(-(delta if delta < 0 else 0.0))
+        self.prev_close = close
+        rsi = NAN
+        if len(self.gains) == RSI_WINDOW and all(map(math.isfinite, (*self.gains, *self.losses))):
+            rs = _div(sum(self.gains) / RSI_WINDOW, sum(self.losses) / RSI_WINDOW)
+            rsi = 100 - _div(100, 1 + rs)
+
+        self.closes.append(close)
+        mid = std = NAN
+        if len(self.closes) == BOLL_WINDOW and all(map(math.isfinite, self.closes)):
+            mid = sum(self.closes) / BOLL_WINDOW
+            std = math.sqrt(sum((v - mid) ** 2 for v in self.closes) / (BOLL_WINDOW - 1))
+
+        return dif, dea, (dif - dea) * 2, k, d, 3 * k - 2 * d, rsi, mid, mid + 2 * std, mid - 2 * std
+
+
+def compute_pandas(clos: pd.Series, lows: pd.Series, high: pd.Series) -> pd.DataFrame:
+    """Reference pandas implementation of the indicator set, kept for parity tests and benchmarks."""
+    out = pd.DataFrame(index=clos.index)
     # 计算MACD指标
     ema12 = clos.ewm(span=12, adjust=False).mean()
     ema26 = clos.ewm(span=26, adjust=False).mean()
-    df["DIF"] = ema12 - ema26
-    df["DEA"] = df["DIF"].ewm(span=9, adjust=False).mean()
-    df["MACD"] = (df["DIF"] - df["DEA"]) * 2
+    out["DIF"] = ema12 - ema26
+    out["DEA"] = out["DIF"].ewm(span=9, adjust=False).mean()
+    out["MACD"] = (out["DIF"] - out["DEA"]) * 2
 
     # 计算KDJ指标
-    low_min = lows.rolling(window=9, min_periods=1).min()
-    high_max = high.rolling(window=9, min_periods=1).max()
+    low_min = lows.rolling(window=KDJ_WINDOW, min_periods=1).min()
+    high_max = high.rolling(window=KDJ_WINDOW, min_periods=1).max()
     rsv = (clos - low_min) / (high_max - low_min) * 100
-    df["KDJ.K"] = rsv.ewm(com=2, adjust=False).mean()
-    df["KDJ.D"] = df["KDJ.K"].ewm(com=2, adjust=False).mean()
-    df["KDJ.J"] = 3 * df["KDJ.K"] - 2 * df["KDJ.D"]
+    out["KDJ.K"] = rsv.ewm(com=2, adjust=False).mean()
+    out["KDJ.D"] = out["KDJ.K"].ewm(com=2, adjust=False).mean()
+    out["KDJ.J"] = 3 * out["KDJ.K"] - 2 * out["KDJ.D"]
 
     # 计算RSI指标
     delta = clos.diff()
     gain = delta.where(delta > 0, 0)
     loss = -delta.where(delta < 0, 0)
-    avg_gain = gain.rolling(window=14).mean()
-    avg_loss = loss.rolling(window=14).mean()
+    avg_gain = gain.rolling(window=RSI_WINDOW).mean()
+    avg_loss = loss.rolling(window=RSI_WINDOW).mean()
     rs = avg_gain / avg_loss
-    df["RSI"] = 100 - (100 / (1 + rs))
+    out["RSI"] = 100 - (100 / (1 + rs))
 
     # 计算布林带指标
-    df["BOLL.M"] = clos.rolling(window=20).mean()
-    std = clos.rolling(window=20).std()
-    df["BOLL.U"] = df["BOLL.M"] + 2 * std
-    df["BOLL.L"] = df["BOLL.M"] - 2 * std
+    out["BOLL.M"] = clos.rolling(window=BOLL_WINDOW).mean()
+    std = clos.rolling(window=BOLL_WINDOW).std()
+    out["BOLL.U"] = out["BOLL.M"] + 2 * std
+    out["BOLL.L"] = out["BOLL.M"] - 2 * std
+    return out
+
+
+def resume_state(inputs: np.ndarray, out: np.ndarray, parts: dict, end: int) -> IndicatorState:
+    """State after the first ``end`` bars of an ``indicator_block`` run, ready to step bar ``end``."""
+    clos, lows, high = inputs[:end, 0], inputs[:end, 1], inputs[:end, 2]
+    cols = {name: out[:end, i] for i, name in enumerate(COLUMNS)}
+    return IndicatorState(
+        ema12=Ewm.resume(2 / 13, clos, parts["ema12"][:end]),
+        ema26=Ewm.resume(2 / 27, clos, parts["ema26"][:end]),
+        dea=Ewm.resume(2 / 10, cols["DIF"], cols["DEA"]),
+        k=Ewm.resume(1 / 3, parts["rsv"][:end], cols["KDJ.K"]),
+        d=Ewm.resume(1 / 3, cols["KDJ.K"], cols["KDJ.D"]),
+        lows=_window(lows, KDJ_WINDOW),
+        highs=_window(high, KDJ_WINDOW),
+        gains=_window(parts["gain"][:end], RSI_WINDOW),
+        losses=_window(parts["loss"][:end], RSI_WINDOW),
+        closes=_window(clos, BOLL_WINDOW),
+        prev_close=float(clos[-1]) if end else NAN,
+    )
+
+
+@dataclass
+class SeriesState:
+    """Bars of one series processed so far, their outputs and the state before and after the last bar."""
+
+    times: np.ndarray
+    inputs: np.ndarray
+    outputs: np.ndarray
+    checkpoint: IndicatorState
+    last: IndicatorState
+
+
+# 各序列的指标状态，只保留最近使用的序列
+_STATES: LRUCache = LRUCache(maxsize=512)
+_STATES_LOCK = threading.Lock()
+# 每个序列保留的 K 线上限，超出时丢弃当前窗口之前最早的部分
+MAX_STATE_BARS = 5000
+
+
+def _bar_times(times) -> np.ndarray | None:
+    stamps = pd.Series(times)
+    if not pd.api.types.is_datetime64_any_dtype(stamps):
+        stamps = pd.to_datetime(stamps, errors="coerce", cache=False)
+    if stamps.isna().any():
+        return None
+    values = stamps.to_numpy("datetime64[ns]").view("i8")
+    if len(values) > 1 and not (np.diff(values) > 0).all():
+        return None
+    return values
+
+
+def _full(times: np.ndarray, inputs: np.ndarray) -> SeriesState:
+    outputs, parts = indicator_block(inputs[:, 0], inputs[:, 1], inputs[:, 2])
+    checkpoint = resume_state(inputs, outputs, parts, len(inputs) - 1)
+    last = resume_state(inputs, outputs, parts, len(inputs))
+    return SeriesState(times, inputs, outputs, checkpoint, last)
+
+
+def _extend(prev: SeriesState, keep: int, state: IndicatorState, times: np.ndarray, inputs: np.ndarray, first: int):
+    """``prev``'s first ``keep`` bars followed by the window bars from ``first`` on, stepped from ``state``."""
+    outputs = np.empty((len(times) - first, len(COLUMNS)))
+    state = state.copy()
+    for i in range(first, len(times) - 1):
+        outputs[i - first] = state.step(*inputs[i].tolist())
+    checkpoint = state.copy()
+    outputs[-1] = state.step(*inputs[-1].tolist())
+    return SeriesState(
+        np.concatenate([prev.times[:keep], times[first:]]),
+        np.concatenate([prev.inputs[:keep], inputs[first:]]),
+        np.concatenate([prev.outputs[:keep], outputs]),
+        checkpoint,
+        state,
+    )
+
+
+def _resume(prev: SeriesState, times: np.ndarray, inputs: np.ndarray) -> tuple[SeriesState, int] | None:
+    """Continue ``prev`` with the window ``times``/``inputs``; None when the window does not continue it.
+
+    Returns the series state and the position of the window's first bar in it.
+    The window must start on a stored bar and agree with the stored bars it
+    overlaps; only its last stored bar may have been revised upstream.
+    """
+    start = int(np.searchsorted(prev.times, times[0]))
+    if start >= len(prev.times) or prev.times[start] != times[0]:
+        return None
+    overlap = min(len(times), len(prev.times) - start)
+    if not np.array_equal(times[:overlap], prev.times[start : start + overlap]):
+        return None
+    old, new = prev.inputs[start : start + overlap], inputs[:overlap]
+    same = ((old == new) | (np.isnan(old) & np.isnan(new))).all(axis=1)
+    if same.all():
+        if overlap == len(times):
+            # 窗口内的 K 线都已处理过
+            return prev, start
+        return _extend(prev, len(prev.times), prev.last, times, inputs, overlap), start
+    revised = int(np.argmin(same))
+    if start + revised != len(prev.times) - 1:
+        return None
+    # 仅最后一根 K 线变化 (未完结的 K 线)，从其之前的状态重新计算
+    return _extend(prev, len(prev.times) - 1, prev.checkpoint, times, inputs, revised), start
+
+
+def _trim(series: SeriesState, offset: int) -> tuple[SeriesState, int]:
+    drop = min(offset, len(series.times) - MAX_STATE_BARS)
+    if drop <= 0:
+        return series, offset
+    trimmed = replace(series, times=series.times[drop:], inputs=series.inputs[drop:], outputs=series.outputs[drop:])
+    return trimmed, offset - drop
+
+
+def add_technical_indicators(df, clos, lows, high, key: str | None = None, times=None, columns=COLUMNS):
+    """Write the indicator ``columns`` into ``df``.
+
+    With ``key`` and ``times`` the series is resumed from its stored state,
+    which covers every indicator. Without a state to resume, only the
+    requested columns are computed, and a state is stored only when all of
+    them were requested.
+    """
+    columns = list(columns)
+    if not columns:
+        return
+    inputs = np.column_stack([np.asarray(s, dtype=np.float64) for s in (clos, lows, high)])
+    bar_times = None if key is None or times is None or df.empty else _bar_times(times)
+    if bar_times is None:
+        df[columns] = indicator_block(inputs[:, 0], inputs[:, 1], inputs[:, 2], columns)[0]
+        return
+
+    with _STATES_LOCK:
+        prev = _STATES.get(key)
+    resumed = _resume(prev, bar_times, inputs) if prev is not None else None
+    if resumed is None:
+        if tuple(columns) != tuple(COLUMNS):
+            # 冷启动只计算所需指标，不建立状态
+            df[columns] = indicator_block(inputs[:, 0], inputs[:, 1], inputs[:, 2], columns)[0]
+            return
+        resumed = _full(bar_times, inputs), 0
+    series, offset = _trim(*resumed)
+    with _STATES_LOCK:
+        _STATES[key] = series
+    outputs = series.outputs[offset : offset + len(bar_times)]
+    if tuple(columns) == tuple(COLUMNS):
+        df[columns] = outputs
+    else:
+        df[columns] = outputs[:, [COLUMNS.index(col) for col in columns]]
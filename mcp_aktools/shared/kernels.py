@@ -0,0 +1,230 @@
+"""NumPy kernels for the technical indicator set.
+
+Every indicator is computed straight from ``float64`` arrays into one
+preallocated block, column order ``COLUMNS``. Results match the pandas
+``ewm``/``rolling`` formulas they replace, including pandas' NaN handling
+(``±inf`` inputs count as missing, as in pandas).
+
+Indicators and their intermediates are registered in ``REGISTRY`` with their
+dependencies, so a caller asking for a subset only pays for that subset.
+Rolling windows are accumulated over shifted views of the input. The
+``ewm(adjust=False)`` recurrences run as a blocked scan over each run of
+observed values; when numba is installed they run as a compiled loop instead.
+"""
+
+from __future__ import annotations
+
+import math
+from collections.abc import Callable, Iterable, Sequence
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # pragma: no cover - 可选依赖
+    numba = None
+
+NUMBA = numba is not None
+
+# 输出列及其顺序
+COLUMNS = ["DIF", "DEA", "MACD", "KDJ.K", "KDJ.D", "KDJ.J", "RSI", "BOLL.M", "BOLL.U", "BOLL.L"]
+
+KDJ_WINDOW = 9
+RSI_WINDOW = 14
+BOLL_WINDOW = 20
+
+# 分块扫描: 块内权重跨度上限与块间递推截断精度
+_BLOCK_SPAN = 1e4
+_CARRY_EPS = 1e-18
+
+
+def _ewm_loop(x: np.ndarray, alpha: float, out: np.ndarray) -> np.ndarray:
+    # pandas ewm(adjust=False).mean() 的逐点递推
+    weighted = np.nan
+    old_wt = 1.0
+    for i in range(len(x)):
+        cur = x[i]
+        observed = math.isfinite(cur)
+        if weighted == weighted:
+            old_wt *= 1.0 - alpha
+            if observed:
+                if weighted != cur:
+                    weighted = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+                old_wt = 1.0
+        elif observed:
+            weighted = cur
+        out[i] = weighted
+    return out
+
+
+if NUMBA:  # pragma: no cover - 可选依赖
+    _ewm_loop = numba.njit(cache=True, nogil=True)(_ewm_loop)
+
+
+def _scan(x: np.ndarray, alpha: float, y0: float) -> np.ndarray:
+    """Solve ``y[t] = (1 - alpha) * y[t - 1] + alpha * x[t]`` with ``y[-1] = y0``."""
+    r = 1.0 - alpha
+    size = max(1, int(math.log(_BLOCK_SPAN) / -math.log(r)))
+    blocks = -(-len(x) // size)
+    steps = np.arange(size)
+    local = np.zeros((blocks, size))
+    local.ravel()[: len(x)] = x
+    # 块内从零开始的解，按块向量化
+    local *= alpha * r**-steps
+    np.cumsum(local, axis=1, out=local)
+    local *= r**steps
+    # 块间递推 c[k] = local_end[k] + R * c[k - 1]，R 足够小，只需截断的几项
+    ratio = r**size
+    ends = local[:, -1].copy()
+    carry = ends.copy()
+    weight, lag = ratio, 1
+    while weight > _CARRY_EPS and lag < blocks:
+        carry[lag:] += weight * ends[:-lag]
+        weight *= ratio
+        lag += 1
+    carry += ratio ** np.arange(1, blocks + 1) * y0
+    prev = np.concatenate(([y0], carry[:-1]))
+    local += r ** (steps + 1) * prev[:, None]
+    return local.ravel()[: len(x)]
+
+
+def ewm_mean(x: np.ndarray, alpha: float) -> np.ndarray:
+    """``pd.Series(x).ewm(alpha=alpha, adjust=False).mean()`` on a float64 array."""
+    out = np.full(len(x), np.nan)
+    if NUMBA:
+        return _ewm_loop(x, alpha, out)
+    idx = np.flatnonzero(np.isfinite(x))
+    if not len(idx):
+        return out
+    # 连续观测值为一段，段间缺失值沿用上一值，且下一观测的权重按缺失数衰减
+    breaks = np.flatnonzero(np.diff(idx) > 1) + 1
+    if len(breaks) > len(x) // 64:
+        return _ewm_loop(x, alpha, out)
+    starts = np.concatenate(([0], breaks))
+    stops = np.concatenate((breaks, [len(idx)]))
+    weighted = np.nan
+    last = -1
+    r = 1.0 - alpha
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        first, end = idx[start], idx[stop - 1] + 1
+        out[last + 1 : first] = weighted
+        if weighted != weighted:
+            weighted = x[first]
+        else:
+            old_wt = r ** (first - last)
+            weighted = (old_wt * weighted + alpha * x[first]) / (old_wt + alpha)
+        out[first] = weighted
+        if end > first + 1:
+            out[first + 1 : end] = _scan(x[first + 1 : end], alpha, weighted)
+            weighted = out[end - 1]
+        last = end - 1
+    out[last + 1 :] = weighted
+    return out
+
+
+def _lags(x: np.ndarray, window: int) -> list[np.ndarray]:
+    # 窗口内第 k 个位置的值序列，逐个累加比在窗口轴上归约快得多
+    padded = np.concatenate((np.full(window - 1, np.nan), np.where(np.isinf(x), np.nan, x)))
+    return [padded[k : k + len(x)] for k in range(window)]
+
+
+def rolling_min(x: np.ndarray, window: int) -> np.ndarray:
+    """``rolling(window, min_periods=1).min()``: NaN skipped, NaN only if the whole window is."""
+    lags = _lags(x, window)
+    out = lags[-1].copy()
+    for lag in lags[:-1]:
+        np.fmin(out, lag, out=out)
+    return out
+
+
+def rolling_max(x: np.ndarray, window: int) -> np.ndarray:
+    lags = _lags(x, window)
+    out = lags[-1].copy()
+    for lag in lags[:-1]:
+        np.fmax(out, lag, out=out)
+    return out
+
+
+def rolling_mean(x: np.ndarray, window: int) -> np.ndarray:
+    """``rolling(window).mean()``: NaN unless the full window is observed."""
+    lags = _lags(x, window)
+    out = lags[0].copy()
+    for lag in lags[1:]:
+        out += lag
+    return out / window
+
+
+def rolling_std(x: np.ndarray, window: int, mean: np.ndarray | None = None) -> np.ndarray:
+    mean = rolling_mean(x, window) if mean is None else mean
+    out = np.zeros(len(x))
+    dev = np.empty(len(x))
+    for lag in _lags(x, window):
+        np.subtract(lag, mean, out=dev)
+        out += np.square(dev, out=dev)
+    return np.sqrt(out / (window - 1), out=out)
+
+
+def _delta(close: np.ndarray) -> np.ndarray:
+    return np.diff(close, prepend=np.nan)
+
+
+# 指标注册表: 名称 -> (依赖, 计算函数)。输出列与中间序列同表登记，按需求值
+REGISTRY: dict[str, tuple[tuple[str, ...], Callable[..., np.ndarray]]] = {
+    # MACD
+    "ema12": (("close",), lambda c: ewm_mean(c, 2 / 13)),
+    "ema26": (("close",), lambda c: ewm_mean(c, 2 / 27)),
+    "DIF": (("ema12", "ema26"), np.subtract),
+    "DEA": (("DIF",), lambda dif: ewm_mean(dif, 2 / 10)),
+    "MACD": (("DIF", "DEA"), lambda dif, dea: (dif - dea) * 2),
+    # KDJ
+    "low_min": (("low",), lambda low: rolling_min(low, KDJ_WINDOW)),
+    "high_max": (("high",), lambda high: rolling_max(high, KDJ_WINDOW)),
+    "rsv": (("close", "low_min", "high_max"), lambda c, lo, hi: (c - lo) / (hi - lo) * 100),
+    "KDJ.K": (("rsv",), lambda rsv: ewm_mean(rsv, 1 / 3)),
+    "KDJ.D": (("KDJ.K",), lambda k: ewm_mean(k, 1 / 3)),
+    "KDJ.J": (("KDJ.K", "KDJ.D"), lambda k, d: 3 * k - 2 * d),
+    # RSI
+    "delta": (("close",), _delta),
+    "gain": (("delta",), lambda delta: np.where(delta > 0, delta, 0.0)),
+    "loss": (("delta",), lambda delta: -np.where(delta < 0, delta, 0.0)),
+    "RSI": (
+        ("gain", "loss"),
+        lambda gain, loss: 100 - 100 / (1 + rolling_mean(gain, RSI_WINDOW) / rolling_mean(loss, RSI_WINDOW)),
+    ),
+    # BOLL
+    "BOLL.M": (("close",), lambda c: rolling_mean(c, BOLL_WINDOW)),
+    "boll_std": (("close", "BOLL.M"), lambda c, mid: rolling_std(c, BOLL_WINDOW, mid)),
+    "BOLL.U": (("BOLL.M", "boll_std"), lambda mid, std: mid + 2 * std),
+    "BOLL.L": (("BOLL.M", "boll_std"), lambda mid, std: mid - 2 * std),
+}
+
+
+def evaluate(names: Iterable[str], values: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """Compute ``names`` and their dependencies into ``values``, skipping anything already present."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for name in names:
+            if name in values:
+                continue
+            deps, fn = REGISTRY[name]
+            evaluate(deps, values)
+            values[name] = fn(*(values[dep] for dep in deps))
+    return values
+
+
+def indicator_block(
+    close: np.ndarray, low: np.ndarray, high: np.ndarray, columns: Sequence[str] = COLUMNS
+) -> tuple[np.ndarray, dict]:
+    """Compute ``columns`` (default all of MACD/KDJ/RSI/BOLL) into one column-major block.
+
+    Only the requested columns and their dependencies are computed. Also
+    returns every evaluated series, including intermediates such as ``ema12``
+    and ``rsv`` used to resume a series incrementally.
+    """
+    values = {"close": close, "low": low, "high": high}
+    values = {name: np.asarray(a, dtype=np.float64) for name, a in values.items()}
+    evaluate(columns, values)
+    # 列优先: 每列连续存放，与 DataFrame 的列式存储一致
+    out = np.empty((len(values["close"]), len(columns)), order="F")
+    for i, name in enumerate(columns):
+        out[:, i] = values[name]
+    return out, values
@@ -0,0 +1,138 @@
+"""SQLite-backed simulated portfolio: an append-only trade journal with lot-level positions.
+
+Every ``portfolio_add`` appends one row to the ``trades`` journal; each row is
+an open lot, and positions are aggregated per ``symbol.market`` on read through
+the ``(market, symbol)`` index. The database runs in WAL mode, so readers never
+block on a writer and concurrent sessions (or processes) serialize their
+inserts instead of overwriting each other's file.
+
+The legacy ``portfolio.json`` (one lot per holding) is imported once, the
+first time a store is opened next to it; the JSON file itself is left as is.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT NOT NULL,
+    market TEXT NOT NULL,
+    price REAL NOT NULL,
+    volume REAL NOT NULL,
+    time TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trades_holding ON trades (market, symbol);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# meta 表中记录旧版 JSON 已导入
+MIGRATED = "json_migrated"
+
+TRADE_COLUMNS = ["id", "symbol", "market", "price", "volume", "time"]
+
+
+class Ledger:
+    """Portfolio store at ``path``, importing ``legacy`` JSON on first open.
+
+    Connections are per thread; every write is a single ``BEGIN IMMEDIATE``
+    transaction, waiting up to ``timeout`` seconds for another writer.
+    """
+
+    def __init__(self, path: str, legacy: str | None = None, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        if legacy:
+            self._migrate(legacy)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, statements: list[tuple[str, tuple]]) -> list[int]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = [conn.execute(sql, args).lastrowid for sql, args in statements]
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return ids
+
+    def _migrate(self, legacy: str) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (MIGRATED,)).fetchone() is None:
+                rows = []
+                if os.path.exists(legacy):
+                    with open(legacy, "r") as f:
+                        holdings = json.load(f)
+                    rows = [
+                        (v["symbol"], v["market"], float(v["price"]), float(v["volume"]), v.get("time") or "")
+                        for v in holdings.values()
+                        if isinstance(v, dict) and {"symbol", "market", "price", "volume"} <= v.keys()
+                    ]
+                conn.executemany(
+                    "INSERT INTO trades (symbol, market, price, volume, time) VALUES (?, ?, ?, ?, ?)", rows
+                )
+                conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (MIGRATED, str(len(rows))))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def add_trade(self, symbol: str, market: str, price: float, volume: float, time: str | None = None) -> int:
+        """Append one lot to the journal and return its trade id."""
+        time = time or datetime.now().isoformat()
+        sql = "INSERT INTO trades (symbol, market, price, volume, time) VALUES (?, ?, ?, ?, ?)"
+        return self._write([(sql, (symbol, market, float(price), float(volume), time))])[0]
+
+    def trades(self, symbol: str | None = None, market: str | None = None) -> pd.DataFrame:
+        """The journal in insertion order, optionally for one holding."""
+        sql, args = "SELECT id, symbol, market, price, volume, time FROM trades", ()
+        if symbol is not None and market is not None:
+            sql, args = sql + " WHERE market = ? AND symbol = ?", (market, symbol)
+        rows = self._conn().execute(sql + " ORDER BY id", args).fetchall()
+        return pd.DataFrame(rows, columns=TRADE_COLUMNS)
+
+    def positions(self) -> dict[str, dict]:
+        """Open positions keyed ``symbol.market``: total volume, volume-weighted cost and last trade time."""
+        rows = self._conn().execute(
+            "SELECT symbol, market, SUM(price * volume) / SUM(volume), SUM(volume), COUNT(*), MAX(time)"
+            " FROM trades GROUP BY market, symbol HAVING SUM(volume) != 0 ORDER BY MIN(id)"
+        )
+        return {
+            f"{symbol}.{market}": {
+                "symbol": symbol,
+                "price": price,
+                "volume": volume,
+                "market": market,
+                "lots": lots,
+                "time": time,
+            }
+            for symbol, market, price, volume, lots, time in rows
+        }
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
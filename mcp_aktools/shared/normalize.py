@@ -2,11 +2,20 @@
 
 from __future__ import annotations
 
+from dataclasses import dataclass
+
+import numpy as np
 import pandas as pd
 
+from ..cache import is_stale
 from .schema import INDICATOR_COLUMNS, PRICE_COLUMNS, RATE_COLUMNS, format_error_csv
 
 
+def _source_label(df: object, source: str) -> str:
+    # 上游失败时回退到过期缓存，在 source 列中标注
+    return f"{source}:stale" if is_stale(df) else source
+
+
 def _ensure_columns(df: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
     for col in columns:
         if col not in df.columns:
@@ -14,19 +23,60 @@ def _ensure_columns(df: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
     return df
 
 
-def normalize_price_df(
+@dataclass(frozen=True)
+class PriceFrame:
+    """Normalized price bars for in-process callers, formatted to CSV only at the tool boundary.
+
+    ``data`` is sorted by ``date`` and holds float64 ``open``/``high``/``low``/
+    ``close``/``volume``/``amount`` plus any indicator columns
+    (``INDICATOR_COLUMNS`` names), at full precision. ``version`` identifies
+    the window of bars they were computed from, when the loader keeps them versioned.
+    """
+
+    data: pd.DataFrame
+    source: str
+    currency: str
+    version: str | None = None
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, column: object) -> bool:
+        return column in self.data.columns
+
+    @property
+    def empty(self) -> bool:
+        return self.data.empty
+
+    def values(self, column: str) -> np.ndarray:
+        """``column`` as a float64 array, missing values as NaN."""
+        return pd.to_numeric(self.data[column], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+    @property
+    def close(self) -> np.ndarray:
+        return self.values("close")
+
+    def to_csv(self, float_format: str = "%.2f") -> str:
+        data = self.data.assign(currency=self.currency, source=self.source)
+        columns = PRICE_COLUMNS + [col for col in INDICATOR_COLUMNS if col in data.columns]
+        return data.to_csv(columns=columns, index=False, float_format=float_format).strip()
+
+
+def price_frame(
     df: pd.DataFrame | None,
     column_map: dict[str, str],
     source: str,
     currency: str,
     limit: int,
-    float_format: str = "%.2f",
     date_unit: str | None = None,
     indicator_map: dict[str, str] | None = None,
-) -> str:
+    version: str | None = None,
+) -> PriceFrame | None:
+    """Rename ``df`` to the canonical price columns and keep the last ``limit`` bars; ``None`` if empty."""
     if df is None or df.empty:
-        return format_error_csv("empty data", source)
+        return None
 
+    source = _source_label(df, source)
     data = df.copy()
 
     for canonical, original in column_map.items():
@@ -53,13 +103,31 @@ def normalize_price_df(
             if indicator in data.columns:
                 data[indicator] = pd.to_numeric(data[indicator], errors="coerce")
 
-    data = _ensure_columns(data, PRICE_COLUMNS)
-    data["currency"] = currency
-    data["source"] = source
+    data = _ensure_columns(data, PRICE_COLUMNS[:-2])
+    columns = PRICE_COLUMNS[:-2] + [col for col in INDICATOR_COLUMNS if col in data.columns]
+    data = data.tail(limit)[columns].reset_index(drop=True)
+    return PriceFrame(data, source=source, currency=currency, version=version)
 
-    tail = data.tail(limit)
-    columns = PRICE_COLUMNS + [col for col in INDICATOR_COLUMNS if col in tail.columns]
-    return tail.to_csv(columns=columns, index=False, float_format=float_format).strip()
+
+def format_price_csv(frame: PriceFrame | None, source: str, float_format: str = "%.2f") -> str:
+    """CSV for a tool response; the error contract when there is no data."""
+    if frame is None or frame.empty:
+        return format_error_csv("empty data", source)
+    return frame.to_csv(float_format)
+
+
+def normalize_price_df(
+    df: pd.DataFrame | None,
+    column_map: dict[str, str],
+    source: str,
+    currency: str,
+    limit: int,
+    float_format: str = "%.2f",
+    date_unit: str | None = None,
+    indicator_map: dict[str, str] | None = None,
+) -> str:
+    frame = price_frame(df, column_map, source, currency, limit, date_unit=date_unit, indicator_map=indicator_map)
+    return format_price_csv(frame, source, float_format)
 
 
 def normalize_rate_df(
@@ -74,6 +142,7 @@ def normalize_rate_df(
     if df is None:
         return format_error_csv("empty data", source)
 
+    source = _source_label(df, source)
     data = pd.DataFrame(df)
     if data.empty:
         return format_error_csv("empty data", source)
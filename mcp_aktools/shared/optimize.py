@@ -0,0 +1,138 @@
+"""Long-only portfolio allocation over a return panel: minimum variance, maximum Sharpe and risk parity.
+
+All weights are non-negative and sum to one. Minimum variance and maximum
+Sharpe are solved by projected gradient ascent on the simplex (with
+backtracking; the Sharpe ratio is pseudo-concave there, so its stationary
+point is the optimum); risk parity by damped Newton steps on its convex
+log-barrier formulation. Each iteration is a few matrix-vector products, so
+the solvers need nothing beyond NumPy.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .performance import TRADING_DAYS
+from .risk import return_panel
+
+OBJECTIVES = ("min_variance", "max_sharpe", "risk_parity")
+
+
+@dataclass(frozen=True)
+class Moments:
+    """Annualized mean and covariance of daily returns, estimated over ``days`` common trading days."""
+
+    names: list[str]
+    mean: np.ndarray
+    cov: np.ndarray
+    days: int
+
+    def subset(self, names: list[str]) -> Moments:
+        """The moments of ``names`` (a reordering or subset of ``self.names``)."""
+        index = [self.names.index(name) for name in names]
+        return Moments(list(names), self.mean[index], self.cov[np.ix_(index, index)], self.days)
+
+
+def estimate_moments(close: pd.DataFrame) -> Moments:
+    """Moments of a dates × symbols close panel, over the days every symbol traded."""
+    returns = return_panel(close)
+    if len(returns) < 2:
+        raise ValueError(f"need at least 2 common trading days, got {len(returns)}")
+    cov = np.atleast_2d(np.cov(returns, rowvar=False)) * TRADING_DAYS
+    return Moments(list(close.columns), returns.mean(axis=0) * TRADING_DAYS, cov, len(returns))
+
+
+def project_simplex(v: np.ndarray) -> np.ndarray:
+    """Euclidean projection of ``v`` onto ``{w >= 0, sum(w) = 1}``."""
+    u = np.sort(v)[::-1]
+    cumulative = np.cumsum(u) - 1
+    rho = np.nonzero(u > cumulative / np.arange(1, len(v) + 1))[0][-1]
+    return np.maximum(v - cumulative[rho] / (rho + 1), 0)
+
+
+def _ascend(value, gradient, w: np.ndarray, iterations: int = 5000, tol: float = 1e-12) -> np.ndarray:
+    # 单纯形上的投影梯度上升，回溯线搜索 (Armijo)
+    step, current = 1.0, value(w)
+    for _ in range(iterations):
+        g = gradient(w)
+        while True:
+            candidate = project_simplex(w + step * g)
+            found = value(candidate)
+            if found >= current + 1e-4 * g @ (candidate - w) or step < 1e-14:
+                break
+            step /= 2
+        if np.abs(candidate - w).max() < tol:
+            return candidate
+        w, current, step = candidate, found, step * 2
+    return w
+
+
+def min_variance(cov: np.ndarray) -> np.ndarray:
+    """Long-only weights with the lowest portfolio variance ``w' cov w``."""
+    n = len(cov)
+    return _ascend(lambda w: -(w @ cov @ w), lambda w: -2 * (cov @ w), np.full(n, 1 / n))
+
+
+def max_sharpe(mean: np.ndarray, cov: np.ndarray, risk_free: float = 0.0) -> np.ndarray:
+    """Maximum Sharpe weights; ``ValueError`` when no symbol's expected return beats ``risk_free``."""
+    excess = mean - risk_free
+    if not (excess > 0).any():
+        raise ValueError("no symbol has an expected return above the risk-free rate")
+
+    vol = np.sqrt(np.clip(np.diag(cov), 0, None))
+    riskless = np.nonzero((vol == 0) & (excess > 0))[0]
+    if len(riskless):
+        # 无波动且收益高于无风险利率的标的夏普无穷大
+        return np.eye(len(mean))[riskless[np.argmax(excess[riskless])]]
+
+    def sharpe(w):
+        return excess @ w / np.sqrt(w @ cov @ w)
+
+    def gradient(w):
+        risk = np.sqrt(w @ cov @ w)
+        return excess / risk - (excess @ w) * (cov @ w) / risk**3
+
+    # 从单个标的夏普最高处与等权的中点出发，无波动的标的不作为起点
+    ratio = np.divide(excess, vol, out=np.full_like(excess, -np.inf), where=vol > 0)
+    start = np.eye(len(mean))[np.argmax(ratio)]
+    return _ascend(sharpe, gradient, 0.5 * start + 0.5 / len(mean))
+
+
+def risk_parity(cov: np.ndarray, iterations: int = 100, tol: float = 1e-12) -> np.ndarray:
+    """Weights whose risk contributions ``w_i (cov w)_i`` are all equal."""
+    n = len(cov)
+    budget = np.full(n, 1 / n)
+    # min 1/2 y'Σy - Σ b·log(y)，最优解归一化即为等风险贡献权重
+    y = budget / np.sqrt(np.clip(np.diag(cov), 1e-18, None))
+    for _ in range(iterations):
+        g = cov @ y - budget / y
+        step = np.linalg.solve(cov + np.diag(budget / y**2), g)
+        scale = 1.0
+        while np.any(y - scale * step <= 0):
+            scale /= 2
+        y = y - scale * step
+        if np.abs(g).max() < tol:
+            break
+    return y / y.sum()
+
+
+def allocate(moments: Moments, objective: str, risk_free: float = 0.0) -> np.ndarray:
+    """Weights of ``moments.names`` for one of ``OBJECTIVES``."""
+    if objective == "min_variance":
+        return min_variance(moments.cov)
+    if objective == "max_sharpe":
+        return max_sharpe(moments.mean, moments.cov, risk_free)
+    if objective == "risk_parity":
+        return risk_parity(moments.cov)
+    raise ValueError(f"unknown objective: {objective} (支持: {', '.join(OBJECTIVES)})")
+
+
+def describe(moments: Moments, weights: np.ndarray, risk_free: float = 0.0) -> dict[str, float]:
+    """Expected annual return, volatility and Sharpe ratio of ``weights``."""
+    expected = float(moments.mean @ weights)
+    volatility = float(np.sqrt(weights @ moments.cov @ weights))
+    sharpe = (expected - risk_free) / volatility if volatility > 0 else float("nan")
+    return {"expected_return": expected, "volatility": volatility, "sharpe": sharpe}
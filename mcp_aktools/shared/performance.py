@@ -0,0 +1,109 @@
+"""Portfolio equity curve rebuilt from a trade journal and a date-aligned close panel.
+
+Trades are scattered onto a date × holding matrix once; share counts, market
+values and cash flows are cumulative sums over it, so the whole history is a
+handful of array operations regardless of how many trades or holdings there
+are. Daily returns are time-weighted: a buy is counted as capital at the start
+of its trade day, so adding money never shows up as performance.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .backtest import BacktestResult, _result
+
+TRADING_DAYS = 252
+
+
+@dataclass(frozen=True)
+class Performance:
+    """Daily equity of a traded book and its per-holding breakdown."""
+
+    dates: pd.DatetimeIndex
+    value: np.ndarray  # 每日持仓市值
+    invested: np.ndarray  # 累计投入 (窗口前的持仓按首日收盘价计入)
+    result: BacktestResult  # 时间加权日收益、净值、累计收益与最大回撤，自首笔持仓起
+    positions: pd.DataFrame  # 每个标的的持仓、成本、市值、盈亏与收益贡献
+
+    @property
+    def volatility(self) -> float:
+        """Annualized standard deviation of the daily returns."""
+        returns = self.result.returns
+        return float(np.std(returns, ddof=1) * np.sqrt(TRADING_DAYS)) if len(returns) > 1 else float("nan")
+
+    @property
+    def sharpe(self) -> float | None:
+        """Annualized Sharpe ratio at a zero risk-free rate; ``None`` without variation."""
+        returns = self.result.returns
+        std = np.std(returns, ddof=1) if len(returns) > 1 else 0.0
+        return float(np.mean(returns) / std * np.sqrt(TRADING_DAYS)) if std > 0 else None
+
+
+def performance(close: pd.DataFrame, trades: pd.DataFrame) -> Performance:
+    """Replay ``trades`` (``holding``, ``date``, ``price``, ``volume``) over ``close`` (dates × holdings).
+
+    A trade counts from the close of the first panel date on or after its
+    ``date``; trades dated before the panel, or without a date, are carried in
+    at the first close. Trades on holdings missing from ``close`` or after its
+    last date are ignored. Gaps in ``close`` are filled from neighbouring bars.
+    """
+    dates = pd.DatetimeIndex(close.index)
+    columns = close.columns
+    prices = close.ffill().bfill().to_numpy(dtype=np.float64)
+    when = pd.to_datetime(trades["date"], format="ISO8601", errors="coerce").dt.normalize().to_numpy()
+    # 窗口之前 (或未记录日期) 的买入按首日收盘价计入，避免把窗口外的涨跌算作首日收益
+    carried = np.isnat(when) | (when < dates[0].to_datetime64())
+    col = columns.get_indexer(trades["holding"])
+    row = np.where(carried, 0, dates.searchsorted(when, side="left"))
+    keep = (col >= 0) & (row < len(dates))
+    col, row, carried = col[keep], row[keep], carried[keep]
+    volume = trades["volume"].to_numpy(dtype=np.float64)[keep]
+    price = trades["price"].to_numpy(dtype=np.float64)[keep]
+    entry = np.where(carried, prices[0, col], price)
+
+    shape = (len(dates), len(columns))
+    shares, flows = np.zeros(shape), np.zeros(shape)
+    np.add.at(shares, (row, col), volume)
+    np.add.at(flows, (row, col), entry * volume)
+    shares = np.cumsum(shares, axis=0)
+    value = shares * prices
+
+    # 每日盈亏 = 市值变化 - 当日买入金额；收益基数 = 昨日市值 + 当日买入金额
+    previous = np.vstack([np.zeros((1, shape[1])), value[:-1]])
+    gain = value - previous - flows
+    base = previous.sum(axis=1) + flows.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        contribution = np.where(base[:, None] > 0, gain / base[:, None], 0.0)
+    returns = contribution.sum(axis=1)
+    first = int(np.argmax(base > 0)) if (base > 0).any() else len(dates)
+
+    cost = np.zeros(shape[1])
+    np.add.at(cost, col, price * volume)
+    held = shares[-1] if len(dates) else np.zeros(shape[1])
+    last = prices[-1] if len(dates) else np.full(shape[1], np.nan)
+    worth = held * last
+    with np.errstate(divide="ignore", invalid="ignore"):
+        positions = pd.DataFrame(
+            {
+                "volume": held,
+                "cost": np.where(held != 0, cost / held, np.nan),
+                "close": last,
+                "value": worth,
+                "pnl": worth - cost,
+                "return": np.where(cost != 0, worth / cost - 1, np.nan),
+                "weight": worth / worth.sum() if worth.sum() else np.nan,
+                "contribution": contribution.sum(axis=0),
+            },
+            index=columns,
+        )
+    return Performance(
+        dates=dates,
+        value=value.sum(axis=1),
+        invested=np.cumsum(flows.sum(axis=1)),
+        result=_result(returns[first:]),
+        positions=positions[held != 0],
+    )
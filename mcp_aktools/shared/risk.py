@@ -0,0 +1,135 @@
+"""Monte Carlo value-at-risk and expected shortfall for a book of holdings.
+
+Both estimators simulate ``paths`` scenarios of each holding's return over
+``horizon`` days:
+
+- ``historical``: each day is a whole row drawn (with replacement) from the
+  observed return panel, keeping the cross-section of that day intact, and
+  the days are compounded;
+- ``parametric``: daily log returns are taken as multivariate normal with the
+  panel's mean and covariance, so the ``horizon``-day log return is one draw
+  from the same distribution scaled by ``horizon``, whatever its length.
+
+Scenarios are generated in chunks of at most ``CHUNK_ELEMENTS`` random
+numbers, so memory stays bounded for any path count. The generator is
+consumed in the same order whatever the chunk size, so a given ``seed``
+always yields the same estimate.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+METHODS = ("historical", "parametric")
+
+# 每批模拟的随机数个数上限 (float64, 约 32 MB)
+CHUNK_ELEMENTS = 4_000_000
+MAX_PATHS = 100_000
+MAX_HORIZON = 250
+
+
+@dataclass(frozen=True)
+class RiskEstimate:
+    """Loss quantiles of simulated P&L, as positive amounts in the book's currency."""
+
+    method: str
+    var: float
+    es: float
+    paths: int
+    horizon: int
+    confidence: float
+
+
+def check_options(method: str, paths: int, horizon: int, confidence: float) -> None:
+    """Raise ``ValueError`` on simulation options :func:`estimate` does not accept."""
+    if method not in METHODS:
+        raise ValueError(f"unknown method: {method} (支持: {', '.join(METHODS)})")
+    if not 1 <= paths <= MAX_PATHS:
+        raise ValueError(f"paths must be between 1 and {MAX_PATHS}")
+    if not 1 <= horizon <= MAX_HORIZON:
+        raise ValueError(f"horizon must be between 1 and {MAX_HORIZON} days")
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1")
+
+
+def return_panel(close: pd.DataFrame) -> np.ndarray:
+    """Daily simple returns (days × holdings) of a close panel, keeping only days every holding traded.
+
+    Closes are forward-filled first, so a holiday in one market is a zero
+    return there rather than a dropped day.
+    """
+    returns = close.ffill().pct_change(fill_method=None).iloc[1:]
+    return returns.dropna().to_numpy(dtype=np.float64)
+
+
+def covariance_factor(returns: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Mean vector and a factor ``L`` with ``L @ L.T`` equal to the sample covariance.
+
+    Uses an eigen-decomposition rather than Cholesky, so singular covariances
+    (duplicate or constant holdings) are accepted.
+    """
+    cov = np.atleast_2d(np.cov(returns, rowvar=False))
+    eigenvalues, eigenvectors = np.linalg.eigh(cov)
+    return returns.mean(axis=0), eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+
+
+def _chunks(paths: int, per_path: int):
+    size = max(CHUNK_ELEMENTS // max(per_path, 1), 1)
+    for start in range(0, paths, size):
+        yield min(size, paths - start)
+
+
+def simulate_pnl(
+    returns: np.ndarray,
+    values: np.ndarray,
+    method: str = "historical",
+    paths: int = 10_000,
+    horizon: int = 1,
+    seed: int | None = None,
+) -> np.ndarray:
+    """P&L of ``values`` (amount per holding) on each of ``paths`` simulated ``horizon``-day scenarios."""
+    if method not in METHODS:
+        raise ValueError(f"unknown method: {method} (支持: {', '.join(METHODS)})")
+    days, holdings = returns.shape
+    if days < 2:
+        raise ValueError("need at least 2 days of returns")
+    rng = np.random.default_rng(seed)
+    values = np.asarray(values, dtype=np.float64)
+    pnl = []
+    if method == "historical":
+        for count in _chunks(paths, horizon * holdings):
+            # 逐日复利: (paths, horizon, holdings) -> (paths, holdings)
+            growth = np.prod(1 + returns[rng.integers(0, days, size=(count, horizon))], axis=1) - 1
+            pnl.append(growth @ values)
+    else:
+        mean, factor = covariance_factor(np.log1p(returns))
+        for count in _chunks(paths, holdings):
+            log_growth = horizon * mean + np.sqrt(horizon) * (rng.standard_normal((count, holdings)) @ factor.T)
+            pnl.append(np.expm1(log_growth) @ values)
+    return np.concatenate(pnl)
+
+
+def value_at_risk(pnl: np.ndarray, confidence: float = 0.95) -> tuple[float, float]:
+    """``(VaR, ES)`` of a P&L sample at ``confidence``, as positive losses."""
+    var = -float(np.quantile(pnl, 1 - confidence))
+    tail = pnl[pnl <= -var]
+    return var, -float(tail.mean()) if len(tail) else var
+
+
+def estimate(
+    returns: np.ndarray,
+    values: np.ndarray,
+    method: str = "historical",
+    paths: int = 10_000,
+    horizon: int = 1,
+    confidence: float = 0.95,
+    seed: int | None = None,
+) -> RiskEstimate:
+    """VaR and expected shortfall of ``values`` by Monte Carlo over ``returns`` (days × holdings)."""
+    check_options(method, paths, horizon, confidence)
+    pnl = simulate_pnl(returns, values, method, paths, horizon, seed)
+    var, es = value_at_risk(pnl, confidence)
+    return RiskEstimate(method, var, es, paths, horizon, confidence)
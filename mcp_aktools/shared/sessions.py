@@ -0,0 +1,107 @@
+"""Trading-session aware cache TTLs.
+
+While a market is open, data is cached for a short TTL that never runs past
+the end of the current session (plus a short settling delay). While it is
+closed, entries stay fresh until the next session opens, so nights, weekends
+and holidays do not trigger upstream refetches. End-of-day datasets that are
+published some time after the close pass ``closed_ttl`` to keep refreshing
+while the market is closed instead.
+
+A-share and SGE trading days come from the ``tool_trade_date_hist_sina``
+calendar, refreshed in the background so computing a TTL never waits on
+upstream; other markets, and a cold start, fall back to weekdays.
+"""
+
+from __future__ import annotations
+
+import time as _time
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+import akshare as ak
+
+from .utils import _executor, ak_cache, inflight
+
+# 各市场交易时段 (当地时间)，收盘早于开盘表示跨越午夜的夜盘
+SESSIONS: dict[str, tuple[str, list[tuple[time, time]]] | None] = {
+    "a": ("Asia/Shanghai", [(time(9, 15), time(11, 30)), (time(13, 0), time(15, 0))]),
+    "hk": ("Asia/Hong_Kong", [(time(9, 30), time(12, 0)), (time(13, 0), time(16, 0))]),
+    "us": ("America/New_York", [(time(9, 30), time(16, 0))]),
+    "sge": ("Asia/Shanghai", [(time(9, 0), time(11, 30)), (time(13, 30), time(15, 30)), (time(20, 0), time(2, 30))]),
+    "crypto": None,
+}
+
+# 使用 A 股交易日历的市场
+CN_CALENDAR = {"a", "sge"}
+
+# 工具参数中的市场代码
+MARKET_ALIASES = {"sh": "a", "sz": "a", "bj": "a"}
+
+# 收盘后继续按盘中 TTL 缓存一段时间，等待上游落定收盘数据
+SETTLE_SECONDS = 300
+MIN_TTL = 60
+
+# 交易日历刷新间隔 (秒)，获取失败时同样等待该间隔后重试
+CALENDAR_REFRESH = 3600
+
+# (上次加载的 monotonic 时间, 交易日集合, 日历最后一天)
+_calendar: tuple[float | None, frozenset[date], date | None] = (None, frozenset(), None)
+
+
+def _load_calendar() -> None:
+    global _calendar
+    dfs = ak_cache(ak.tool_trade_date_hist_sina, ttl=43200)
+    loaded = _time.monotonic()
+    if dfs is None or dfs.empty:
+        _calendar = (loaded, _calendar[1], _calendar[2])
+        return
+    days = frozenset(dfs["trade_date"])
+    _calendar = (loaded, days, max(days))
+
+
+def _cn_trade_days() -> tuple[frozenset[date], date | None]:
+    loaded, days, last = _calendar
+    if loaded is None or _time.monotonic() - loaded > CALENDAR_REFRESH:
+        inflight.submit("sessions-calendar", _load_calendar, _executor)
+    return days, last
+
+
+def is_trading_day(market: str, day: date) -> bool:
+    market = MARKET_ALIASES.get(market, market)
+    if SESSIONS.get(market) is None:
+        return True
+    if market in CN_CALENDAR:
+        days, last = _cn_trade_days()
+        if last is not None and day <= last:
+            return day in days
+    return day.weekday() < 5
+
+
+def market_ttl(market: str, open_ttl: int, now: datetime | None = None, *, closed_ttl: int | None = None) -> int:
+    """Return the cache TTL in seconds for data of ``market`` at ``now``.
+
+    ``open_ttl`` is used while the market is open, capped at the end of the
+    current session. When closed, the TTL lasts until the next session opens,
+    or at most ``closed_ttl`` seconds if given.
+    """
+    market = MARKET_ALIASES.get(market, market)
+    spec = SESSIONS.get(market)
+    if spec is None:
+        return open_ttl
+    tz = ZoneInfo(spec[0])
+    now = now.astimezone(tz) if now else datetime.now(tz)
+    settle = timedelta(seconds=SETTLE_SECONDS)
+    # 从前一天开始，覆盖跨越午夜的夜盘
+    for offset in range(-1, 31):
+        day = now.date() + timedelta(days=offset)
+        if not is_trading_day(market, day):
+            continue
+        for start, end in spec[1]:
+            opened = datetime.combine(day, start, tz)
+            closed = datetime.combine(day if end > start else day + timedelta(days=1), end, tz)
+            if opened <= now < closed + settle:
+                return max(MIN_TTL, min(open_ttl, int((closed + settle - now).total_seconds())))
+            if now < opened:
+                ttl = int((opened - now).total_seconds())
+                return max(MIN_TTL, min(ttl, closed_ttl) if closed_ttl else ttl)
+    return open_ttl
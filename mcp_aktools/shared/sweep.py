@@ -0,0 +1,285 @@
+"""Parameter sweeps: backtest every combination of a parameter grid over one price series.
+
+Each indicator series a combination reads (a moving average, an RSI or a
+Bollinger band for one window, ...) is computed once in the calling process
+and shared by every combination using that window. Combinations are then
+split into shards; large sweeps run the shards on a process pool, each shard
+receiving only the series it reads, while small ones run inline where the pool
+start-up would cost more than the work.
+"""
+
+from __future__ import annotations
+
+import itertools
+import multiprocessing
+import os
+import re
+import threading
+from collections.abc import Callable, Iterable
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from . import kernels
+from .backtest import band_signal, cross_signal, run_backtest, threshold_signal
+
+# 单次扫描的组合数上限
+MAX_COMBOS = 5000
+# 组合数 x K 线数低于该值时在当前进程内计算
+POOL_MIN_WORK = 2_000_000
+# 扫描进程池的进程数，也用于划分任务分片
+POOL_WORKERS = min(4, os.cpu_count() or 1)
+SORT_KEYS = {"return": "return", "drawdown": "max_drawdown", "win_rate": "win_rate"}
+
+Series = tuple  # ("ma", 5) / ("rsi", 14) / ("dea", 12, 26, 9) ...
+
+
+def _ema(close: np.ndarray, span: int) -> np.ndarray:
+    return kernels.ewm_mean(close, 2 / (span + 1))
+
+
+def compute_series(key: Series, close: np.ndarray, low: np.ndarray, high: np.ndarray, memo: dict) -> np.ndarray:
+    """Indicator series ``key`` over the bars, memoized (with its intermediates) in ``memo``."""
+    if key in memo:
+        return memo[key]
+    kind, *args = key
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if kind == "ma":
+            # 与 backtest 中 SMA/MA_CROSS 的 pandas rolling 完全一致
+            out = pd.Series(close).rolling(args[0]).mean().to_numpy()
+        elif kind == "ema":
+            out = _ema(close, args[0])
+        elif kind == "dif":
+            fast, slow = args
+            out = compute_series(("ema", fast), close, low, high, memo) - compute_series(
+                ("ema", slow), close, low, high, memo
+            )
+        elif kind == "dea":
+            fast, slow, signal = args
+            out = _ema(compute_series(("dif", fast, slow), close, low, high, memo), signal)
+        elif kind == "rsi":
+            delta = np.diff(close, prepend=np.nan)
+            gain = kernels.rolling_mean(np.where(delta > 0, delta, 0.0), args[0])
+            loss = kernels.rolling_mean(-np.where(delta < 0, delta, 0.0), args[0])
+            out = 100 - 100 / (1 + gain / loss)
+        elif kind == "mid":
+            out = kernels.rolling_mean(close, args[0])
+        elif kind == "std":
+            out = kernels.rolling_std(close, args[0], compute_series(("mid", args[0]), close, low, high, memo))
+        elif kind == "kdj_k":
+            window = args[0]
+            low_min = kernels.rolling_min(low, window)
+            high_max = kernels.rolling_max(high, window)
+            out = kernels.ewm_mean((close - low_min) / (high_max - low_min) * 100, 1 / 3)
+        elif kind == "kdj_d":
+            out = kernels.ewm_mean(compute_series(("kdj_k", args[0]), close, low, high, memo), 1 / 3)
+        else:
+            raise KeyError(key)
+    memo[key] = out
+    return out
+
+
+@dataclass(frozen=True)
+class SweepSpec:
+    """How a strategy's parameters map to indicator series and a position signal."""
+
+    defaults: dict[str, float]
+    needs: Callable[[dict], list[Series]]
+    signal: Callable[[dict, dict, np.ndarray], np.ndarray]
+    valid: Callable[[dict], bool] = lambda p: True
+
+
+def _ma_spec(short: int, long: int) -> SweepSpec:
+    return SweepSpec(
+        {"short": short, "long": long},
+        lambda p: [("ma", p["short"]), ("ma", p["long"])],
+        lambda p, s, close: (s[("ma", p["short"])] > s[("ma", p["long"])]).astype(np.float64),
+        lambda p: p["short"] < p["long"],
+    )
+
+
+def _boll_signal(p: dict, s: dict, close: np.ndarray) -> np.ndarray:
+    mid, std = s[("mid", p["window"])], s[("std", p["window"])]
+    return band_signal(close, mid - p["width"] * std, mid + p["width"] * std)
+
+
+SWEEPS: dict[str, SweepSpec] = {
+    "SMA": _ma_spec(5, 20),
+    "MA_CROSS": _ma_spec(10, 30),
+    "RSI": SweepSpec(
+        {"window": 14, "lower": 30, "upper": 70},
+        lambda p: [("rsi", p["window"])],
+        lambda p, s, close: threshold_signal(s[("rsi", p["window"])], p["lower"], p["upper"]),
+        lambda p: p["lower"] < p["upper"],
+    ),
+    "MACD": SweepSpec(
+        {"fast": 12, "slow": 26, "signal": 9},
+        lambda p: [("dif", p["fast"], p["slow"]), ("dea", p["fast"], p["slow"], p["signal"])],
+        lambda p, s, close: (s[("dif", p["fast"], p["slow"])] > s[("dea", p["fast"], p["slow"], p["signal"])]).astype(
+            np.float64
+        ),
+        lambda p: p["fast"] < p["slow"],
+    ),
+    "BOLL": SweepSpec(
+        {"window": 20, "width": 2},
+        lambda p: [("mid", p["window"]), ("std", p["window"])],
+        _boll_signal,
+        lambda p: p["window"] >= 2 and p["width"] > 0,
+    ),
+    "KDJ": SweepSpec(
+        {"window": 9},
+        lambda p: [("kdj_k", p["window"]), ("kdj_d", p["window"])],
+        lambda p, s, close: cross_signal(s[("kdj_k", p["window"])], s[("kdj_d", p["window"])]),
+    ),
+}
+SWEEPS["MACROSS"] = SWEEPS["MA_CROSS"]
+
+# 窗口类参数 (取整数，决定预热长度)
+_WINDOWS = {"short", "long", "window", "fast", "slow", "signal"}
+
+
+def _values(text: str) -> list[float]:
+    if ":" in text:
+        parts = [float(v) for v in text.split(":")]
+        if len(parts) not in (2, 3) or (len(parts) == 3 and parts[2] <= 0):
+            raise ValueError(f"invalid range: {text}")
+        start, stop, step = parts[0], parts[1], parts[2] if len(parts) == 3 else 1
+        count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        return [round(start + i * step, 10) for i in range(max(count, 0))]
+    return [float(v) for v in text.split(",") if v]
+
+
+def parse_grid(strategy: str, spec: str) -> dict[str, list[float]]:
+    """Parse ``short=3:10 long=20:60:5`` / ``lower=20,25,30;upper=70`` into a grid over ``strategy``'s parameters.
+
+    ``a:b[:step]`` is an inclusive range, ``a,b,c`` a list; unspecified
+    parameters keep the strategy default. Raises ``ValueError`` on bad input.
+    """
+    defaults = SWEEPS[strategy].defaults
+    grid = {name: [value] for name, value in defaults.items()}
+    for item in re.split(r"[\s;；]+", (spec or "").strip()):
+        if not item:
+            continue
+        name, sep, text = item.partition("=")
+        name = name.strip().lower()
+        if not sep or name not in defaults:
+            raise ValueError(f"unknown parameter: {name or item} (支持: {', '.join(defaults)})")
+        try:
+            values = _values(text.replace("，", ","))
+        except ValueError:
+            raise ValueError(f"invalid values for {name}: {text}") from None
+        if not values:
+            raise ValueError(f"invalid values for {name}: {text}")
+        if name in _WINDOWS:
+            if any(v < 1 or v != int(v) for v in values):
+                raise ValueError(f"{name} must be positive integers: {text}")
+            values = [int(v) for v in values]
+        grid[name] = sorted(set(values))
+    return grid
+
+
+def combinations(strategy: str, grid: dict[str, list[float]]) -> list[dict]:
+    """Valid parameter combinations of ``grid``; raises ``ValueError`` past ``MAX_COMBOS``."""
+    names = list(grid)
+    total = int(np.prod([len(v) for v in grid.values()]))
+    if total > MAX_COMBOS:
+        raise ValueError(f"too many combinations: {total} > {MAX_COMBOS}")
+    valid = SWEEPS[strategy].valid
+    return [p for p in (dict(zip(names, values)) for values in itertools.product(*grid.values())) if valid(p)]
+
+
+def warmup(grid: dict[str, list[float]]) -> int:
+    """Bars of history to load before the evaluated range so the longest window is filled."""
+    longest = [max(values) for name, values in grid.items() if name in _WINDOWS]
+    return int(sum(longest)) if longest else 0
+
+
+def _run_shard(strategy: str, close: np.ndarray, combos: list[dict], series: dict) -> list[tuple]:
+    spec = SWEEPS[strategy]
+    rows = []
+    for params in combos:
+        signal = spec.signal(params, series, close)
+        result = run_backtest(close, signal)
+        trades = int(np.count_nonzero(np.diff(signal, prepend=0.0) > 0))
+        rows.append((result.cumulative_return, result.max_drawdown, result.win_rate, trades))
+    return rows
+
+
+def _shards(items: list, count: int) -> Iterable[list]:
+    size = -(-len(items) // count)
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def process_pool() -> ProcessPoolExecutor:
+    """Shared process pool for sweeps, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: 服务进程内有线程池，fork 不安全
+            _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def sweep(
+    strategy: str,
+    grid: dict[str, list[float]],
+    close: np.ndarray,
+    low: np.ndarray | None = None,
+    high: np.ndarray | None = None,
+    bars: int | None = None,
+    executor: Executor | None = None,
+) -> pd.DataFrame:
+    """Backtest every valid combination of ``grid`` on the last ``bars`` bars (default all).
+
+    Indicators are computed over the whole series (earlier bars serve as
+    warm-up). Returns one row per combination: the parameters, ``return``,
+    ``max_drawdown``, ``win_rate`` and ``trades``. ``executor`` overrides the
+    choice between inline evaluation and the shared process pool.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    low = close if low is None else np.asarray(low, dtype=np.float64)
+    high = close if high is None else np.asarray(high, dtype=np.float64)
+    spec = SWEEPS[strategy]
+    combos = combinations(strategy, grid)
+    columns = [*grid, "return", "max_drawdown", "win_rate", "trades"]
+    if not combos or not len(close):
+        return pd.DataFrame(columns=columns)
+
+    # 每个窗口的指标只计算一次，只保留评估区间
+    start = max(len(close) - (bars or len(close)), 0)
+    memo: dict = {}
+    for params in combos:
+        for key in spec.needs(params):
+            compute_series(key, close, low, high, memo)
+    series = {key: values[start:] for key, values in memo.items()}
+    close = close[start:]
+
+    if executor is None and len(combos) * len(close) >= POOL_MIN_WORK:
+        executor = process_pool()
+    if executor is None:
+        rows = _run_shard(strategy, close, combos, series)
+    else:
+        futures = []
+        for shard in _shards(combos, POOL_WORKERS * 4):
+            needed = {key for params in shard for key in spec.needs(params)}
+            futures.append(executor.submit(_run_shard, strategy, close, shard, {k: series[k] for k in needed}))
+        rows = [row for future in futures for row in future.result()]
+
+    params = pd.DataFrame(combos, columns=list(grid))
+    return pd.concat([params, pd.DataFrame(rows, columns=columns[len(grid) :])], axis=1)
+
+
+def rank(results: pd.DataFrame, sort_by: str = "return") -> pd.DataFrame:
+    """Order sweep results best first by ``return``, ``drawdown`` (shallowest) or ``win_rate``."""
+    if sort_by not in SORT_KEYS:
+        raise ValueError(f"unknown sort key: {sort_by} (支持: {', '.join(SORT_KEYS)})")
+    # 主排序键相同时依次比较收益、回撤、胜率
+    keys = [SORT_KEYS[sort_by], *(k for k in ("return", "max_drawdown", "win_rate") if k != SORT_KEYS[sort_by])]
+    return results.sort_values(keys, ascending=False, na_position="last", kind="stable").reset_index(drop=True)
@@ -0,0 +1,311 @@
+"""Indexed symbol lookup over akshare listing frames.
+
+Each listing (e.g. ``stock_info_a_code_name``) gets a :class:`SymbolIndex`
+holding hash maps for exact code/name matches and one separator-joined name
+string for prefix and substring matches, so a lookup is a few dict probes and
+one ``str.find`` instead of an ``iterrows`` scan.
+
+Indexes are rebuilt only when the listing content changes and are persisted
+in the cache next to the listing itself.
+
+:class:`SearchEngine` combines all listings for ranked search: character
+n-grams, pinyin initials (``gzmt`` -> 贵州茅台) and code prefixes generate
+candidates, which are then scored.
+"""
+
+from __future__ import annotations
+
+import heapq
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+
+import akshare as ak
+import pandas as pd
+from pypinyin import Style, lazy_pinyin
+
+from ..cache import CacheKey
+
+# 证券清单: 市场, 接口, 代码列, 名称列，按匹配优先级排列
+LISTINGS = [
+    ["sh", ak.stock_info_a_code_name, "code", "name"],
+    ["sh", ak.stock_info_sh_name_code, "证券代码", "证券简称"],
+    ["sz", ak.stock_info_sz_name_code, "A股代码", "A股简称"],
+    ["hk", ak.stock_hk_spot, "代码", "中文名称"],
+    ["hk", ak.stock_hk_spot_em, "代码", "名称"],
+    ["us", ak.get_us_stock_name, "symbol", "cname"],
+    ["us", ak.get_us_stock_name, "symbol", "name"],
+    ["sh", ak.fund_etf_spot_ths, "基金代码", "基金名称"],
+    ["sz", ak.fund_etf_spot_ths, "基金代码", "基金名称"],
+    ["sh", ak.fund_info_index_em, "基金代码", "基金名称"],
+    ["sz", ak.fund_info_index_em, "基金代码", "基金名称"],
+    ["sh", ak.fund_etf_spot_em, "代码", "名称"],
+    ["sz", ak.fund_etf_spot_em, "代码", "名称"],
+]
+
+# 名称拼接分隔符，关键词中不会出现
+SEP = "\x00"
+
+# 同一份清单对象的索引直接复用: key -> (清单, 索引)
+_INDEXES: dict[str, tuple[pd.DataFrame, "SymbolIndex"]] = {}
+
+
+@dataclass
+class SymbolIndex:
+    fingerprint: int
+    codes: dict[str, int]
+    names: dict[str, int]
+    joined: str
+    offsets: list[int]
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, code_col: str, name_col: str, fingerprint: int = 0) -> "SymbolIndex":
+        codes = df[code_col].astype(str).tolist()
+        names = df[name_col].astype(str).tolist()
+        code_map: dict[str, int] = {}
+        name_map: dict[str, int] = {}
+        for pos, (code, name) in enumerate(zip(codes, names)):
+            code_map.setdefault(code.upper(), pos)
+            name_map.setdefault(name.upper(), pos)
+        offsets = []
+        start = len(SEP)
+        for name in names:
+            offsets.append(start)
+            start += len(name) + len(SEP)
+        return cls(fingerprint, code_map, name_map, SEP + SEP.join(names), offsets)
+
+    def _row(self, pos: int) -> int | None:
+        if pos < 0:
+            return None
+        return bisect_right(self.offsets, pos) - 1
+
+    def exact(self, symbol: str | None = None, keyword: str | None = None) -> int | None:
+        """Return the first row whose code equals ``symbol`` or whose code/name equals ``keyword``."""
+        hits = []
+        if symbol:
+            hits.append(self.codes.get(symbol.upper()))
+        if keyword:
+            hits.append(self.codes.get(keyword.upper()))
+            hits.append(self.names.get(keyword.upper()))
+        hits = [h for h in hits if h is not None]
+        return min(hits) if hits else None
+
+    def match(self, keyword: str) -> int | None:
+        """Return the first row whose name starts with ``keyword`` (or contains it, for 4+ chars)."""
+        if not keyword or SEP in keyword:
+            return None
+        if len(keyword) >= 4:
+            return self._row(self.joined.find(keyword))
+        pos = self.joined.find(SEP + keyword)
+        return self._row(pos + len(SEP) if pos >= 0 else -1)
+
+
+def fingerprint(df: pd.DataFrame, code_col: str, name_col: str) -> int:
+    hashed = pd.util.hash_pandas_object(df[[code_col, name_col]], index=False)
+    return int(hashed.sum()) ^ len(df)
+
+
+def symbol_index(source: str, df: pd.DataFrame | None, code_col: str, name_col: str) -> SymbolIndex | None:
+    """Return the index of listing ``df``, rebuilding it only when the listing changed."""
+    if df is None or df.empty or code_col not in df.columns or name_col not in df.columns:
+        return None
+    key = f"symbol-index-{source}-{code_col}-{name_col}"
+    memo = _INDEXES.get(key)
+    if memo is not None and memo[0] is df:
+        return memo[1]
+    digest = fingerprint(df, code_col, name_col)
+    cache = CacheKey.init(key, ttl=86400 * 7)
+    index = cache.get()
+    if not isinstance(index, SymbolIndex) or index.fingerprint != digest:
+        index = cache.set(SymbolIndex.build(df, code_col, name_col, digest))
+    _INDEXES[key] = (df, index)
+    return index
+
+
+def find_symbol(
+    df: pd.DataFrame | None,
+    source: str,
+    code_col: str,
+    name_col: str,
+    symbol: str | None = None,
+    keyword: str | None = None,
+) -> pd.Series | None:
+    """Look up one listing with the ``ak_search`` matching rules."""
+    index = symbol_index(source, df, code_col, name_col)
+    if index is None:
+        return None
+    row = index.exact(symbol, keyword)
+    if row is None and keyword:
+        row = index.match(keyword)
+    if row is None:
+        return None
+    return df.iloc[row]
+
+
+def infer_market(market: str, code: str) -> str:
+    """Refine the listing's market label for A-share/ETF codes from their prefix."""
+    if market in ("sh", "sz") and len(code) == 6 and code.isdigit():
+        if code[0] in "695":
+            return "sh"
+        if code[0] in "48":
+            return "bj"
+        return "sz"
+    return market
+
+
+def initials(name: str) -> str:
+    """Pinyin initials of ``name`` (``贵州茅台`` -> ``gzmt``)."""
+    return "".join(lazy_pinyin(name, style=Style.FIRST_LETTER)).lower()
+
+
+def is_subsequence(query: str, text: str) -> bool:
+    chars = iter(text)
+    return all(ch in chars for ch in query)
+
+
+def ngrams(text: str) -> set[str]:
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i : i + 2] for i in range(len(text) - 1)}
+
+
+@dataclass
+class SearchEngine:
+    fingerprint: tuple = ()
+    markets: list[str] = field(default_factory=list)
+    codes: list[str] = field(default_factory=list)
+    names: list[str] = field(default_factory=list)
+    upper: list[str] = field(default_factory=list)
+    pinyin: list[str] = field(default_factory=list)
+    grams: dict[str, list[int]] = field(default_factory=dict)
+    chars: dict[str, list[int]] = field(default_factory=dict)
+    sorted_codes: list[tuple[str, int]] = field(default_factory=list)
+    sorted_pinyin: list[tuple[str, int]] = field(default_factory=list)
+
+    @classmethod
+    def build(cls, listings: list[tuple[str, pd.DataFrame, str, str]], fingerprint: tuple = ()) -> "SearchEngine":
+        """Index ``(market, frame, code_col, name_col)`` listings, first listing wins on duplicates."""
+        engine = cls(fingerprint)
+        seen = set()
+        for market, df, code_col, name_col in listings:
+            if df is None or df.empty or code_col not in df.columns or name_col not in df.columns:
+                continue
+            for code, name in zip(df[code_col].astype(str).tolist(), df[name_col].astype(str).tolist()):
+                label = infer_market(market, code)
+                if (label, code.upper(), name) in seen:
+                    continue
+                seen.add((label, code.upper(), name))
+                engine._add(label, code, name)
+        engine.sorted_codes.sort()
+        engine.sorted_pinyin.sort()
+        return engine
+
+    def _add(self, market: str, code: str, name: str) -> None:
+        pos = len(self.codes)
+        upper = name.upper()
+        self.markets.append(market)
+        self.codes.append(code.upper())
+        self.names.append(name)
+        self.upper.append(upper)
+        self.pinyin.append(initials(name))
+        for gram in ngrams(upper):
+            self.grams.setdefault(gram, []).append(pos)
+        for ch in set(upper):
+            self.chars.setdefault(ch, []).append(pos)
+        self.sorted_codes.append((code.upper(), pos))
+        if self.pinyin[pos]:
+            self.sorted_pinyin.append((self.pinyin[pos], pos))
+
+    @staticmethod
+    def _prefixed(items: list[tuple[str, int]], prefix: str, cap: int = 500) -> list[int]:
+        found = []
+        for key, pos in items[bisect_left(items, (prefix, -1)) :]:
+            if not key.startswith(prefix) or len(found) >= cap:
+                break
+            found.append(pos)
+        return found
+
+    def score(self, pos: int, query: str, grams: set[str]) -> float:
+        code, name, pinyin = self.codes[pos], self.upper[pos], self.pinyin[pos]
+        lower = query.lower()
+        if query == code:
+            return 100.0
+        if query == name:
+            return 98.0
+        if pinyin and lower == pinyin:
+            return 92.0
+        if name.startswith(query):
+            return 80.0 + 10.0 * len(query) / len(name)
+        if code.startswith(query):
+            return 80.0 * len(query) / len(code)
+        if pinyin and pinyin.startswith(lower):
+            return 70.0 + 10.0 * len(lower) / len(pinyin)
+        if query in name:
+            return 60.0 + 10.0 * len(query) / len(name)
+        if not query.isascii() and is_subsequence(query, name):
+            # 简称，如 "招行" -> 招商银行
+            return 50.0 + 10.0 * len(query) / len(name)
+        other = ngrams(name)
+        overlap = len(grams & other)
+        return 60.0 * 2 * overlap / (len(grams) + len(other)) if overlap else 0.0
+
+    def search(self, query: str, market: str | None = None, limit: int = 5) -> list[tuple[int, float]]:
+        """Return up to ``limit`` ``(row, score)`` pairs, best first."""
+        query = query.strip().upper()
+        if not query:
+            return []
+        grams = ngrams(query)
+        candidates = set(self._prefixed(self.sorted_codes, query))
+        candidates.update(self._prefixed(self.sorted_pinyin, query.lower()))
+        for gram in grams:
+            candidates.update(self.grams.get(gram, ()))
+        if not query.isascii():
+            # 以最少见的字符补充简称候选
+            postings = [self.chars.get(ch, []) for ch in set(query)]
+            candidates.update(min(postings, key=len))
+        best: dict[tuple[str, str], tuple[float, int]] = {}
+        for pos in candidates:
+            if market and self.markets[pos] != market:
+                continue
+            score = self.score(pos, query, grams)
+            key = (self.markets[pos], self.codes[pos])
+            # 同一证券的中英文名称只保留得分最高的一条
+            if score > 0 and (key not in best or (score, -pos) > (best[key][0], -best[key][1])):
+                best[key] = (score, pos)
+        top = heapq.nlargest(limit, ((score, -pos) for score, pos in best.values()))
+        return [(-neg, score) for score, neg in top]
+
+    def frame(self, hits: list[tuple[int, float]], query: str) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "query": query,
+                "rank": range(1, len(hits) + 1),
+                "market": [self.markets[pos] for pos, _ in hits],
+                "code": [self.codes[pos] for pos, _ in hits],
+                "name": [self.names[pos] for pos, _ in hits],
+                "score": [round(score, 1) for _, score in hits],
+            }
+        )
+
+
+# 最近一次构建的搜索引擎: (各清单对象, 引擎)
+_ENGINE: tuple[tuple, SearchEngine] | None = None
+
+
+def search_engine(listings: list[tuple[str, pd.DataFrame, str, str]]) -> SearchEngine:
+    """Return the ranked search engine over ``listings``, rebuilding it only when one changed."""
+    global _ENGINE
+    frames = tuple(df for _, df, _, _ in listings)
+    if _ENGINE is not None and len(_ENGINE[0]) == len(frames) and all(a is b for a, b in zip(_ENGINE[0], frames)):
+        return _ENGINE[1]
+    digest = tuple(
+        fingerprint(df, code_col, name_col)
+        if df is not None and not df.empty and code_col in df.columns and name_col in df.columns
+        else None
+        for _, df, code_col, name_col in listings
+    )
+    cache = CacheKey.init("symbol-search-engine", ttl=86400 * 7)
+    engine = cache.get()
+    if not isinstance(engine, SearchEngine) or engine.fingerprint != digest:
+        engine = cache.set(SearchEngine.build(listings, digest))
+    _ENGINE = (frames, engine)
+    return engine
@@ -1,7 +1,7 @@
 import asyncio
-import json
 import logging
 import os
+import threading
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from functools import partial
@@ -9,50 +9,69 @@ from functools import partial
 import akshare as ak
 import pandas as pd
 
-from ..cache import CacheKey
+from ..cache import FRESH, STALE, CacheKey, SingleFlight, mark_stale
 from .constants import PORTFOLIO_FILE
+from .ledger import Ledger
+from .symbols import LISTINGS, find_symbol, search_engine
 
 _LOGGER = logging.getLogger(__name__)
 
 # Thread pool for running blocking akshare calls
 _executor = ThreadPoolExecutor(max_workers=8)
 
+# Concurrent misses on the same cache key share one upstream request
+inflight = SingleFlight()
 
-def ak_cache(fun, *args, **kwargs) -> pd.DataFrame | None:
+
+def _cache_key(fun, args, kwargs) -> tuple[str, CacheKey, dict]:
     key = kwargs.pop("key", None)
     if not key:
         key = f"{fun.__name__}-{args}-{kwargs}"
     ttl1 = kwargs.pop("ttl", 86400)
     ttl2 = kwargs.pop("ttl2", None)
-    cache = CacheKey.init(key, ttl1, ttl2)
-    all_df = cache.get()
+    # TTL 可能随交易时段变化，写入时使用本次调用的值
+    return key, CacheKey.init(key, ttl1, ttl2), {"ttl": ttl1, "ttl2": ttl2}
+
+
+def _load(cache: CacheKey, key: str, fun, args, kwargs, ttls: dict) -> pd.DataFrame | None:
+    # 其他请求可能已在本次等待期间完成加载
+    all_df, state = cache.lookup()
+    if state == FRESH:
+        return all_df
+    try:
+        _LOGGER.info("Request akshare: %s", [key, args, kwargs])
+        return cache.set(fun(*args, **kwargs), **ttls)
+    except Exception as exc:
+        _LOGGER.exception(str(exc))
     if all_df is None:
-        try:
-            _LOGGER.info("Request akshare: %s", [key, args, kwargs])
-            all_df = fun(*args, **kwargs)
-            cache.set(all_df)
-        except Exception as exc:
-            _LOGGER.exception(str(exc))
+        return None
+    # stale-if-error: 上游失败时返回最后一次成功的数据
+    _LOGGER.warning("Serving stale cache for %s", key)
+    return mark_stale(all_df)
+
+
+def ak_cache(fun, *args, **kwargs) -> pd.DataFrame | None:
+    key, cache, ttls = _cache_key(fun, args, kwargs)
+    loader = partial(_load, cache, key, fun, args, kwargs, ttls)
+    all_df, state = cache.lookup()
+    if state == STALE:
+        # stale-while-revalidate: 先返回旧值，后台刷新
+        inflight.submit(key, loader, _executor)
+    elif state != FRESH:
+        all_df = inflight.do(key, loader)
     return all_df
 
 
 async def ak_cache_async(fun, *args, **kwargs) -> pd.DataFrame | None:
     """Async version of ak_cache that runs blocking calls in thread pool."""
-    key = kwargs.pop("key", None)
-    if not key:
-        key = f"{fun.__name__}-{args}-{kwargs}"
-    ttl1 = kwargs.pop("ttl", 86400)
-    ttl2 = kwargs.pop("ttl2", None)
-    cache = CacheKey.init(key, ttl1, ttl2)
-    all_df = cache.get()
-    if all_df is None:
-        try:
-            _LOGGER.info("Request akshare async: %s", [key, args, kwargs])
-            loop = asyncio.get_event_loop()
-            all_df = await loop.run_in_executor(_executor, partial(fun, *args, **kwargs))
-            cache.set(all_df)
-        except Exception as exc:
-            _LOGGER.exception(str(exc))
+    key, cache, ttls = _cache_key(fun, args, kwargs)
+    loader = partial(_load, cache, key, fun, args, kwargs, ttls)
+    all_df, state = cache.lookup()
+    if state == STALE:
+        inflight.submit(key, loader, _executor)
+    elif state != FRESH:
+        # 共享的 future 不随单个调用方取消，其他等待者仍能拿到结果
+        all_df = await asyncio.shield(asyncio.wrap_future(inflight.submit(key, loader, _executor)))
     return all_df
 
 
@@ -68,97 +87,81 @@ def recent_trade_date():
     return now
 
 
-def load_portfolio():
-    if not os.path.exists(PORTFOLIO_FILE):
-        os.makedirs(os.path.dirname(PORTFOLIO_FILE), exist_ok=True)
-        return {}
-    with open(PORTFOLIO_FILE, "r") as f:
-        return json.load(f)
+_ledgers: dict[str, Ledger] = {}
+_ledgers_lock = threading.Lock()
 
 
-def save_portfolio(data):
-    os.makedirs(os.path.dirname(PORTFOLIO_FILE), exist_ok=True)
-    with open(PORTFOLIO_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+def portfolio_ledger() -> Ledger:
+    """模拟盘数据库 (与 PORTFOLIO_FILE 同目录的 .db)，首次打开时导入旧版 JSON"""
+    path = os.path.splitext(PORTFOLIO_FILE)[0] + ".db"
+    with _ledgers_lock:
+        ledger = _ledgers.get(path)
+        if ledger is None:
+            ledger = _ledgers[path] = Ledger(path, legacy=PORTFOLIO_FILE)
+    return ledger
+
+
+def load_portfolio():
+    return portfolio_ledger().positions()
 
 
 def ak_search(symbol: str | None = None, keyword: str | None = None, market: str | None = None):
-    markets = [
-        ["sh", ak.stock_info_a_code_name, "code", "name"],
-        ["sh", ak.stock_info_sh_name_code, "证券代码", "证券简称"],
-        ["sz", ak.stock_info_sz_name_code, "A股代码", "A股简称"],
-        ["hk", ak.stock_hk_spot, "代码", "中文名称"],
-        ["hk", ak.stock_hk_spot_em, "代码", "名称"],
-        ["us", ak.get_us_stock_name, "symbol", "cname"],
-        ["us", ak.get_us_stock_name, "symbol", "name"],
-        ["sh", ak.fund_etf_spot_ths, "基金代码", "基金名称"],
-        ["sz", ak.fund_etf_spot_ths, "基金代码", "基金名称"],
-        ["sh", ak.fund_info_index_em, "基金代码", "基金名称"],
-        ["sz", ak.fund_info_index_em, "基金代码", "基金名称"],
-        ["sh", ak.fund_etf_spot_em, "代码", "名称"],
-        ["sz", ak.fund_etf_spot_em, "代码", "名称"],
-    ]
-    for m in markets:
+    frames = {}
+    for m in LISTINGS:
         if market and market != m[0]:
             continue
-        all_df = ak_cache(m[1], ttl=86400, ttl2=86400 * 7)
-        if all_df is None or all_df.empty:
-            continue
-        for _, v in all_df.iterrows():
-            code, name = str(v[m[2]]).upper(), str(v[m[3]]).upper()
-            if symbol and symbol.upper() == code:
-                return v
-            if keyword and keyword.upper() in [code, name]:
-                return v
-        if keyword:
-            for _, v in all_df.iterrows():
-                name = str(v[m[3]])
-                if len(keyword) >= 4 and keyword in name:
-                    return v
-                if name.startswith(keyword):
-                    return v
+        if m[1] not in frames:
+            frames[m[1]] = ak_cache(m[1], ttl=86400, ttl2=86400 * 7)
+        info = find_symbol(frames[m[1]], m[1].__name__, m[2], m[3], symbol, keyword)
+        if info is not None:
+            return info
     return None
 
 
+def _drain(task: asyncio.Future) -> None:
+    # 未被等待的请求: 取出异常，避免 "exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
 async def ak_search_async(symbol: str | None = None, keyword: str | None = None, market: str | None = None):
-    """Async version with parallel data fetching for faster search."""
-    markets = [
-        ["sh", ak.stock_info_a_code_name, "code", "name"],
-        ["sh", ak.stock_info_sh_name_code, "证券代码", "证券简称"],
-        ["sz", ak.stock_info_sz_name_code, "A股代码", "A股简称"],
-        ["hk", ak.stock_hk_spot, "代码", "中文名称"],
-        ["hk", ak.stock_hk_spot_em, "代码", "名称"],
-        ["us", ak.get_us_stock_name, "symbol", "cname"],
-        ["us", ak.get_us_stock_name, "symbol", "name"],
-        ["sh", ak.fund_etf_spot_ths, "基金代码", "基金名称"],
-        ["sz", ak.fund_etf_spot_ths, "基金代码", "基金名称"],
-        ["sh", ak.fund_info_index_em, "基金代码", "基金名称"],
-        ["sz", ak.fund_info_index_em, "基金代码", "基金名称"],
-        ["sh", ak.fund_etf_spot_em, "代码", "名称"],
-        ["sz", ak.fund_etf_spot_em, "代码", "名称"],
-    ]
-
-    filtered_markets = [m for m in markets if not market or market == m[0]]
+    """Async version: fetch every distinct source concurrently, check listings in priority order.
+
+    Returns as soon as a listing matches and all higher-priority listings have been
+    checked. Fetches still running at that point are left to finish and warm the cache.
+    """
+    filtered_markets = [m for m in LISTINGS if not market or market == m[0]]
     if not filtered_markets:
         return None
 
-    tasks = [ak_cache_async(m[1], ttl=86400, ttl2=86400 * 7) for m in filtered_markets]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    # 同一接口只请求一次; 命中后不取消其余请求 (经 SingleFlight 与其他调用方共享)
+    tasks: dict = {}
+    for m in filtered_markets:
+        if m[1] not in tasks:
+            tasks[m[1]] = asyncio.ensure_future(ak_cache_async(m[1], ttl=86400, ttl2=86400 * 7))
+            tasks[m[1]].add_done_callback(_drain)
 
-    for m, all_df in zip(filtered_markets, results):
-        if isinstance(all_df, Exception) or all_df is None or all_df.empty:
+    for m in filtered_markets:
+        try:
+            all_df = await tasks[m[1]]
+        except Exception:
             continue
-        for _, v in all_df.iterrows():
-            code, name = str(v[m[2]]).upper(), str(v[m[3]]).upper()
-            if symbol and symbol.upper() == code:
-                return v
-            if keyword and keyword.upper() in [code, name]:
-                return v
-        if keyword:
-            for _, v in all_df.iterrows():
-                name = str(v[m[3]])
-                if len(keyword) >= 4 and keyword in name:
-                    return v
-                if name.startswith(keyword):
-                    return v
+        info = find_symbol(all_df, m[1].__name__, m[2], m[3], symbol, keyword)
+        if info is not None:
+            return info
     return None
+
+
+async def ak_search_ranked(keywords: list[str], market: str | None = None, limit: int = 5) -> pd.DataFrame:
+    """Rank candidates for each keyword across all listings (code, name, pinyin initials, fuzzy)."""
+    funs = list(dict.fromkeys(m[1] for m in LISTINGS))
+    results = await asyncio.gather(
+        *[ak_cache_async(fun, ttl=86400, ttl2=86400 * 7) for fun in funs], return_exceptions=True
+    )
+    frames = {fun: None if isinstance(df, Exception) else df for fun, df in zip(funs, results)}
+    listings = [(m[0], frames[m[1]], m[2], m[3]) for m in LISTINGS]
+
+    loop = asyncio.get_running_loop()
+    engine = await loop.run_in_executor(_executor, search_engine, listings)
+    found = [engine.frame(engine.search(q, market or None, limit), q) for q in keywords]
+    return pd.concat(found, ignore_index=True) if found else pd.DataFrame()
@@ -0,0 +1,108 @@
+"""Walk-forward validation: pick parameters on one window, trade them on the next, and slide.
+
+Indicator series, each combination's position signal and its per-bar
+returns are computed once over the whole price series; every train and test
+window is a slice of those arrays, so overlapping windows share all of the
+work. The strategy therefore runs continuously: a window opens with whatever
+position the strategy holds at that bar, as it would trading live, instead of
+starting flat.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from .backtest import BacktestResult, _result, _stats, strategy_returns
+from .sweep import SORT_KEYS, SWEEPS, combinations, compute_series, rank
+
+MODES = ("rolling", "anchored")
+
+
+def windows(bars: int, train: int, test: int, mode: str = "rolling") -> list[tuple[int, int, int]]:
+    """``(train_start, test_start, test_end)`` bar ranges, oldest first; the last test window ends at the last bar.
+
+    ``rolling`` keeps ``train`` bars before each test window, ``anchored``
+    trains on everything from the first bar.
+    """
+    spans = []
+    end = bars
+    while end - test - train >= 0:
+        spans.append((0 if mode == "anchored" else end - test - train, end - test, end))
+        end -= test
+    return spans[::-1]
+
+
+def check_windows(train: int, test: int, mode: str, sort_by: str) -> None:
+    """Raise ``ValueError`` on window options :func:`walk_forward` does not accept."""
+    if mode not in MODES:
+        raise ValueError(f"unknown mode: {mode} (支持: {', '.join(MODES)})")
+    if sort_by not in SORT_KEYS:
+        raise ValueError(f"unknown sort key: {sort_by} (支持: {', '.join(SORT_KEYS)})")
+    if train < 2 or test < 2:
+        raise ValueError("train and test windows need at least 2 bars")
+
+
+def walk_forward(
+    strategy: str,
+    grid: dict[str, list[float]],
+    close: np.ndarray,
+    low: np.ndarray | None = None,
+    high: np.ndarray | None = None,
+    train: int = 126,
+    test: int = 63,
+    mode: str = "rolling",
+    sort_by: str = "return",
+    bars: int | None = None,
+) -> tuple[pd.DataFrame, BacktestResult]:
+    """Walk-forward over the last ``bars`` bars (default all), earlier bars serving as indicator warm-up.
+
+    In each window the best combination of ``grid`` on the train bars (by
+    ``sort_by``, see :func:`~.sweep.rank`) is traded on the following test
+    bars. Returns one row per window (bar offsets, chosen parameters, train and
+    test metrics) and the test windows' returns chained into one result.
+    """
+    check_windows(train, test, mode, sort_by)
+    close = np.asarray(close, dtype=np.float64)
+    low = close if low is None else np.asarray(low, dtype=np.float64)
+    high = close if high is None else np.asarray(high, dtype=np.float64)
+    spec = SWEEPS[strategy]
+    combos = combinations(strategy, grid)
+    params = pd.DataFrame(combos, columns=list(grid))
+    columns = ["train_start", "test_start", "test_end", *grid]
+    columns += ["train_return", "return", "max_drawdown", "win_rate"]
+    start = max(len(close) - (bars or len(close)), 0)
+    spans = windows(len(close) - start, train, test, mode)
+    if not combos or not spans:
+        return pd.DataFrame(columns=columns), _result(np.zeros(0))
+
+    memo: dict = {}
+    for combo in combos:
+        for key in spec.needs(combo):
+            compute_series(key, close, low, high, memo)
+    series = {key: values[start:] for key, values in memo.items()}
+    close = close[start:]
+    # 每个组合的信号与逐 K 线收益只计算一次，各窗口直接切片
+    signals = np.column_stack([spec.signal(combo, series, close) for combo in combos])
+    returns = strategy_returns(close, np.ones_like(close))
+    strat = np.zeros_like(signals)
+    strat[1:] = returns[1:, None] * signals[:-1]
+
+    chosen, rows = [], []
+    for train_start, test_start, test_end in spans:
+        _, cumulative, drawdown, win_rate = _stats(strat[train_start:test_start])
+        scores = params.assign(**{"return": cumulative, "max_drawdown": drawdown, "win_rate": win_rate})
+        best = int(rank(scores.reset_index(), sort_by)["index"].iloc[0])
+        result = _result(strat[test_start:test_end, best])
+        chosen.append(best)
+        rows.append((cumulative[best], result.cumulative_return, result.max_drawdown, result.win_rate))
+    table = pd.concat(
+        [
+            pd.DataFrame(spans, columns=columns[:3]),
+            params.iloc[chosen].reset_index(drop=True),
+            pd.DataFrame(rows, columns=columns[-4:]),
+        ],
+        axis=1,
+    )
+    tested = [strat[test_start:test_end, best] for (_, test_start, test_end), best in zip(spans, chosen)]
+    return table, _result(np.concatenate(tested))
@@ -1,13 +1,20 @@
 import asyncio
-from io import StringIO
+import re
+from functools import partial
 
+import numpy as np
 import pandas as pd
 from fastmcp import Context
 from pydantic import Field
 
+from ..cache import RESULTS
 from ..server import mcp
+from ..shared.backtest import STRATEGIES, backtest_frame, panel_backtest, portfolio_weights, strategy_values
 from ..shared.fields import field_market, field_symbol
-from .stocks import market_prices, stock_info, stock_news
+from ..shared.schema import format_error_csv
+from ..shared.sweep import SORT_KEYS, SWEEPS, combinations, parse_grid, rank, sweep, warmup
+from ..shared.walkforward import check_windows, walk_forward
+from .stocks import load_market_prices, market_prices, market_prices_version, stock_info, stock_news
 
 
 @mcp.tool(
@@ -50,12 +57,10 @@ async def composite_stock_diagnostic(
     description="根据提供的价格列表生成一个简单的 ASCII 走势图，用于直观展示趋势",
 )
 def draw_ascii_chart(symbol: str = field_symbol, market: str = field_market):
-    # 通过 .fn 属性访问原始函数
-    data = market_prices.fn(symbol, market, limit=20)
-    if not data or data.startswith("error,"):
+    frame = load_market_prices(symbol, market, limit=20, indicators="none", fields=("close",))
+    if frame is None or "close" not in frame:
         return "数据不足，无法绘图"
-    lines = data.strip().split("\n")[1:]
-    prices = [float(line.split(",")[4]) for line in lines if line]
+    prices = [p for p in frame.close.tolist() if p == p]
 
     if not prices:
         return "数据不足，无法绘图"
@@ -88,127 +93,288 @@ def backtest_strategy(
     strategy: str = Field("SMA", description="策略类型: SMA/RSI/MACD/BOLL/MA_CROSS/KDJ"),
     days: int = Field(252, description="回测天数"),
 ):
-    data = market_prices.fn(symbol=symbol, market=market, limit=days)
-    if not data or data.startswith("error,"):
+    strategy_key = (strategy or "").strip().upper()
+    spec = STRATEGIES.get(strategy_key)
+    if spec is None:
+        return f"不支持的策略类型: {strategy}"
+    # 回测窗口 (长度、最新 K 线与内容) 未变化时直接返回上次结果，不再加载与计算
+    memo_key = f"backtest-{symbol}.{market}-{strategy_key}-{days}-{{}}"
+    version = market_prices_version(symbol, market, limit=days)
+    if version and (cached := RESULTS.get(memo_key.format(version))) is not None:
+        return cached
+    # 只计算策略用到的指标
+    frame = load_market_prices(symbol, market, limit=days, indicators=spec.indicators)
+    if frame is None:
         return f"未找到可回测数据: {symbol}.{market}"
-
-    try:
-        dfs = pd.read_csv(StringIO(data))
-    except Exception:
-        return "价格数据解析失败"
-
-    if dfs is None or dfs.empty or "close" not in dfs.columns:
+    if frame.empty or "close" not in frame:
         return "数据不足，无法回测"
 
-    close = pd.to_numeric(dfs["close"], errors="coerce")
-    dfs = dfs.assign(close=close).dropna(subset=["close"])
+    dfs = frame.data.dropna(subset=["close"])
     if dfs.empty:
         return "数据不足，无法回测"
+    if not all(col in dfs.columns for col in spec.columns):
+        return f"数据缺少 {strategy_key} 指标，无法回测"
 
-    strategy_key = (strategy or "").strip().upper()
-    if strategy_key == "SMA":
-        short_window = 5
-        long_window = 20
-        dfs["ma_short"] = dfs["close"].rolling(short_window).mean()
-        dfs["ma_long"] = dfs["close"].rolling(long_window).mean()
-        signal = pd.Series((dfs["ma_short"] > dfs["ma_long"]).astype(int), index=dfs.index)
-        strategy_desc = f"SMA{short_window}/{long_window}"
-    elif strategy_key == "RSI":
-        if "rsi" not in dfs.columns:
-            return "数据缺少 RSI 指标，无法回测"
-        rsi = pd.Series(pd.to_numeric(dfs["rsi"], errors="coerce"), index=dfs.index)
-        positions = []
-        position = 0
-        for value in rsi.to_list():
-            if pd.isna(value):
-                positions.append(position)
-                continue
-            if value < 30:
-                position = 1
-            elif value > 70:
-                position = 0
-            positions.append(position)
-        signal = pd.Series(positions, index=dfs.index)
-        strategy_desc = "RSI(30/70)"
-    elif strategy_key == "MACD":
-        if "dif" not in dfs.columns or "dea" not in dfs.columns:
-            return "数据缺少 MACD 指标，无法回测"
-        dif = pd.Series(pd.to_numeric(dfs["dif"], errors="coerce"), index=dfs.index)
-        dea = pd.Series(pd.to_numeric(dfs["dea"], errors="coerce"), index=dfs.index)
-        signal = pd.Series((dif > dea).astype(int), index=dfs.index)
-        strategy_desc = "MACD(DIF/DEA)"
-    elif strategy_key == "BOLL":
-        if "boll_u" not in dfs.columns or "boll_l" not in dfs.columns:
-            return "数据缺少 BOLL 指标，无法回测"
-        boll_u = pd.Series(pd.to_numeric(dfs["boll_u"], errors="coerce"), index=dfs.index)
-        boll_l = pd.Series(pd.to_numeric(dfs["boll_l"], errors="coerce"), index=dfs.index)
-        positions = []
-        position = 0
-        for i, price in enumerate(dfs["close"].to_list()):
-            if pd.isna(boll_u.iloc[i]) or pd.isna(boll_l.iloc[i]):
-                positions.append(position)
-                continue
-            if price <= boll_l.iloc[i]:
-                position = 1
-            elif price >= boll_u.iloc[i]:
-                position = 0
-            positions.append(position)
-        signal = pd.Series(positions, index=dfs.index)
-        strategy_desc = "BOLL(突破下轨买入/上轨卖出)"
-    elif strategy_key in ("MA_CROSS", "MACROSS"):
-        ma10 = dfs["close"].rolling(10).mean()
-        ma30 = dfs["close"].rolling(30).mean()
-        signal = pd.Series((ma10 > ma30).astype(int), index=dfs.index)
-        strategy_desc = "MA_CROSS(10/30)"
-    elif strategy_key == "KDJ":
-        if "kdj_k" not in dfs.columns or "kdj_d" not in dfs.columns:
-            return "数据缺少 KDJ 指标，无法回测"
-        kdj_k = pd.Series(pd.to_numeric(dfs["kdj_k"], errors="coerce"), index=dfs.index)
-        kdj_d = pd.Series(pd.to_numeric(dfs["kdj_d"], errors="coerce"), index=dfs.index)
-        positions = []
-        position = 0
-        prev_k, prev_d = None, None
-        for i in range(len(kdj_k)):
-            k_val, d_val = kdj_k.iloc[i], kdj_d.iloc[i]
-            if pd.isna(k_val) or pd.isna(d_val):
-                positions.append(position)
-                prev_k, prev_d = k_val, d_val
-                continue
-            if prev_k is not None and prev_d is not None:
-                if not pd.isna(prev_k) and not pd.isna(prev_d):
-                    if prev_k <= prev_d and k_val > d_val:
-                        position = 1
-                    elif prev_k >= prev_d and k_val < d_val:
-                        position = 0
-            positions.append(position)
-            prev_k, prev_d = k_val, d_val
-        signal = pd.Series(positions, index=dfs.index)
-        strategy_desc = "KDJ(金叉买入/死叉卖出)"
-    else:
-        return f"不支持的策略类型: {strategy}"
-
-    returns = dfs["close"].pct_change().fillna(0)
-    position = signal.shift(1).fillna(0)
-    strat_returns = returns.mul(position)
-    equity = (1 + strat_returns).cumprod()
-    cumulative_return = equity.iloc[-1] - 1
-    drawdown = equity / equity.cummax() - 1
-    max_drawdown = drawdown.min()
-
-    active = strat_returns[strat_returns != 0]
-    win_rate = (active > 0).mean() if len(active) else None
-
+    result = backtest_frame(dfs, spec)
     start_date = str(dfs["date"].iloc[0]) if "date" in dfs.columns else "-"
     end_date = str(dfs["date"].iloc[-1]) if "date" in dfs.columns else "-"
-    win_text = f"{win_rate:.2%}" if win_rate is not None else "N/A"
-    return (
+    win_text = f"{result.win_rate:.2%}" if result.win_rate is not None else "N/A"
+    report = (
         f"--- 策略回测: {symbol} ({market}) ---\n"
-        f"策略: {strategy_desc}\n"
+        f"策略: {spec.name}\n"
         f"区间: {start_date} ~ {end_date} (样本 {len(dfs)} 日)\n"
-        f"累计收益: {cumulative_return:.2%}\n"
-        f"最大回撤: {max_drawdown:.2%}\n"
+        f"累计收益: {result.cumulative_return:.2%}\n"
+        f"最大回撤: {result.max_drawdown:.2%}\n"
         f"胜率: {win_text}"
     )
+    return RESULTS.set(memo_key.format(frame.version), report) if frame.version else report
+
+
+# 组合回测: 标的数量上限与并发拉取数
+PORTFOLIO_MAX_SYMBOLS = 100
+PORTFOLIO_FETCH_CONCURRENCY = 16
+PRICE_MARKETS = ("sh", "sz", "hk", "us")
+
+
+def parse_symbols(text: str, market: str = "sh") -> list[tuple[str, str]]:
+    """``600519.sh, 00700.hk AAPL`` -> ``[("600519", "sh"), ("00700", "hk"), ("AAPL", market)]``, deduplicated."""
+    pairs = []
+    for item in re.split(r"[\s,，;]+", text or ""):
+        if not item:
+            continue
+        code, _, suffix = item.rpartition(".")
+        pair = (code, suffix.lower()) if code and suffix.lower() in PRICE_MARKETS else (item, market)
+        if pair not in pairs:
+            pairs.append(pair)
+    return pairs
+
+
+@mcp.tool(
+    title="组合策略回测",
+    description="对多个标的 (可跨市场) 同时运行同一策略回测，按权重规则组合，返回各标的结果与组合净值统计。"
+    "回测自选股/股票池时使用，代替逐个调用策略回测",
+)
+async def backtest_portfolio(
+    symbols: str = Field(
+        description="标的列表，逗号或空格分隔，格式: 代码.市场，如: 600519.sh,00700.hk,AAPL.us；未带市场后缀的使用 market"
+    ),
+    market: str = field_market,
+    strategy: str = Field("SMA", description="策略类型: SMA/RSI/MACD/BOLL/MA_CROSS/KDJ"),
+    days: int = Field(252, description="回测天数", strict=False),
+    weights: str = Field(
+        "equal", description="权重规则: equal(等权)/inverse_vol(波动率倒数)/自定义如 600519.sh=0.6,00700.hk=0.4"
+    ),
+    ctx: Context | None = None,
+):
+    strategy_key = (strategy or "").strip().upper()
+    spec = STRATEGIES.get(strategy_key)
+    if spec is None:
+        return f"不支持的策略类型: {strategy}"
+    pairs = parse_symbols(symbols, market if isinstance(market, str) else "sh")
+    if not pairs:
+        return "未提供标的"
+    if len(pairs) > PORTFOLIO_MAX_SYMBOLS:
+        return format_error_csv(f"too many symbols: {len(pairs)} > {PORTFOLIO_MAX_SYMBOLS}", "akshare")
+    names = [f"{code}.{mkt}" for code, mkt in pairs]
+    try:
+        portfolio_weights(weights, pd.DataFrame(columns=names))
+    except ValueError as exc:
+        return format_error_csv(str(exc), "akshare")
+
+    if ctx:
+        await ctx.report_progress(10, 100, f"并发获取 {len(pairs)} 个标的行情...")
+    loop = asyncio.get_running_loop()
+    limit = asyncio.Semaphore(PORTFOLIO_FETCH_CONCURRENCY)
+
+    async def fetch(code: str, mkt: str):
+        async with limit:
+            try:
+                fn = partial(load_market_prices, code, mkt, limit=days, indicators=spec.indicators)
+                return await loop.run_in_executor(None, fn)
+            except Exception:
+                return None
+
+    frames = await asyncio.gather(*(fetch(code, mkt) for code, mkt in pairs))
+
+    if ctx:
+        await ctx.report_progress(80, 100, "对齐行情并回测...")
+    closes, signals, missing = {}, {}, []
+    for name, frame in zip(names, frames):
+        data = None if frame is None or "close" not in frame else frame.data.dropna(subset=["close"])
+        if data is None or data.empty or "date" not in data or not all(c in data for c in spec.columns):
+            missing.append(name)
+            continue
+        data = data.drop_duplicates("date", keep="last").set_index("date")
+        closes[name] = data["close"]
+        signals[name] = pd.Series(spec.signal(strategy_values(data, spec)), index=data.index)
+    if not closes:
+        return f"未找到可回测数据: {', '.join(names)}"
+
+    # 所有标的的日期取并集，对齐为一张面板
+    close = pd.DataFrame(closes).sort_index()
+    weight = portfolio_weights(weights, close.reindex(columns=names))
+    weight = weight[[names.index(name) for name in close.columns]]
+    if weight.sum() <= 0:
+        return "权重均落在未获取到数据的标的上，无法回测"
+    per_symbol, result = panel_backtest(close, pd.DataFrame(signals), weight / weight.sum())
+
+    if ctx:
+        await ctx.report_progress(100, 100, "回测完成")
+    win_text = f"{result.win_rate:.2%}" if result.win_rate is not None else "N/A"
+    lines = [
+        f"--- 组合策略回测: {spec.name} ({len(closes)} 个标的, 权重 {weights}) ---",
+        f"区间: {close.index[0]} ~ {close.index[-1]} (样本 {len(close)} 日)",
+        f"组合累计收益: {result.cumulative_return:.2%}",
+        f"组合最大回撤: {result.max_drawdown:.2%}",
+        f"组合胜率: {win_text}",
+    ]
+    if missing:
+        lines.append(f"未获取到数据: {', '.join(missing)}")
+    table = per_symbol.rename_axis("symbol").reset_index().to_csv(index=False, float_format="%.4f").strip()
+    return "\n".join([*lines, "", table])
+
+
+@mcp.tool(
+    title="策略参数扫描",
+    description="对同一段历史价格批量回测策略参数组合 (网格搜索)，按收益/回撤/胜率排序返回。"
+    "需要比较多组参数时使用，代替多次调用策略回测",
+)
+def backtest_sweep(
+    symbol: str = field_symbol,
+    market: str = field_market,
+    strategy: str = Field("SMA", description="策略类型: SMA/RSI/MACD/BOLL/MA_CROSS/KDJ"),
+    params: str = Field(
+        "",
+        description="参数范围，空格或分号分隔；a:b[:步长] 为闭区间，a,b,c 为列表，未给出的参数取默认值。"
+        "SMA/MA_CROSS: short,long; RSI: window,lower,upper; MACD: fast,slow,signal; BOLL: window,width; KDJ: window。"
+        "如: short=3:10 long=20:60:5",
+    ),
+    days: int = Field(252, description="回测天数", strict=False),
+    sort_by: str = Field("return", description="排序: return(收益)/drawdown(回撤最小)/win_rate(胜率)"),
+    top: int = Field(20, description="返回前几名(int)", strict=False),
+):
+    strategy_key = (strategy or "").strip().upper()
+    if strategy_key not in SWEEPS:
+        return f"不支持的策略类型: {strategy}"
+    try:
+        grid = parse_grid(strategy_key, params)
+        combos = combinations(strategy_key, grid)
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"unknown sort key: {sort_by} (支持: {', '.join(SORT_KEYS)})")
+    except ValueError as exc:
+        return format_error_csv(str(exc), "akshare")
+    if not combos:
+        return "没有有效的参数组合"
+
+    # 多取一段历史作为指标预热，同一份价格序列评估所有组合
+    frame = load_market_prices(
+        symbol, market, limit=days + warmup(grid), indicators="none", fields=("close", "low", "high")
+    )
+    if frame is None:
+        return f"未找到可回测数据: {symbol}.{market}"
+    if frame.empty or "close" not in frame:
+        return "数据不足，无法回测"
+    data = frame.data.dropna(subset=["close"])
+    if data.empty:
+        return "数据不足，无法回测"
+
+    results = sweep(
+        strategy_key,
+        grid,
+        data["close"].to_numpy(dtype=float),
+        data["low"].to_numpy(dtype=float, na_value=np.nan),
+        data["high"].to_numpy(dtype=float, na_value=np.nan),
+        bars=days,
+    )
+    ranked = rank(results, sort_by).head(max(1, int(top)))
+    header = f"# {symbol}.{market} {strategy_key} 参数扫描: {len(results)} 组, 样本 {min(days, len(data))} 根K线"
+    return "\n".join([header, ranked.to_csv(index=False, float_format="%.4f").strip()])
+
+
+@mcp.tool(
+    title="滚动窗口验证",
+    description="策略的样本外检验 (walk-forward): 在每个训练窗口上扫描参数选出最优组合，用于紧随其后的测试窗口，"
+    "窗口依次向后滑动，返回各窗口选中的参数与样本外表现及拼接后的样本外统计。检验策略稳健性/是否过拟合时使用",
+)
+def backtest_walk_forward(
+    symbol: str = field_symbol,
+    market: str = field_market,
+    strategy: str = Field("SMA", description="策略类型: SMA/RSI/MACD/BOLL/MA_CROSS/KDJ"),
+    params: str = Field("", description="参数范围，格式同参数扫描，如: short=3:10 long=20:60:5；留空则只用默认参数"),
+    days: int = Field(504, description="验证区间天数", strict=False),
+    train: int = Field(126, description="训练窗口K线数", strict=False),
+    test: int = Field(63, description="测试窗口K线数，也是每次滑动的步长", strict=False),
+    mode: str = Field("rolling", description="rolling(固定长度训练窗口)/anchored(训练窗口从区间起点扩展)"),
+    sort_by: str = Field("return", description="训练窗口选参依据: return(收益)/drawdown(回撤最小)/win_rate(胜率)"),
+):
+    strategy_key = (strategy or "").strip().upper()
+    if strategy_key not in SWEEPS:
+        return f"不支持的策略类型: {strategy}"
+    try:
+        grid = parse_grid(strategy_key, params)
+        combos = combinations(strategy_key, grid)
+        check_windows(train, test, mode, sort_by)
+    except ValueError as exc:
+        return format_error_csv(str(exc), "akshare")
+    if not combos:
+        return "没有有效的参数组合"
+
+    # 同一份行情上的重复查询直接返回缓存结果，新 K 线到达后版本随之变化
+    grid_text = ";".join(f"{name}={','.join(f'{v:g}' for v in values)}" for name, values in grid.items())
+    memo_key = f"walk_forward-{symbol}.{market}-{strategy_key}-{grid_text}-{days}-{train}-{test}-{mode}-{sort_by}-{{}}"
+    version = market_prices_version(symbol, market, limit=days + warmup(grid))
+    if version and (cached := RESULTS.get(memo_key.format(version))) is not None:
+        return cached
+
+    frame = load_market_prices(symbol, market, limit=days + warmup(grid), indicators="none")
+    if frame is None:
+        return f"未找到可回测数据: {symbol}.{market}"
+    if frame.empty or "close" not in frame:
+        return "数据不足，无法回测"
+    data = frame.data.dropna(subset=["close"]).reset_index(drop=True)
+    if data.empty:
+        return "数据不足，无法回测"
+    dates = data["date"].astype(str) if "date" in data.columns else pd.Series(data.index.astype(str))
+    # 没有版本的行情以最新 K 线日期为键
+    memo_key = memo_key.format(frame.version or dates.iloc[-1])
+    # 加载前已按版本查找过的不再重复查找，命中率中每次请求只计一次
+    if not version and (cached := RESULTS.get(memo_key)) is not None:
+        return cached
+
+    table, result = walk_forward(
+        strategy_key,
+        grid,
+        data["close"].to_numpy(dtype=float),
+        data["low"].to_numpy(dtype=float, na_value=np.nan) if "low" in data.columns else None,
+        data["high"].to_numpy(dtype=float, na_value=np.nan) if "high" in data.columns else None,
+        train=train,
+        test=test,
+        mode=mode,
+        sort_by=sort_by,
+        bars=days,
+    )
+    if table.empty:
+        return f"数据不足，无法划分窗口: 需要至少 {train + test} 根K线"
+
+    # 窗口位置换成日期
+    offset = len(data) - min(days, len(data))
+    table.insert(0, "train_from", dates.iloc[offset + table["train_start"]].to_numpy())
+    table.insert(1, "test_from", dates.iloc[offset + table["test_start"]].to_numpy())
+    table.insert(2, "test_to", dates.iloc[offset + table["test_end"] - 1].to_numpy())
+    table = table.drop(columns=["train_start", "test_start", "test_end"])
+    win_text = f"{result.win_rate:.2%}" if result.win_rate is not None else "N/A"
+    lines = [
+        f"--- 滚动窗口验证: {symbol} ({market}) {STRATEGIES[strategy_key].name} ---",
+        f"窗口: 训练 {train} / 测试 {test} 根K线 ({mode}), {len(table)} 个窗口, {len(combos)} 组参数",
+        f"样本外累计收益: {result.cumulative_return:.2%}",
+        f"样本外最大回撤: {result.max_drawdown:.2%}",
+        f"样本外胜率: {win_text}",
+        f"盈利窗口: {int((table['return'] > 0).sum())}/{len(table)}, "
+        f"训练期平均收益 {table['train_return'].mean():.2%}, 测试期平均收益 {table['return'].mean():.2%}",
+        "",
+        table.to_csv(index=False, float_format="%.4f").strip(),
+    ]
+    return RESULTS.set(memo_key, "\n".join(lines))
 
 
 @mcp.tool(
@@ -234,18 +400,25 @@ def trading_suggest(
     description="查看当前缓存的键和数量，用于调试和监控",
 )
 def cache_status():
-    from ..cache import CacheKey
+    from ..cache import L1, CacheKey
+    from ..shared.utils import inflight
 
     keys = list(CacheKey.ALL.keys())
-    if not keys:
-        return "当前缓存为空"
+    ratio = RESULTS.hit_ratio()
+    ratio = f" ({ratio:.1%})" if ratio is not None else ""
 
     lines = [
         "--- 缓存状态 ---",
         f"缓存条目数: {len(keys)}",
+        f"内存缓存: {len(L1)} 项, {L1.currsize / 1024 / 1024:.1f}/{L1.maxsize / 1024 / 1024:.0f} MB",
+        f"合并并发请求: {inflight.coalesced} (进行中 {inflight.inflight()})",
+        f"回测结果缓存: {len(RESULTS)} 项, 命中 {RESULTS.hits}/{RESULTS.hits + RESULTS.misses}{ratio}",
         "",
-        "最近缓存键 (最多显示20个):",
     ]
+    if not keys:
+        lines.append("当前缓存为空")
+        return "\n".join(lines)
+    lines.append("最近缓存键 (最多显示20个):")
     for key in keys[:20]:
         lines.append(f"  - {key}")
     if len(keys) > 20:
@@ -260,18 +433,26 @@ def cache_status():
 def cache_clear(
     key: str = Field("", description="要清理的缓存键，留空则清理所有缓存"),
 ):
-    from ..cache import CacheKey
+    from ..cache import L1, CacheKey, shared_disk
 
+    disk = shared_disk()
     if not key:
-        count = len(CacheKey.ALL)
+        # 注册表只记录内存中仍存活的键，过期或被淘汰的键在磁盘上仍有数据，需整体清空
+        count = max(len(CacheKey.ALL), len(disk))
         for cache_key in list(CacheKey.ALL.values()):
             cache_key.delete()
         CacheKey.ALL.clear()
+        L1.clear()
+        disk.clear(retry=True)
+        RESULTS.clear()
         return f"已清理所有缓存 ({count} 个条目)"
 
-    if key in CacheKey.ALL:
-        CacheKey.ALL[key].delete()
-        del CacheKey.ALL[key]
+    cache = CacheKey.ALL.pop(key, None)
+    if cache is not None:
+        cache.delete()
+        return f"已清理缓存: {key}"
+    in_memory = L1.pop(key) is not None
+    if disk.delete(key, retry=True) or in_memory:
         return f"已清理缓存: {key}"
 
     return f"未找到缓存键: {key}"
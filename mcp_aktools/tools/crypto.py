@@ -1,7 +1,6 @@
 import asyncio
 import json
 import time
-from io import StringIO
 from typing import Any
 
 import pandas as pd
@@ -9,10 +8,13 @@ import requests
 from fastmcp import Context
 from pydantic import Field
 
+from ..cache import RESULTS
 from ..server import mcp
+from ..shared.backtest import STRATEGIES, backtest_frame
 from ..shared.constants import BINANCE_BASE_URL, OKX_BASE_URL, USER_AGENT
-from ..shared.indicators import add_technical_indicators
-from ..shared.normalize import normalize_price_df
+from ..shared.fields import field_indicators
+from ..shared.indicators import add_technical_indicators, indicator_map, select_indicators
+from ..shared.normalize import PriceFrame, format_price_csv, price_frame
 from ..shared.schema import format_error_csv
 
 
@@ -52,7 +54,23 @@ def crypto_prices(
         description="K线时间粒度，仅支持: [1m/3m/5m/15m/30m/1H/2H/4H/6H/12H/1D/2D/3D/1W/1M/3M] 除分钟为小写m外,其余均为大写",
     ),
     limit: int = Field(100, description="返回数量(int)，最大300，最小建议30", strict=False),
+    indicators: str = field_indicators,
 ):
+    try:
+        frame = load_crypto_prices(symbol, period, limit, indicators)
+    except ValueError as exc:
+        return format_error_csv(str(exc), "okx")
+    return format_price_csv(frame, "okx", float_format="%.4f")
+
+
+def load_crypto_prices(
+    symbol: str = "BTC-USDT",
+    period: str = "1H",
+    limit: int = 100,
+    indicators: str = "all",
+) -> PriceFrame | None:
+    """OKX 历史 K 线及技术指标 (进程内调用，不经过 CSV)。无数据返回 None，指标名无效时抛出 ValueError"""
+    columns = select_indicators(indicators)
     if not period.endswith("m"):
         period = period.upper()
     res = requests.get(
@@ -68,13 +86,7 @@ def crypto_prices(
     dfs = pd.DataFrame(data.get("data", []))
     currency = symbol.split("-")[-1] if "-" in symbol else "USDT"
     if dfs.empty:
-        return normalize_price_df(
-            None,
-            {},
-            source="okx",
-            currency=currency,
-            limit=limit,
-        )
+        return None
     dfs.columns = ["时间", "开盘", "最高", "最低", "收盘", "成交量", "成交额", "成交额USDT", "K线已完结"]
     dfs.sort_values("时间", inplace=True)
     dfs["时间"] = pd.to_numeric(dfs["时间"], errors="coerce")
@@ -85,8 +97,10 @@ def crypto_prices(
     dfs["收盘"] = pd.to_numeric(dfs["收盘"], errors="coerce")
     dfs["成交量"] = pd.to_numeric(dfs["成交量"], errors="coerce")
     dfs["成交额"] = pd.to_numeric(dfs["成交额"], errors="coerce")
-    add_technical_indicators(dfs, dfs["收盘"], dfs["最低"], dfs["最高"])
-    return normalize_price_df(
+    add_technical_indicators(
+        dfs, dfs["收盘"], dfs["最低"], dfs["最高"], key=f"okx-{symbol}-{period}", times=dfs["时间"], columns=columns
+    )
+    return price_frame(
         dfs,
         {
             "date": "时间",
@@ -100,19 +114,9 @@ def crypto_prices(
         source="okx",
         currency=currency,
         limit=limit,
-        float_format="%.4f",
-        indicator_map={
-            "macd": "MACD",
-            "dif": "DIF",
-            "dea": "DEA",
-            "kdj_k": "KDJ.K",
-            "kdj_d": "KDJ.D",
-            "kdj_j": "KDJ.J",
-            "rsi": "RSI",
-            "boll_u": "BOLL.U",
-            "boll_m": "BOLL.M",
-            "boll_l": "BOLL.L",
-        },
+        indicator_map=indicator_map(columns),
+        # 最新 K 线的时间与收盘价: 未完结的 K 线更新后版本随之变化
+        version=f"{dfs['时间'].iloc[-1]}-{dfs['收盘'].iloc[-1]}",
     )
 
 
@@ -258,26 +262,11 @@ def draw_crypto_chart(
     bar: str = Field("1D", description="K线周期: 1H/4H/1D"),
 ):
     inst_id = f"{symbol}-USDT"
-    data = crypto_prices.fn(symbol=inst_id, period=bar, limit=20)
-    if not isinstance(data, str) or not data:
-        return "数据不足，无法绘图"
-
-    try:
-        dfs = pd.read_csv(StringIO(data))
-    except Exception:
+    frame = load_crypto_prices(inst_id, bar, 20, indicators="none")
+    if frame is None or "close" not in frame:
         return "数据不足，无法绘图"
 
-    if dfs.empty or "close" not in dfs.columns:
-        return "数据不足，无法绘图"
-
-    prices = []
-    for value in dfs["close"].to_list():
-        if pd.isna(value):
-            continue
-        try:
-            prices.append(float(value))
-        except (TypeError, ValueError):
-            continue
+    prices = [p for p in frame.close.tolist() if p == p]
 
     if len(prices) < 3:
         return "数据不足，无法绘图"
@@ -301,6 +290,10 @@ def draw_crypto_chart(
     )
 
 
+# 加密货币回测支持的策略
+CRYPTO_STRATEGIES = ("SMA", "RSI", "MACD")
+
+
 @mcp.tool(
     title="加密货币策略回测",
     description="基于加密货币历史价格与技术指标进行简单策略回测（SMA/RSI/MACD）",
@@ -311,85 +304,43 @@ def backtest_crypto_strategy(
     bar: str = Field("4H", description="K线周期: 1H/4H/1D"),
     limit: int = Field(200, description="回测K线数量", strict=False),
 ):
-    from io import StringIO
-
     inst_id = f"{symbol}-USDT"
-    data = crypto_prices.fn(symbol=inst_id, period=bar, limit=limit)
-
-    if not isinstance(data, str) or not data:
+    strategy_key = (strategy or "").strip().upper()
+    if strategy_key not in CRYPTO_STRATEGIES:
+        return f"不支持的策略类型: {strategy}"
+    spec = STRATEGIES[strategy_key]
+    # 只计算策略用到的指标
+    frame = load_crypto_prices(inst_id, bar, limit, indicators=spec.indicators)
+    if frame is None:
         return f"未找到可回测数据: {symbol}"
-
-    try:
-        dfs = pd.read_csv(StringIO(data))
-    except Exception:
-        return "价格数据解析失败"
-
-    if dfs is None or dfs.empty or "close" not in dfs.columns:
+    if frame.empty or "close" not in frame:
         return "数据不足，无法回测"
+    # 以实际使用的 K 线为版本: 行情未变时重复请求不再计算
+    memo_key = f"backtest-okx-{inst_id}-{bar}-{limit}-{strategy_key}-{frame.version}"
+    if frame.version and (cached := RESULTS.get(memo_key)) is not None:
+        return cached
 
-    close = pd.to_numeric(dfs["close"], errors="coerce")
-    dfs = dfs.assign(close=close).dropna(subset=["close"])
+    dfs = frame.data.dropna(subset=["close"])
     if dfs.empty:
         return "数据不足，无法回测"
+    if not all(col in dfs.columns for col in spec.columns):
+        return f"数据缺少 {strategy_key} 指标，无法回测"
 
-    strategy_key = (strategy or "").strip().upper()
-    if strategy_key == "SMA":
-        short_window, long_window = 5, 20
-        dfs["ma_short"] = dfs["close"].rolling(short_window).mean()
-        dfs["ma_long"] = dfs["close"].rolling(long_window).mean()
-        signal = pd.Series((dfs["ma_short"] > dfs["ma_long"]).astype(int), index=dfs.index)
-        strategy_desc = f"SMA{short_window}/{long_window}"
-    elif strategy_key == "RSI":
-        if "rsi" not in dfs.columns:
-            return "数据缺少 RSI 指标，无法回测"
-        rsi = pd.Series(pd.to_numeric(dfs["rsi"], errors="coerce"), index=dfs.index)
-        positions = []
-        position = 0
-        for value in rsi.to_list():
-            if pd.isna(value):
-                positions.append(position)
-                continue
-            if value < 30:
-                position = 1
-            elif value > 70:
-                position = 0
-            positions.append(position)
-        signal = pd.Series(positions, index=dfs.index)
-        strategy_desc = "RSI(30/70)"
-    elif strategy_key == "MACD":
-        if "dif" not in dfs.columns or "dea" not in dfs.columns:
-            return "数据缺少 MACD 指标，无法回测"
-        dif = pd.Series(pd.to_numeric(dfs["dif"], errors="coerce"), index=dfs.index)
-        dea = pd.Series(pd.to_numeric(dfs["dea"], errors="coerce"), index=dfs.index)
-        signal = pd.Series((dif > dea).astype(int), index=dfs.index)
-        strategy_desc = "MACD(DIF/DEA)"
-    else:
-        return f"不支持的策略类型: {strategy}"
-
-    returns = dfs["close"].pct_change().fillna(0)
-    position = signal.shift(1).fillna(0)
-    strat_returns = returns.mul(position)
-    equity = (1 + strat_returns).cumprod()
-    cumulative_return = equity.iloc[-1] - 1
-    drawdown = equity / equity.cummax() - 1
-    max_drawdown = drawdown.min()
+    result = backtest_frame(dfs, spec)
+    start_time = str(dfs["date"].iloc[0]) if "date" in dfs.columns else "-"
+    end_time = str(dfs["date"].iloc[-1]) if "date" in dfs.columns else "-"
+    win_text = f"{result.win_rate:.2%}" if result.win_rate is not None else "N/A"
 
-    active = strat_returns[strat_returns != 0]
-    win_rate = (active > 0).mean() if len(active) > 0 else None
-
-    start_time = str(dfs["时间"].iloc[0]) if "时间" in dfs.columns else "-"
-    end_time = str(dfs["时间"].iloc[-1]) if "时间" in dfs.columns else "-"
-    win_text = f"{win_rate:.2%}" if win_rate is not None else "N/A"
-
-    return (
+    report = (
         f"--- 加密货币策略回测: {symbol} ---\n"
-        f"策略: {strategy_desc}\n"
+        f"策略: {spec.name}\n"
         f"周期: {bar} (样本 {len(dfs)} 根K线)\n"
         f"区间: {start_time} ~ {end_time}\n"
-        f"累计收益: {cumulative_return:.2%}\n"
-        f"最大回撤: {max_drawdown:.2%}\n"
+        f"累计收益: {result.cumulative_return:.2%}\n"
+        f"最大回撤: {result.max_drawdown:.2%}\n"
         f"胜率: {win_text}"
     )
+    return RESULTS.set(memo_key, report) if frame.version else report
 
 
 @mcp.tool(
@@ -5,6 +5,7 @@ import pandas as pd
 from pydantic import Field
 
 from mcp_aktools.server import mcp
+from mcp_aktools.shared.history import load_history
 from mcp_aktools.shared.normalize import normalize_rate_df
 from mcp_aktools.shared.utils import ak_cache
 
@@ -77,6 +78,17 @@ def fx_rates(
     )
 
 
+# 东方财富历史行情不提供在岸人民币，使用离岸人民币代替
+FX_HIST_CODES = {
+    "USDCNY": "USDCNH",
+}
+
+
+def fx_pair_hist(symbol, start_date="19700101"):
+    """东方财富外汇历史接口不支持日期区间，只能全量拉取"""
+    return ak.forex_hist_em(symbol=FX_HIST_CODES.get(symbol, symbol))
+
+
 @mcp.tool(
     title="获取外汇历史汇率",
     description="获取指定货币对的历史汇率数据，用于分析汇率走势和波动",
@@ -84,13 +96,15 @@ def fx_rates(
 def fx_history(
     symbol: str = Field(
         "USDCNY",
-        description="货币对代码，支持: USDCNY(美元/人民币), EURUSD(欧元/美元), USDJPY(美元/日元), GBPUSD(英镑/美元), AUDUSD(澳元/美元), USDCAD(美元/加元), USDCHF(美元/瑞郎), NZDUSD(纽元/美元)",
+        description="货币对代码，支持: USDCNY(美元/人民币), EURUSD(欧元/美元), USDJPY(美元/日元), GBPUSD(英镑/美元), AUDUSD(澳元/美元), USDCAD(美元/加元), USDCHF(美元/瑞郎), NZDUSD(纽元/美元)。"
+        "USDCNY 无在岸历史数据，返回离岸人民币 USDCNH，currency 列标注实际货币对",
     ),
     limit: int = Field(30, description="返回数量(int)，建议30-252", strict=False),
 ):
     """获取外汇历史汇率"""
-    # 使用 akshare 的外汇历史数据接口
-    raw = ak_cache(ak.fx_pair_quote, symbol=symbol.upper())
+    # 使用 akshare 的外汇历史数据接口，currency 列标注实际返回的货币对
+    pair = FX_HIST_CODES.get(symbol.upper(), symbol.upper())
+    raw = load_history(fx_pair_hist, f"fx-{pair}", "19700101", ttl=86400, ranged=False, symbol=pair)
     if not isinstance(raw, pd.DataFrame):
         return normalize_rate_df(None, {}, source="akshare", currency=symbol.upper(), limit=limit)
     df = raw.copy()
@@ -112,7 +126,7 @@ def fx_history(
         df,
         {"date": date_col, "rate": "rate"},
         source="akshare",
-        currency=symbol.upper(),
+        currency=pair,
         limit=limit,
         float_format="%.4f",
     )
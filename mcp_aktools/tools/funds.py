@@ -5,6 +5,7 @@ import pandas as pd
 from pydantic import Field
 
 from mcp_aktools.server import mcp
+from mcp_aktools.shared.history import load_history
 from mcp_aktools.shared.schema import format_error_csv
 from mcp_aktools.shared.utils import ak_cache
 
@@ -33,7 +34,9 @@ def fund_nav(
     limit: int = Field(30, description="返回数量(int)，建议30-252", strict=False),
 ):
     """获取基金净值历史"""
-    df = ak_cache(ak.fund_open_fund_daily_em, symbol=code)
+    df = load_history(
+        fund_nav_hist, f"fund-nav-{code}", "19700101", ttl=86400, date_col="净值日期", ranged=False, symbol=code
+    )
     if df is None or df.empty:
         return format_error_csv("empty data", "akshare", fallback=code)
 
@@ -47,6 +50,11 @@ def fund_nav(
     return df.to_csv(index=False, float_format="%.4f")
 
 
+def fund_nav_hist(symbol, start_date="19700101"):
+    """天天基金净值走势接口不支持日期区间，只能全量拉取"""
+    return ak.fund_open_fund_info_em(symbol=symbol, indicator="单位净值走势")
+
+
 @mcp.tool(
     title="获取基金持仓明细",
     description="获取基金的股票持仓明细，包括持仓股票代码、名称、持仓比例等，用于分析基金投资组合",
@@ -5,6 +5,9 @@ import pandas as pd
 from pydantic import Field
 
 from mcp_aktools.server import mcp
+from mcp_aktools.shared.fields import field_indicators
+from mcp_aktools.shared.history import load_history
+from mcp_aktools.shared.indicators import add_technical_indicators, indicator_map, select_indicators
 from mcp_aktools.shared.normalize import normalize_price_df
 from mcp_aktools.shared.schema import format_error_csv
 from mcp_aktools.shared.utils import ak_cache
@@ -42,13 +45,18 @@ def futures_prices(
         description="期货品种，支持: 螺纹钢(RB), 铁矿石(I), 原油(SC), 沪铜(CU), 沪金(AU), 沪银(AG), 焦炭(J), 焦煤(JM), 动力煤(ZC), 玉米(C), 豆粕(M), 豆油(Y), 棕榈油(P), 白糖(SR), 棉花(CF), PTA(TA), 甲醇(MA), 玻璃(FG)",
     ),
     limit: int = Field(30, description="返回数量(int)，建议30-252", strict=False),
+    indicators: str = field_indicators,
 ):
     """获取期货价格"""
+    try:
+        columns = select_indicators(indicators)
+    except ValueError as exc:
+        return format_error_csv(str(exc), "akshare")
     # 转换品种名称为代码
     symbol_code = FUTURES_SYMBOLS.get(symbol, symbol)
 
-    # 使用 akshare 的期货主力合约数据接口
-    df = ak_cache(ak.futures_main_sina, symbol=symbol_code)
+    # 使用 akshare 的期货主力合约数据接口，支持按日期区间增量刷新
+    df = load_history(ak.futures_main_sina, f"futures-{symbol_code}", "19900101", ttl=86400, symbol=symbol_code)
     if df is None or df.empty:
         return normalize_price_df(
             None,
@@ -58,8 +66,8 @@ def futures_prices(
             limit=limit,
         )
 
-    # 取最近的数据
-    df = df.tail(limit).copy()
+    # 取最近的数据，多取 62 根用于计算技术指标
+    df = df.tail(limit + 62).copy()
 
     # 确保日期列存在并格式化
     if "日期" in df.columns:
@@ -74,6 +82,19 @@ def futures_prices(
     low_col = "最低价" if "最低价" in df.columns else "最低"
     close_col = "收盘价" if "收盘价" in df.columns else "收盘"
 
+    if columns and {close_col, low_col, high_col} <= set(df.columns):
+        for col in (close_col, low_col, high_col):
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        add_technical_indicators(
+            df,
+            df[close_col],
+            df[low_col],
+            df[high_col],
+            key=f"futures-{symbol_code}",
+            times=df[date_col],
+            columns=columns,
+        )
+
     return normalize_price_df(
         df,
         {
@@ -88,6 +109,7 @@ def futures_prices(
         currency="CNY",
         limit=limit,
         float_format="%.2f",
+        indicator_map=indicator_map(columns),
     )
 
 
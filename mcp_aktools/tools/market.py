@@ -8,6 +8,7 @@ from pydantic import Field
 
 from ..server import mcp
 from ..shared.constants import USER_AGENT
+from ..shared.sessions import market_ttl
 from ..shared.utils import ak_cache, recent_trade_date
 
 
@@ -38,7 +39,7 @@ def stock_zt_pool_em(
 ):
     if not date:
         date = recent_trade_date().strftime("%Y%m%d")
-    dfs = ak_cache(ak.stock_zt_pool_em, date=date, ttl=1200)
+    dfs = ak_cache(ak.stock_zt_pool_em, date=date, ttl=market_ttl("a", 1200))
     if dfs is None:
         return "获取涨停股池数据失败"
     if dfs.empty:
@@ -64,7 +65,7 @@ def stock_zt_pool_strong_em(
 ):
     if not date:
         date = recent_trade_date().strftime("%Y%m%d")
-    dfs = ak_cache(ak.stock_zt_pool_strong_em, date=date, ttl=1200)
+    dfs = ak_cache(ak.stock_zt_pool_strong_em, date=date, ttl=market_ttl("a", 1200))
     if dfs is None:
         return "获取强势股池数据失败"
     if dfs.empty:
@@ -86,7 +87,7 @@ def stock_lhb_ggtj_sina(
     days: str = Field("5", description="统计最近天数，仅支持: [5/10/30/60]"),
     limit: int = Field(50, description="返回数量(int,30-100)", strict=False),
 ):
-    dfs = ak_cache(ak.stock_lhb_ggtj_sina, symbol=days, ttl=3600)
+    dfs = ak_cache(ak.stock_lhb_ggtj_sina, symbol=days, ttl=market_ttl("a", 3600, closed_ttl=3600))
     if dfs is None:
         return "获取龙虎榜统计数据失败"
     if dfs.empty:
@@ -103,7 +104,7 @@ def stock_sector_fund_flow_rank(
     days: str = Field("今日", description="天数，仅支持: {'今日','5日','10日'}，如果需要获取今日数据，请确保是交易日"),
     cate: str = Field("行业资金流", description="仅支持: {'行业资金流','概念资金流','地域资金流'}"),
 ):
-    dfs = ak_cache(ak.stock_sector_fund_flow_rank, indicator=days, sector_type=cate, ttl=1200)
+    dfs = ak_cache(ak.stock_sector_fund_flow_rank, indicator=days, sector_type=cate, ttl=market_ttl("a", 1200))
     if dfs is None:
         return "获取数据失败"
     try:
@@ -123,7 +124,7 @@ def stock_sector_fund_flow_rank(
     description="获取北向资金近 10 个交易日数据",
 )
 def northbound_funds():
-    dfs = ak_cache(ak.stock_hsgt_hist_em, symbol="北向资金", ttl=3600)
+    dfs = ak_cache(ak.stock_hsgt_hist_em, symbol="北向资金", ttl=market_ttl("a", 3600, closed_ttl=3600))
     if dfs is None or dfs.empty:
         return "获取北向资金数据失败"
     try:
@@ -160,7 +161,9 @@ def sector_valuation():
     description="基于行业资金流与涨跌幅识别短期强势行业",
 )
 def sector_rotation():
-    dfs = ak_cache(ak.stock_sector_fund_flow_rank, indicator="今日", sector_type="行业资金流", ttl=1200)
+    dfs = ak_cache(
+        ak.stock_sector_fund_flow_rank, indicator="今日", sector_type="行业资金流", ttl=market_ttl("a", 1200)
+    )
     if dfs is None or dfs.empty:
         return "获取行业轮动数据失败"
     try:
@@ -238,7 +241,7 @@ def market_anomaly_scan(
     ),
 ):
     try:
-        dfs = ak_cache(ak.stock_changes_em, symbol=symbol, ttl=30, key=f"stock_changes_em-{symbol}")
+        dfs = ak_cache(ak.stock_changes_em, symbol=symbol, ttl=market_ttl("a", 30), key=f"stock_changes_em-{symbol}")
         if dfs is None or dfs.empty:
             return f"当前没有检测到 [{symbol}] 类型的异动信号"
         dfs = dfs.head(20)
@@ -1,18 +1,24 @@
 from datetime import datetime
-from io import StringIO
 
+import numpy as np
 import pandas as pd
 from pydantic import Field
 
+from ..cache import RESULTS
 from ..server import mcp
 from ..shared.fields import field_market
-from ..shared.utils import load_portfolio, save_portfolio
-from .stocks import market_prices
+from ..shared.optimize import OBJECTIVES, Moments, allocate, describe, estimate_moments
+from ..shared.performance import performance
+from ..shared.risk import METHODS, check_options, estimate, return_panel
+from ..shared.schema import format_error_csv
+from ..shared.utils import load_portfolio, portfolio_ledger
+from .analysis import PORTFOLIO_MAX_SYMBOLS, parse_symbols
+from .stocks import MARKET_CURRENCY, load_close_panel, load_quotes, market_prices_version
 
 
 @mcp.tool(
     title="添加持仓记录",
-    description="在模拟盘中添加一笔持仓记录，用于后续跟踪盈亏",
+    description="在模拟盘中添加一笔持仓记录，用于后续跟踪盈亏。同一标的多次买入按批次记账，查看时按加权成本汇总",
 )
 def portfolio_add(
     symbol: str = Field(description="股票或币种代码"),
@@ -20,18 +26,16 @@ def portfolio_add(
     volume: float = Field(description="买入数量"),
     market: str = field_market,
 ):
-    p = load_portfolio()
-    p[f"{symbol}.{market}"] = {
-        "symbol": symbol,
-        "price": price,
-        "volume": volume,
-        "market": market,
-        "time": datetime.now().isoformat(),
-    }
-    save_portfolio(p)
+    portfolio_ledger().add_trade(symbol, market, price, volume, datetime.now().isoformat())
     return f"成功添加持仓: {symbol}, 价格: {price}"
 
 
+def _reprice(p: dict) -> list[tuple[str, dict, float | None]]:
+    """一次批量报价为全部持仓定价: (持仓名, 持仓, 现价或 None)"""
+    quotes = load_quotes([(v["symbol"], v["market"]) for v in p.values()])
+    return [(k, v, quotes.get((v["symbol"], v["market"]))) for k, v in p.items()]
+
+
 @mcp.tool(
     title="查看模拟盘盈亏",
     description="计算当前所有模拟持仓的实时盈亏情况",
@@ -41,18 +45,13 @@ def portfolio_view():
     if not p:
         return "当前模拟盘为空"
     results = []
-    for k, v in p.items():
-        try:
-            prices = market_prices.fn(v["symbol"], v["market"], limit=1)
-            df = pd.read_csv(StringIO(prices))
-            current_price = float(df["close"].iloc[-1])
-            profit = (current_price - v["price"]) * v["volume"]
-            ratio = (current_price / v["price"] - 1) * 100
-            results.append(
-                f"{k}: 成本 {v['price']:.2f} -> 现价 {current_price:.2f} | 盈亏 {profit:+.2f} ({ratio:+.2f}%)"
-            )
-        except Exception:
+    for k, v, current_price in _reprice(p):
+        if current_price is None:
             results.append(f"{k}: 成本 {v['price']:.2f} (无法获取实时现价)")
+            continue
+        profit = (current_price - v["price"]) * v["volume"]
+        ratio = (current_price / v["price"] - 1) * 100
+        results.append(f"{k}: 成本 {v['price']:.2f} -> 现价 {current_price:.2f} | 盈亏 {profit:+.2f} ({ratio:+.2f}%)")
     return "\n".join(results)
 
 
@@ -66,15 +65,9 @@ def portfolio_chart():
         return "当前模拟盘为空，无法生成图表"
 
     holdings = []
-    for k, v in p.items():
-        try:
-            prices = market_prices.fn(v["symbol"], v["market"], limit=1)
-            df = pd.read_csv(StringIO(prices))
-            current_price = float(df["close"].iloc[-1])
-            ratio = (current_price / v["price"] - 1) * 100
-            holdings.append({"name": k, "ratio": ratio})
-        except Exception:
-            holdings.append({"name": k, "ratio": 0.0})
+    for k, v, current_price in _reprice(p):
+        ratio = 0.0 if current_price is None else (current_price / v["price"] - 1) * 100
+        holdings.append({"name": k, "ratio": ratio})
 
     if not holdings:
         return "无有效持仓数据"
@@ -97,3 +90,190 @@ def portfolio_chart():
     lines.append("")
     lines.append(f"最大波动: ±{max_ratio:.2f}%")
     return "\n".join(lines)
+
+
+@mcp.tool(
+    title="模拟盘历史表现",
+    description="根据模拟盘交易流水与历史行情重建每日净值，返回累计收益(时间加权)、年化波动率、最大回撤、夏普比率，"
+    "以及各持仓的成本、市值、盈亏与收益贡献",
+)
+def portfolio_performance(
+    days: int = Field(756, description="回看交易日数，默认约3年；更早买入的持仓按区间首日收盘价计入", strict=False),
+):
+    trades = portfolio_ledger().trades()
+    if trades.empty:
+        return "当前模拟盘为空"
+    pairs = list(dict.fromkeys(zip(trades["symbol"], trades["market"])))
+    names = [f"{code}.{market}" for code, market in pairs]
+    close = load_close_panel(pairs, days)
+    missing = [name for name in names if name not in close.columns]
+    if close.empty:
+        return f"未找到持仓行情: {', '.join(missing)}"
+
+    trades = trades.assign(holding=trades["symbol"] + "." + trades["market"], date=trades["time"])
+    perf = performance(close, trades)
+    result = perf.result
+    if not result.bars:
+        return "区间内没有持仓，无法计算历史表现"
+    positions = perf.positions
+    cost = float((positions["cost"] * positions["volume"]).sum())
+    value = float(positions["value"].sum())
+    sharpe = f"{perf.sharpe:.2f}" if perf.sharpe is not None else "N/A"
+    start = perf.dates[len(perf.dates) - result.bars]
+    lines = [
+        f"--- 模拟盘历史表现 ({len(positions)} 个持仓, {len(trades)} 笔交易) ---",
+        f"区间: {start.date()} ~ {perf.dates[-1].date()} (样本 {result.bars} 日)",
+        f"持仓成本: {cost:.2f} | 当前市值: {value:.2f} | 浮动盈亏: {value - cost:+.2f}",
+        f"累计收益(时间加权): {result.cumulative_return:.2%}",
+        f"年化波动率: {perf.volatility:.2%}",
+        f"最大回撤: {result.max_drawdown:.2%}",
+        f"夏普比率: {sharpe}",
+    ]
+    currencies = sorted({MARKET_CURRENCY.get(market, "CNY") for _, market in pairs})
+    if len(currencies) > 1:
+        lines.append(f"注意: 持仓含 {'/'.join(currencies)} 多种货币，金额按原币种直接相加，未做汇率换算")
+    if missing:
+        lines.append(f"未获取到数据: {', '.join(missing)}")
+    table = positions.rename_axis("holding").reset_index().to_csv(index=False, float_format="%.4f").strip()
+    return "\n".join([*lines, "", table])
+
+
+@mcp.tool(
+    title="模拟盘风险估计",
+    description="基于持仓历史收益的协方差，用蒙特卡洛方法 (历史模拟重抽样 + 多元正态参数法) 估计模拟盘的 VaR 与预期损失 ES",
+)
+def portfolio_risk(
+    days: int = Field(252, description="估计收益分布所用的交易日数", strict=False),
+    horizon: int = Field(1, description="持有期 (交易日)", strict=False),
+    confidence: float = Field(0.95, description="置信度，如 0.95/0.99", strict=False),
+    paths: int = Field(20000, description="模拟路径数，最多 100000", strict=False),
+    seed: int | None = Field(None, description="随机种子，给定时结果可复现", strict=False),
+):
+    try:
+        check_options(METHODS[0], paths, horizon, confidence)
+    except ValueError as exc:
+        return format_error_csv(str(exc), "akshare")
+    holdings = load_portfolio()
+    if not holdings:
+        return "当前模拟盘为空"
+    pairs = [(v["symbol"], v["market"]) for v in holdings.values()]
+    close = load_close_panel(pairs, days + 1)
+    missing = [name for name in holdings if name not in close.columns]
+    if close.empty:
+        return f"未找到持仓行情: {', '.join(missing)}"
+    returns = return_panel(close)
+    if len(returns) < 2:
+        return f"共同交易日不足 ({len(returns)} 日)，无法估计风险"
+
+    volume = np.array([holdings[name]["volume"] for name in close.columns])
+    values = volume * close.ffill().iloc[-1].to_numpy()
+    total = float(values.sum())
+    daily = float(np.sqrt(values @ np.atleast_2d(np.cov(returns, rowvar=False)) @ values))
+    rows = []
+    for method in METHODS:
+        risk = estimate(returns, values, method, paths, horizon, confidence, seed)
+        rows.append((method, paths, risk.var, risk.var / total, risk.es, risk.es / total))
+    lines = [
+        f"--- 模拟盘风险 ({close.shape[1]} 个持仓, 样本 {len(returns)} 日, 持有期 {horizon} 日, 置信度 {confidence:.0%}) ---",
+        f"持仓市值: {total:.2f}",
+        f"组合日波动: {daily:.2f} ({daily / total:.2%})",
+    ]
+    if seed is not None:
+        lines.append(f"随机种子: {seed}")
+    currencies = sorted({MARKET_CURRENCY.get(market, "CNY") for _, market in pairs})
+    if len(currencies) > 1:
+        lines.append(f"注意: 持仓含 {'/'.join(currencies)} 多种货币，金额按原币种直接相加，未做汇率换算")
+    if missing:
+        lines.append(f"未获取到数据: {', '.join(missing)}")
+    table = pd.DataFrame(rows, columns=["method", "paths", "var", "var_pct", "es", "es_pct"])
+    return "\n".join([*lines, "", table.to_csv(index=False, float_format="%.4f").strip()])
+
+
+def _moments_key(pairs: list[tuple[str, str]], days: int) -> str | None:
+    # 协方差按 (标的集合, 窗口) 缓存，键中带各标的行情版本，行情更新后自动失效
+    versions = [market_prices_version(code, market, limit=days + 1) for code, market in pairs]
+    if not all(versions):
+        return None
+    return f"moments-{days}-" + ",".join(sorted(f"{c}.{m}@{v}" for (c, m), v in zip(pairs, versions)))
+
+
+def load_moments(pairs: list[tuple[str, str]], days: int) -> tuple[Moments | None, bool]:
+    """Annualized return moments of ``pairs`` over ``days`` bars, and whether they came from the cache.
+
+    Symbols without data are left out of the moments; ``None`` when none has any.
+    """
+    names = [f"{code}.{market}" for code, market in pairs]
+    memo_key = _moments_key(pairs, days)
+    if memo_key and (cached := RESULTS.get(memo_key)) is not None:
+        return cached.subset(names), True
+    close = load_close_panel(pairs, days + 1)
+    if close.empty:
+        return None, False
+    moments = estimate_moments(close)
+    if len(moments.names) == len(names) and (memo_key := _moments_key(pairs, days)):
+        RESULTS.set(memo_key, moments)
+    return moments, False
+
+
+@mcp.tool(
+    title="组合权重优化",
+    description="根据多个标的 (可跨市场) 的历史收益与协方差，求解最小方差、最大夏普、风险平价组合 (只做多，权重和为1)，"
+    "返回各标的目标权重及组合预期年化收益、波动率与夏普比率。协方差按标的集合与窗口缓存，可反复调整参数试算",
+)
+def portfolio_optimize(
+    symbols: str = Field(
+        description="标的列表，逗号或空格分隔，格式: 代码.市场，如: 600519.sh,00700.hk,AAPL.us；未带市场后缀的使用 market"
+    ),
+    market: str = field_market,
+    days: int = Field(252, description="估计收益与协方差所用的交易日数", strict=False),
+    method: str = Field(
+        "all", description="优化目标: min_variance(最小方差)/max_sharpe(最大夏普)/risk_parity(风险平价)/all(全部)"
+    ),
+    risk_free: float = Field(0.0, description="年化无风险利率，如 0.02", strict=False),
+):
+    method = (method or "all").strip().lower()
+    objectives = OBJECTIVES if method == "all" else (method,)
+    if method != "all" and method not in OBJECTIVES:
+        return format_error_csv(f"unknown method: {method} (支持: {', '.join(OBJECTIVES)}, all)", "akshare")
+    pairs = parse_symbols(symbols, market if isinstance(market, str) else "sh")
+    if not pairs:
+        return "未提供标的"
+    if len(pairs) > PORTFOLIO_MAX_SYMBOLS:
+        return format_error_csv(f"too many symbols: {len(pairs)} > {PORTFOLIO_MAX_SYMBOLS}", "akshare")
+    try:
+        moments, cached = load_moments(pairs, days)
+    except ValueError as exc:
+        return format_error_csv(str(exc), "akshare")
+    names = [f"{code}.{mkt}" for code, mkt in pairs]
+    if moments is None:
+        return f"未找到可优化数据: {', '.join(names)}"
+
+    weights, rows, skipped = {}, [], []
+    for objective in objectives:
+        try:
+            weights[objective] = allocate(moments, objective, risk_free)
+        except ValueError as exc:
+            skipped.append(f"{objective}: {exc}")
+            continue
+        rows.append({"method": objective, **describe(moments, weights[objective], risk_free)})
+    lines = [
+        f"--- 组合权重优化 ({len(moments.names)} 个标的, 样本 {moments.days} 日, 年化, 无风险利率 {risk_free:.2%}) ---",
+        f"协方差: {'缓存命中' if cached else '新计算'}",
+    ]
+    missing = [name for name in names if name not in moments.names]
+    if missing:
+        lines.append(f"未获取到数据: {', '.join(missing)}")
+    lines.extend(f"无法求解 {text}" for text in skipped)
+    if not weights:
+        return "\n".join(lines)
+    table = pd.DataFrame(weights, index=pd.Index(moments.names, name="symbol")).reset_index()
+    summary = pd.DataFrame(rows)
+    return "\n".join(
+        [
+            *lines,
+            "",
+            table.to_csv(index=False, float_format="%.4f").strip(),
+            "",
+            summary.to_csv(index=False, float_format="%.4f").strip(),
+        ]
+    )
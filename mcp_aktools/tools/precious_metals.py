@@ -6,9 +6,12 @@ from fastmcp import Context
 from pydantic import Field
 
 from mcp_aktools.server import mcp
-from mcp_aktools.shared.indicators import add_technical_indicators
+from mcp_aktools.shared.fields import field_indicators
+from mcp_aktools.shared.history import load_history
+from mcp_aktools.shared.indicators import add_technical_indicators, indicator_map, select_indicators
 from mcp_aktools.shared.normalize import normalize_price_df
 from mcp_aktools.shared.schema import format_error_csv
+from mcp_aktools.shared.sessions import market_ttl
 from mcp_aktools.shared.utils import ak_cache
 
 # 上海金交所品种映射
@@ -39,9 +42,22 @@ def pm_spot_prices(
         description="品种代码，支持: Au99.99(黄金9999), Au99.95(黄金9995), Au(T+D)(黄金T+D), Ag99.99(白银9999), Ag(T+D)(白银T+D)",
     ),
     limit: int = Field(30, description="返回数量(int)，建议30-252", strict=False),
+    indicators: str = field_indicators,
 ):
     """获取上海金交所现货历史价格"""
-    df = ak_cache(ak.spot_hist_sge, symbol=symbol)
+    try:
+        columns = select_indicators(indicators)
+    except ValueError as exc:
+        return format_error_csv(str(exc), "akshare")
+    df = load_history(
+        spot_hist_sge,
+        f"sge-{symbol}",
+        "19700101",
+        ttl=market_ttl("sge", 3600),
+        date_col="date",
+        ranged=False,
+        symbol=symbol,
+    )
     if df is None or df.empty:
         return normalize_price_df(
             None,
@@ -70,7 +86,9 @@ def pm_spot_prices(
     if volume_col in df.columns:
         df[volume_col] = pd.to_numeric(df[volume_col], errors="coerce")
 
-    add_technical_indicators(df, df[close_col], df[low_col], df[high_col])
+    add_technical_indicators(
+        df, df[close_col], df[low_col], df[high_col], key=f"sge-{symbol}", times=df[date_col], columns=columns
+    )
 
     column_map: dict[str, str] = {
         "date": date_col,
@@ -89,21 +107,15 @@ def pm_spot_prices(
         currency="CNY",
         limit=limit,
         float_format="%.2f",
-        indicator_map={
-            "macd": "MACD",
-            "dif": "DIF",
-            "dea": "DEA",
-            "kdj_k": "KDJ.K",
-            "kdj_d": "KDJ.D",
-            "kdj_j": "KDJ.J",
-            "rsi": "RSI",
-            "boll_u": "BOLL.U",
-            "boll_m": "BOLL.M",
-            "boll_l": "BOLL.L",
-        },
+        indicator_map=indicator_map(columns),
     )
 
 
+def spot_hist_sge(symbol, start_date="19700101"):
+    """上金所接口不支持日期区间，只能全量拉取"""
+    return ak.spot_hist_sge(symbol=symbol)
+
+
 @mcp.tool(
     title="获取国际贵金属价格",
     description="获取国际贵金属实时价格，包括伦敦金、伦敦银、COMEX黄金、COMEX白银等",
@@ -1,4 +1,6 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Iterable
 
 import akshare as ak
 import pandas as pd
@@ -6,10 +8,13 @@ from fastmcp import Context
 from pydantic import Field
 
 from ..server import mcp
-from ..shared.fields import field_market, field_symbol
-from ..shared.indicators import add_technical_indicators
-from ..shared.normalize import normalize_price_df
-from ..shared.utils import ak_cache, ak_search, ak_search_async
+from ..shared.fields import field_indicators, field_market, field_symbol
+from ..shared.history import HISTORY_VERSION, history_version, load_history
+from ..shared.indicators import add_technical_indicators, indicator_map, select_indicators
+from ..shared.normalize import PriceFrame, format_price_csv, price_frame
+from ..shared.schema import format_error_csv
+from ..shared.sessions import market_ttl
+from ..shared.utils import ak_cache, ak_search, ak_search_async, ak_search_ranked
 
 
 @mcp.tool(
@@ -44,6 +49,25 @@ async def search(
     return f"Not Found for {keyword}"
 
 
+@mcp.tool(
+    title="模糊搜索证券代码",
+    description="按代码、名称、简称或拼音首字母 (如 gzmt) 模糊搜索证券，返回按相关度排序的候选列表及所属市场。"
+    "支持一次传入多个关键词批量搜索，不确定准确名称时优先使用",
+)
+async def search_candidates(
+    keywords: str = Field(description="搜索关键词，多个关键词用逗号或空格分隔，如: 茅台,gzmt,招行"),
+    market: str = Field("", description="限定市场: sh/sz/bj/hk/us，留空搜索全部市场"),
+    limit: int = Field(5, description="每个关键词返回的候选数量(int)", strict=False),
+) -> str:
+    queries = [q for q in keywords.replace("，", ",").replace(",", " ").split() if q]
+    if not queries:
+        return "Not Found"
+    dfs = await ak_search_ranked(queries, market=market or None, limit=max(1, min(int(limit), 50)))
+    if dfs is None or dfs.empty:
+        return f"Not Found for {keywords}"
+    return dfs.to_csv(index=False, float_format="%.1f").strip()
+
+
 @mcp.tool(
     title="获取股票信息",
     description="根据股票代码和市场获取股票基本信息, 不支持加密货币",
@@ -65,7 +89,7 @@ def stock_info(
             continue
         return all_df.to_string()
 
-    info = ak_search(symbol, market)
+    info = ak_search(symbol, market=market)
     if info is not None:
         return info.to_string()
     return f"Not Found for {symbol}.{market}"
@@ -122,25 +146,73 @@ def market_prices(
     period: str = Field("daily", description="周期，如: daily(日线), weekly(周线，不支持美股)"),
     limit: int = Field(30, description="返回数量(int)", strict=False),
     asset: str = Field("equity", description="资产类型: equity/etf"),
+    indicators: str = field_indicators,
 ) -> str:
+    try:
+        frame = load_market_prices(symbol, market, period, limit, asset, indicators)
+    except ValueError as exc:
+        return format_error_csv(str(exc), "akshare")
+    return format_price_csv(frame, "akshare", float_format="%.2f")
+
+
+# 标准行情字段对应的上游列名
+PRICE_SOURCE_COLUMNS = {
+    "date": "日期",
+    "open": "开盘",
+    "high": "最高",
+    "low": "最低",
+    "close": "收盘",
+    "volume": "成交量",
+    "amount": "成交额",
+}
+
+
+def _history_start_date(period: str, limit: int) -> str:
+    delta = {"weeks": limit + 62} if period == "weekly" else {"days": limit + 62}
+    return (datetime.now() - timedelta(**delta)).strftime("%Y%m%d")
+
+
+def market_prices_version(
+    symbol: str, market: str = "sh", period: str = "daily", limit: int = 30, asset: str = "equity"
+) -> str | None:
+    """Version of the bars ``load_market_prices`` would return, if they are cached fresh; ``None`` if it would fetch."""
+    return history_version(f"{market}-{asset}-{symbol}-{period}", _history_start_date(period, limit))
+
+
+def load_market_prices(
+    symbol: str,
+    market: str = "sh",
+    period: str = "daily",
+    limit: int = 30,
+    asset: str = "equity",
+    indicators: str = "all",
+    fields: Iterable[str] | None = None,
+) -> PriceFrame | None:
+    """股票/ETF 历史价格及技术指标 (进程内调用，不经过 CSV)。未找到返回 None，指标名无效时抛出 ValueError
+
+    fields 为所需的标准行情字段 (如 ("close",))，只从缓存读取这些列，其余字段为空
+    """
+    columns = select_indicators(indicators)
+    projection = None
+    if fields is not None:
+        # 计算指标还需要最高/最低价
+        wanted = {*fields, *(("close", "low", "high") if columns else ())}
+        projection = [col for field, col in PRICE_SOURCE_COLUMNS.items() if field in wanted]
     if not isinstance(market, str):
         market = "sh"
     if not isinstance(period, str):
         period = "daily"
     if not isinstance(asset, str):
         asset = "equity"
-    if period == "weekly":
-        delta = {"weeks": limit + 62}
-    else:
-        delta = {"days": limit + 62}
-    start_date = (datetime.now() - timedelta(**delta)).strftime("%Y%m%d")
+    start_date = _history_start_date(period, limit)
+    # 第 5 列: 上游接口是否支持按日期区间拉取 (支持时增量刷新)
     markets = [
-        ["sh", ak.stock_zh_a_hist, {}, "equity"],
-        ["sz", ak.stock_zh_a_hist, {}, "equity"],
-        ["hk", ak.stock_hk_hist, {}, "equity"],
-        ["us", stock_us_daily, {}, "equity"],
-        ["sh", fund_etf_hist_sina, {"market": "sh"}, "etf"],
-        ["sz", fund_etf_hist_sina, {"market": "sz"}, "etf"],
+        ["sh", ak.stock_zh_a_hist, {}, "equity", True],
+        ["sz", ak.stock_zh_a_hist, {}, "equity", True],
+        ["hk", ak.stock_hk_hist, {}, "equity", True],
+        ["us", stock_us_daily, {}, "equity", False],
+        ["sh", fund_etf_hist_sina, {"market": "sh"}, "etf", False],
+        ["sz", fund_etf_hist_sina, {"market": "sz"}, "etf", False],
     ]
     for m in markets:
         if m[0] != market:
@@ -148,51 +220,128 @@ def market_prices(
         if m[3] != asset:
             continue
         extra = m[2] if isinstance(m[2], dict) else {}
-        kws = {"period": period, "start_date": start_date, **extra}
-        dfs = ak_cache(m[1], symbol=symbol, ttl=3600, **kws)
+        dfs = load_history(
+            m[1],
+            f"{market}-{asset}-{symbol}-{period}",
+            start_date,
+            ttl=market_ttl(market, 3600),
+            ranged=m[4],
+            columns=projection,
+            symbol=symbol,
+            period=period,
+            **extra,
+        )
         if dfs is None or dfs.empty:
             continue
-        add_technical_indicators(dfs, dfs["收盘"], dfs["最低"], dfs["最高"])
-        currency_map = {"sh": "CNY", "sz": "CNY", "hk": "HKD", "us": "USD"}
-        currency = currency_map.get(market, "CNY")
-        return normalize_price_df(
+        if columns:
+            add_technical_indicators(
+                dfs,
+                dfs["收盘"],
+                dfs["最低"],
+                dfs["最高"],
+                key=f"{market}-{asset}-{symbol}-{period}",
+                times=dfs["日期"],
+                columns=columns,
+            )
+        currency = MARKET_CURRENCY.get(market, "CNY")
+        return price_frame(
             dfs,
-            {
-                "date": "日期",
-                "open": "开盘",
-                "high": "最高",
-                "low": "最低",
-                "close": "收盘",
-                "volume": "成交量",
-                "amount": "成交额",
-            },
+            PRICE_SOURCE_COLUMNS,
             source="akshare",
             currency=currency,
             limit=limit,
-            float_format="%.2f",
-            indicator_map={
-                "macd": "MACD",
-                "dif": "DIF",
-                "dea": "DEA",
-                "kdj_k": "KDJ.K",
-                "kdj_d": "KDJ.D",
-                "kdj_j": "KDJ.J",
-                "rsi": "RSI",
-                "boll_u": "BOLL.U",
-                "boll_m": "BOLL.M",
-                "boll_l": "BOLL.L",
-            },
+            indicator_map=indicator_map(columns),
+            version=dfs.attrs.get(HISTORY_VERSION),
         )
-    return normalize_price_df(
-        None,
-        {},
-        source="akshare",
-        currency="",
-        limit=limit,
-    )
+    return None
+
+
+MARKET_CURRENCY = {"sh": "CNY", "sz": "CNY", "hk": "HKD", "us": "USD"}
+
+# 批量报价: 非 A 股标的的并发拉取数上限
+QUOTE_CONCURRENCY = 16
+
+
+def a_share_spot() -> pd.Series | None:
+    """全市场 A 股最新价 (按代码索引)，来自一份缓存的行情快照"""
+    dfs = ak_cache(ak.stock_zh_a_spot_em, ttl=market_ttl("a", 60), key="stock_zh_a_spot_em")
+    if dfs is None or dfs.empty or "代码" not in dfs.columns or "最新价" not in dfs.columns:
+        return None
+    prices = pd.Series(pd.to_numeric(dfs["最新价"], errors="coerce").to_numpy(), index=dfs["代码"].astype(str))
+    prices = prices.dropna()
+    return prices[~prices.index.duplicated()]
+
+
+def _last_close(symbol: str, market: str) -> float | None:
+    frame = load_market_prices(symbol, market, limit=1, indicators="none", fields=("close",))
+    if frame is None or frame.empty:
+        return None
+    close = frame.close[-1]
+    return None if close != close else float(close)
+
+
+def load_quotes(pairs: list[tuple[str, str]]) -> dict[tuple[str, str], float | None]:
+    """Latest price of each ``(symbol, market)`` in one pass; ``None`` where it cannot be priced.
+
+    A-shares are read from one market-wide spot snapshot; everything else
+    (and A-share codes the snapshot lacks, e.g. ETFs or suspended stocks) is
+    fetched concurrently, at most ``QUOTE_CONCURRENCY`` at a time, while the
+    snapshot loads.
+    """
+    pairs = list(dict.fromkeys(pairs))
+    a_shares = [pair for pair in pairs if pair[1] in ("sh", "sz")]
+    quotes: dict[tuple[str, str], float | None] = {}
+    if not pairs:
+        return quotes
+    with ThreadPoolExecutor(max_workers=min(QUOTE_CONCURRENCY, len(pairs) + 1)) as pool:
+        spot = pool.submit(a_share_spot) if a_shares else None
+        futures = {pair: pool.submit(_last_close, *pair) for pair in pairs if pair not in a_shares}
+        try:
+            snapshot = spot.result() if spot else None
+        except Exception:
+            snapshot = None
+        for pair in a_shares:
+            price = None if snapshot is None else snapshot.get(str(pair[0]))
+            if price is None:
+                futures[pair] = pool.submit(_last_close, *pair)
+            else:
+                quotes[pair] = float(price)
+        for pair, future in futures.items():
+            try:
+                quotes[pair] = future.result()
+            except Exception:
+                quotes[pair] = None
+    return {pair: quotes.get(pair) for pair in pairs}
+
+
+def load_close_panel(pairs: list[tuple[str, str]], limit: int) -> pd.DataFrame:
+    """Daily closes of each ``(symbol, market)`` over the last ``limit`` bars, as one dates × ``symbol.market`` panel.
+
+    Histories are loaded concurrently (at most ``QUOTE_CONCURRENCY`` at a
+    time) from the bar store; dates are the union across markets, so a column
+    is NaN where its market was closed. Symbols without data have no column.
+    """
+    pairs = list(dict.fromkeys(pairs))
+
+    def closes(pair: tuple[str, str]) -> pd.Series | None:
+        try:
+            frame = load_market_prices(*pair, limit=limit, indicators="none", fields=("close",))
+        except Exception:
+            return None
+        if frame is None or frame.empty or "date" not in frame:
+            return None
+        data = frame.data.dropna(subset=["date", "close"]).drop_duplicates("date", keep="last")
+        return pd.Series(data["close"].to_numpy(dtype=float), index=pd.DatetimeIndex(data["date"]))
+
+    if not pairs:
+        return pd.DataFrame()
+    with ThreadPoolExecutor(max_workers=min(QUOTE_CONCURRENCY, len(pairs))) as pool:
+        series = dict(zip([f"{code}.{market}" for code, market in pairs], pool.map(closes, pairs)))
+    series = {name: values for name, values in series.items() if values is not None and len(values)}
+    return pd.DataFrame(series).sort_index() if series else pd.DataFrame()
 
 
-def stock_us_daily(symbol, start_date="2025-01-01", period="daily"):
+def stock_us_daily(symbol, start_date="2025-01-01", period="daily", end_date="22220101"):
     dfs = ak.stock_us_daily(symbol=symbol)
     if dfs is None or dfs.empty:
         return None
@@ -209,10 +358,10 @@ def stock_us_daily(symbol, start_date="2025-01-01", period="daily"):
     )
     dfs["换手率"] = None
     dfs.index = pd.to_datetime(dfs["日期"], errors="coerce")
-    return dfs[start_date:"2222-01-01"]
+    return dfs[pd.Timestamp(start_date) : pd.Timestamp(end_date)]
 
 
-def fund_etf_hist_sina(symbol, market="sh", start_date="2025-01-01", period="daily"):
+def fund_etf_hist_sina(symbol, market="sh", start_date="2025-01-01", period="daily", end_date="22220101"):
     dfs = ak.fund_etf_hist_sina(symbol=f"{market}{symbol}")
     if dfs is None or dfs.empty:
         return None
@@ -229,7 +378,7 @@ def fund_etf_hist_sina(symbol, market="sh", start_date="2025-01-01", period="dai
     )
     dfs["换手率"] = None
     dfs.index = pd.to_datetime(dfs["日期"], errors="coerce")
-    return dfs[start_date:"2222-01-01"]
+    return dfs[pd.Timestamp(start_date) : pd.Timestamp(end_date)]
 
 
 @mcp.tool(
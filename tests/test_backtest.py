@@ -0,0 +1,141 @@
+"""Parity tests for the vectorized backtest core."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mcp_aktools.shared import backtest
+from mcp_aktools.shared.backtest import (
+    STRATEGIES,
+    backtest_pandas,
+    panel_backtest,
+    portfolio_weights,
+    positions_loop,
+    run_backtest,
+)
+from mcp_aktools.shared.indicators import compute_pandas
+
+
+def bars(n=600, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 10 + rng.standard_normal(n).cumsum() * 0.1
+    low = close - rng.random(n) * 0.2
+    high = close + rng.random(n) * 0.2
+    # 停牌: 价格不变，BOLL 上下轨重合
+    close[100:130] = low[100:130] = high[100:130] = close[100]
+    out = compute_pandas(pd.Series(close), pd.Series(low), pd.Series(high))
+    data = pd.DataFrame(
+        {
+            "close": close,
+            "rsi": out["RSI"],
+            "dif": out["DIF"],
+            "dea": out["DEA"],
+            "kdj_k": out["KDJ.K"],
+            "kdj_d": out["KDJ.D"],
+            "boll_u": out["BOLL.U"],
+            "boll_l": out["BOLL.L"],
+        }
+    )
+    # 指标缺失的 K 线
+    data.loc[[300, 301, 450], ["rsi", "kdj_k", "boll_u"]] = np.nan
+    return data
+
+
+class TestSignals:
+    def test_hold_signal(self):
+        enter = np.array([False, True, False, False, True, False, True])
+        exit_ = np.array([True, False, False, True, False, True, True])
+        np.testing.assert_array_equal(backtest.hold_signal(enter, exit_), [0, 1, 1, 0, 1, 0, 1])
+
+    def test_hold_signal_starts_flat(self):
+        none = np.zeros(3, dtype=bool)
+        np.testing.assert_array_equal(backtest.hold_signal(none, none), [0, 0, 0])
+
+    @pytest.mark.parametrize("key", ["RSI", "BOLL", "KDJ"])
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    def test_matches_per_bar_loop(self, key, seed):
+        data = bars(seed=seed)
+        values = backtest.strategy_values(data, STRATEGIES[key])
+        np.testing.assert_array_equal(STRATEGIES[key].signal(values), positions_loop(key, values))
+
+
+class TestRunBacktest:
+    @pytest.mark.parametrize("key", ["SMA", "RSI", "MACD", "BOLL", "MA_CROSS", "KDJ"])
+    def test_matches_pandas(self, key):
+        data = bars()
+        result = backtest.backtest_frame(data, STRATEGIES[key])
+        values = backtest.strategy_values(data, STRATEGIES[key])
+        expected = backtest_pandas(data["close"], pd.Series(STRATEGIES[key].signal(values)))
+        assert result.cumulative_return == expected["cumulative_return"]
+        assert result.max_drawdown == expected["max_drawdown"]
+        assert result.win_rate == expected["win_rate"]
+        assert result.bars == len(data)
+
+    def test_no_trades(self):
+        close = np.array([10.0, 10.5, 10.2])
+        result = run_backtest(close, np.zeros(3))
+        assert result.cumulative_return == 0
+        assert result.max_drawdown == 0
+        assert result.win_rate is None
+
+    def test_position_lags_signal(self):
+        close = np.array([10.0, 11.0, 12.1, 12.1])
+        result = run_backtest(close, np.array([1.0, 1.0, 0.0, 0.0]))
+        # 第 0 根收盘买入，第 2 根收盘卖出
+        np.testing.assert_allclose(result.returns, [0, 0.1, 0.1, 0])
+        assert result.cumulative_return == pytest.approx(0.21)
+        assert result.win_rate == 1.0
+
+
+class TestPanelBacktest:
+    def panel(self):
+        # 三个标的交易日不同 (跨市场)，其中一个晚上市
+        calendars = [
+            pd.bdate_range("2024-01-01", periods=300),
+            pd.date_range("2024-01-01", periods=400),
+            pd.bdate_range("2024-05-01", periods=150),
+        ]
+        closes, signals = {}, {}
+        for seed, dates in enumerate(calendars):
+            data = bars(seed=seed).iloc[: len(dates)].set_axis(dates)
+            closes[f"s{seed}"] = data["close"]
+            values = backtest.strategy_values(data, STRATEGIES["RSI"])
+            signals[f"s{seed}"] = pd.Series(STRATEGIES["RSI"].signal(values), index=dates)
+        return pd.DataFrame(closes).sort_index(), pd.DataFrame(signals), closes, signals
+
+    def test_columns_match_single_symbol(self):
+        close, signal, closes, signals = self.panel()
+        per_symbol, _ = panel_backtest(close, signal, np.full(3, 1 / 3))
+        for name in closes:
+            single = run_backtest(closes[name].to_numpy(), signals[name].to_numpy())
+            row = per_symbol.loc[name]
+            assert row["bars"] == len(closes[name])
+            assert row["return"] == pytest.approx(single.cumulative_return, rel=1e-12)
+            assert row["max_drawdown"] == pytest.approx(single.max_drawdown, rel=1e-12)
+            assert row["win_rate"] == single.win_rate
+
+    def test_portfolio_is_weighted_sum(self):
+        close, signal, _, _ = self.panel()
+        weights = np.array([0.5, 0.3, 0.2])
+        _, result = panel_backtest(close, signal, weights)
+        strat = backtest.strategy_returns(
+            close.ffill().to_numpy(), signal.reindex_like(close).ffill().fillna(0).to_numpy()
+        )
+        np.testing.assert_allclose(result.returns, strat @ weights)
+        assert result.bars == len(close)
+        assert result.cumulative_return == pytest.approx(np.prod(1 + strat @ weights) - 1)
+
+    def test_weights(self):
+        close = pd.DataFrame({"a.sh": [1.0, 1.1, 1.0, 1.1], "b.sz": [1.0, 1.01, 1.0, 1.01], "c.hk": 1.0})
+        np.testing.assert_allclose(portfolio_weights("equal", close), [1 / 3] * 3)
+        np.testing.assert_allclose(portfolio_weights("A.SH=3 b.sz=1", close), [0.75, 0.25, 0])
+        inverse = portfolio_weights("inverse_vol", close)
+        # 无波动的标的权重为 0，其余与波动率成反比
+        assert inverse[2] == 0 and inverse[1] / inverse[0] == pytest.approx(10, rel=0.05)
+        for rule, message in [("x.sh=1", "unknown symbol"), ("a.sh=-1", "invalid weight"), ("a.sh=0", "positive")]:
+            with pytest.raises(ValueError, match=message):
+                portfolio_weights(rule, close)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
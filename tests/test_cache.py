@@ -3,10 +3,12 @@
 import pytest
 import tempfile
 import shutil
+import sys
 from pathlib import Path
 from unittest import mock
 
-from mcp_aktools.cache import CacheKey
+from mcp_aktools import cache as cache_module
+from mcp_aktools.cache import FRAME_SUFFIX, CacheKey, FrameDisk, MemoryCache, ResultCache, SingleFlight
 
 
 class TestCacheKey:
@@ -92,6 +94,34 @@ class TestCacheKey:
         assert cache.cache2.get("delete_key") is None
         assert cache.get() is None
 
+    def test_keys_share_one_disk_handle(self):
+        """Test that all keys use the same sharded diskcache."""
+        import diskcache
+
+        first = CacheKey.init("shared_a", ttl=60)
+        second = CacheKey.init("shared_b", ttl=60)
+
+        assert first.cache2 is second.cache2
+        assert isinstance(first.cache2, diskcache.FanoutCache)
+
+    def test_shared_disk_reads_env_settings(self):
+        """Test shard count and size limit come from the environment."""
+        from mcp_aktools import cache as cache_module
+
+        env = {"AKTOOLS_L2_SHARDS": "2", "AKTOOLS_L2_SIZE_LIMIT_MB": "64", "AKTOOLS_L2_EVICTION": "none"}
+        with (
+            mock.patch.dict("os.environ", env),
+            mock.patch.object(CacheKey, "get_cache_dir", return_value=Path(self.temp_dir)),
+            mock.patch.object(cache_module, "_L2", None),
+        ):
+            disk = cache_module.shared_disk()
+            try:
+                assert len(disk._shards) == 2
+                assert disk.size_limit == 32 * 1024 * 1024  # 总上限按分片平分
+                assert disk.eviction_policy == "none"
+            finally:
+                disk.close()
+
     def test_custom_ttl2(self):
         """Test custom ttl2 for disk cache."""
         cache = CacheKey.init("ttl_key", ttl=60, ttl2=300)
@@ -99,6 +129,40 @@ class TestCacheKey:
         assert cache.ttl == 60
         assert cache.ttl2 == 300
 
+    def test_lookup_reports_freshness(self):
+        """Test fresh/stale/expired states derived from soft and hard TTL."""
+        import time
+
+        cache = CacheKey.init("swr_key", ttl=60, ttl2=120, stale_ttl=600)
+        cache.set("swr_value")
+        cache.cache1.pop("swr_key", None)
+        now = time.time()
+
+        assert cache.lookup() == ("swr_value", "fresh")
+        with mock.patch("mcp_aktools.cache.time.time", return_value=now + 90):
+            assert cache.lookup() == ("swr_value", "stale")
+            assert cache.get() == "swr_value"
+        with mock.patch("mcp_aktools.cache.time.time", return_value=now + 300):
+            assert cache.lookup() == ("swr_value", "expired")
+            assert cache.get() is None
+            assert cache.get_stale() == "swr_value"
+        cache.delete()
+
+    def test_set_overrides_ttl_per_value(self):
+        """Test that a per-value TTL (e.g. from a session policy) drives freshness."""
+        import time
+
+        cache = CacheKey.init("session_key", ttl=60)
+        cache.set("overnight", ttl=3600)
+        cache.cache1.pop("session_key", None)
+        now = time.time()
+
+        with mock.patch("mcp_aktools.cache.time.time", return_value=now + 600):
+            assert cache.lookup() == ("overnight", "fresh")
+        with mock.patch("mcp_aktools.cache.time.time", return_value=now + 5000):
+            assert cache.lookup() == ("overnight", "stale")
+        cache.delete()
+
     def test_get_cache_dir_unix(self):
         """Test cache directory path on Unix-like systems."""
         with mock.patch("sys.platform", "linux"):
@@ -190,5 +254,270 @@ class TestCacheEdgeCases:
         assert result["dict"]["nested"] == "value"
 
 
+class TestMemoryCache:
+    """Test the byte-budgeted process-wide L1."""
+
+    def setup_method(self):
+        CacheKey.ALL = {}
+
+    def teardown_method(self):
+        CacheKey.ALL = {}
+
+    def test_evicts_least_recently_used_over_budget(self):
+        import pandas as pd
+
+        df = pd.DataFrame({"col": range(1000)})
+        l1 = MemoryCache(int(df.memory_usage(deep=True).sum() * 2.5))
+        l1.put("a", df, ttl=60)
+        l1.put("b", df, ttl=60)
+        l1.get("a")
+        l1.put("c", df, ttl=60)
+
+        assert "a" in l1 and "c" in l1
+        assert "b" not in l1
+        assert l1.currsize <= l1.maxsize
+
+    def test_eviction_releases_registry_entry(self):
+        l1 = MemoryCache(4096, on_evict=CacheKey.release)
+        caches = [CacheKey.init(f"l1_key_{i}", ttl=60) for i in range(3)]
+        for cache in caches:
+            cache.cache1 = l1
+            cache.set("x" * 1500)
+
+        assert "l1_key_0" not in CacheKey.ALL
+        assert "l1_key_2" in CacheKey.ALL
+        for cache in caches:
+            cache.delete()
+
+    def test_value_over_budget_is_not_kept_in_memory(self):
+        l1 = MemoryCache(1024)
+        l1.put("big", "x" * 4096, ttl=60)
+
+        assert l1.get("big") is None
+        assert len(l1) == 0
+
+    def test_entries_expire_after_key_ttl(self):
+        now = [1000.0]
+        l1 = MemoryCache(1024 * 1024, timer=lambda: now[0])
+        l1.put("short", 1, ttl=10)
+        l1.put("long", 2, ttl=100)
+        now[0] = 1050.0
+
+        assert l1.get("short") is None
+        assert l1.get("long") == 2
+
+    def test_sizeof_counts_index_fields(self):
+        import pandas as pd
+
+        from mcp_aktools.cache import sizeof
+        from mcp_aktools.shared.symbols import SearchEngine, SymbolIndex
+
+        df = pd.DataFrame({"code": [f"{i:06d}" for i in range(2000)], "name": [f"股票{i}" for i in range(2000)]})
+        index = SymbolIndex.build(df, "code", "name")
+        engine = SearchEngine.build([("sh", df, "code", "name")])
+
+        assert sizeof(index) > sizeof(index.codes) + sizeof(index.joined)
+        assert sizeof(engine) > sizeof(engine.grams) + sizeof(engine.names)
+        assert sizeof(engine) > 100 * sys.getsizeof(engine)
+
+    def test_registry_is_bounded(self):
+        with mock.patch.object(CacheKey, "MAX_KEYS", 3):
+            for i in range(5):
+                CacheKey.init(f"bounded_{i}")
+
+        assert list(CacheKey.ALL) == ["bounded_2", "bounded_3", "bounded_4"]
+
+
+class TestResultCache:
+    """Test the memo for derived tool outputs."""
+
+    def test_counts_hits_and_misses(self):
+        results = ResultCache(1024 * 1024)
+        assert results.hit_ratio() is None
+        assert results.get("backtest-v1") is None
+        results.set("backtest-v1", "report")
+        assert results.get("backtest-v1") == "report"
+        assert results.get("backtest-v1") == "report"
+        assert (results.hits, results.misses) == (2, 1)
+        assert results.hit_ratio() == pytest.approx(2 / 3)
+
+    def test_bounded_and_expiring(self):
+        now = [1000.0]
+        results = ResultCache(4096, ttl=60, timer=lambda: now[0])
+        for i in range(3):
+            results.set(f"key-{i}", "x" * 1500)
+        assert results.get("key-0") is None and results.get("key-2") is not None
+        now[0] += 61
+        assert results.get("key-2") is None
+
+    def test_does_not_register_cache_keys(self):
+        CacheKey.ALL = {}
+        ResultCache(4096).set("backtest-v1", "report")
+        assert CacheKey.ALL == {}
+
+    def test_eviction_keeps_cache_key_registry(self):
+        CacheKey.ALL = {"key-0": mock.sentinel.cache}
+        results = ResultCache(4096)
+        for i in range(3):
+            results.set(f"key-{i}", "x" * 1500)
+        assert results.get("key-0") is None
+        assert CacheKey.ALL == {"key-0": mock.sentinel.cache}
+        CacheKey.ALL = {}
+
+
+class TestSingleFlight:
+    """Test request coalescing for concurrent cache misses."""
+
+    def test_do_runs_loader(self):
+        flight = SingleFlight()
+
+        assert flight.do("key", lambda: 42) == 42
+        assert flight.coalesced == 0
+        assert flight.inflight() == 0
+
+    def test_followers_share_leader_result(self):
+        import threading
+
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            release.wait(5)
+            return "value"
+
+        leader = threading.Thread(target=flight.do, args=("key", loader))
+        leader.start()
+        while flight.inflight() == 0:
+            release.wait(0.01)
+
+        future, is_leader = flight._join("key", loader)
+        release.set()
+        leader.join(5)
+
+        assert not is_leader
+        assert future.result(5) == "value"
+        assert calls == [1]
+        assert flight.coalesced == 1
+
+    def test_waiter_runs_queued_leader(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(threading.get_ident())
+            return "value"
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            # 唯一的工作线程被占用，领头任务只能排队
+            pool.submit(release.wait, 5)
+            future = flight.submit("key", loader, pool)
+            assert flight.do("key", loader) == "value"
+            release.set()
+
+        assert future.result(5) == "value"
+        assert calls == [threading.get_ident()]
+        assert flight.inflight() == 0
+
+    def test_cancelled_queued_call_is_skipped(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+
+        flight = SingleFlight()
+        release = threading.Event()
+        loader = mock.Mock(return_value="value")
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(release.wait, 5)
+            assert flight.submit("key", loader, pool).cancel()
+            release.set()
+
+        loader.assert_not_called()
+        assert flight.inflight() == 0
+
+    def test_exception_propagates_to_callers(self):
+        flight = SingleFlight()
+
+        def loader():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            flight.do("key", loader)
+        assert flight.inflight() == 0
+
+
+class TestFrameDisk:
+    """Test the Arrow/Feather serializer for cached DataFrames."""
+
+    def setup_method(self):
+        pytest.importorskip("pyarrow")
+        import diskcache
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = diskcache.Cache(self.temp_dir, disk=FrameDisk)
+
+    def teardown_method(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _frame(self):
+        import pandas as pd
+
+        df = pd.DataFrame(
+            {
+                "日期": pd.date_range("2024-01-01", periods=3).date,
+                "收盘": [1.0, 2.0, 3.0],
+                "最高": [1.5, 2.5, 3.5],
+                "名称": ["a", "b", "c"],
+            }
+        )
+        df.attrs["history_start"] = "20240101"
+        return df
+
+    def test_dataframe_stored_as_arrow_file(self):
+        df = self._frame()
+        self.store.set("k", df)
+
+        assert list(Path(self.temp_dir).rglob(f"*{FRAME_SUFFIX}"))
+        result = self.store.get("k")
+        assert result.equals(df)
+        assert result.attrs == {"history_start": "20240101"}
+
+    def test_non_frames_keep_pickle_path(self):
+        self.store.set("k", {"a": [1, 2]})
+
+        assert self.store.get("k") == {"a": [1, 2]}
+        assert not list(Path(self.temp_dir).rglob(f"*{FRAME_SUFFIX}"))
+
+    def test_unsupported_frame_falls_back_to_pickle(self):
+        import pandas as pd
+
+        df = pd.DataFrame({"mixed": [1, "a", 2.5]})
+        self.store.set("k", df)
+
+        assert self.store.get("k").equals(df)
+        assert not list(Path(self.temp_dir).rglob(f"*{FRAME_SUFFIX}"))
+
+    def test_cache_key_projects_columns_from_disk(self):
+        CacheKey.ALL = {}
+        cache = CacheKey.init("frame_key", ttl=60)
+        cache.cache2 = self.store
+        cache.set(self._frame())
+        cache.cache1.clear()
+
+        with mock.patch.object(cache_module, "read_frame", wraps=cache_module.read_frame) as read:
+            result = cache.get(columns=["收盘", "最高", "missing"])
+
+        assert list(result.columns) == ["收盘", "最高"]
+        assert result.attrs["history_start"] == "20240101"
+        assert read.call_args.args[1] == ["收盘", "最高", "missing"]
+        CacheKey.ALL = {}
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -38,6 +38,7 @@ class TestToolRegistration:
 
         expected_tools = [
             "search",
+            "search_candidates",
             "stock_info",
             "market_prices",
             "stock_news",
@@ -93,7 +94,13 @@ class TestToolRegistration:
         """Test portfolio-related tools."""
         tools = mcp._tool_manager._tools
 
-        expected_tools = ["portfolio_add", "portfolio_view"]
+        expected_tools = [
+            "portfolio_add",
+            "portfolio_view",
+            "portfolio_performance",
+            "portfolio_risk",
+            "portfolio_optimize",
+        ]
 
         for tool in expected_tools:
             assert tool in tools, f"Tool {tool} not registered"
@@ -106,6 +113,9 @@ class TestToolRegistration:
             "composite_stock_diagnostic",
             "draw_ascii_chart",
             "backtest_strategy",
+            "backtest_sweep",
+            "backtest_portfolio",
+            "backtest_walk_forward",
             "trading_suggest",
         ]
 
@@ -382,7 +392,8 @@ class TestFunctionToolCallability:
         assert callable(fn)
         source = inspect.getsource(fn)
 
-        assert "market_prices.fn" in source, "draw_ascii_chart should use market_prices.fn"
+        assert "load_market_prices(" in source, "draw_ascii_chart should use the typed price loader"
+        assert "read_csv" not in source, "draw_ascii_chart should not parse tool CSV"
         assert "cast(Callable" not in source, "Should not use cast(Callable...) pattern"
 
     def test_backtest_strategy_uses_fn_attribute(self):
@@ -395,7 +406,8 @@ class TestFunctionToolCallability:
         assert callable(fn)
         source = inspect.getsource(fn)
 
-        assert "market_prices.fn" in source, "backtest_strategy should use market_prices.fn"
+        assert "load_market_prices(" in source, "backtest_strategy should use the typed price loader"
+        assert "read_csv" not in source, "backtest_strategy should not parse tool CSV"
         assert "cast(Callable" not in source, "Should not use cast(Callable...) pattern"
 
     def test_crypto_composite_uses_fn_attribute(self):
@@ -434,7 +446,8 @@ class TestFunctionToolCallability:
         assert callable(fn)
         source = inspect.getsource(fn)
 
-        assert "crypto_prices.fn" in source, "draw_crypto_chart should use crypto_prices.fn"
+        assert "load_crypto_prices(" in source, "draw_crypto_chart should use the typed price loader"
+        assert "read_csv" not in source, "draw_crypto_chart should not parse tool CSV"
         assert "cast(Callable" not in source, "Should not use cast(Callable...) pattern"
 
     def test_backtest_crypto_uses_fn_attribute(self):
@@ -447,7 +460,8 @@ class TestFunctionToolCallability:
         assert callable(fn)
         source = inspect.getsource(fn)
 
-        assert "crypto_prices.fn" in source, "backtest_crypto_strategy should use crypto_prices.fn"
+        assert "load_crypto_prices(" in source, "backtest_crypto_strategy should use the typed price loader"
+        assert "read_csv" not in source, "backtest_crypto_strategy should not parse tool CSV"
         assert "cast(Callable" not in source, "Should not use cast(Callable...) pattern"
 
     def test_portfolio_view_uses_fn_attribute(self):
@@ -460,7 +474,9 @@ class TestFunctionToolCallability:
         assert callable(fn)
         source = inspect.getsource(fn)
 
-        assert "market_prices.fn" in source, "portfolio_view should use market_prices.fn"
+        assert "_reprice(" in source, "portfolio_view should use the batched quote pass"
+        assert "load_quotes(" in inspect.getsource(portfolio._reprice)
+        assert "read_csv" not in source, "portfolio_view should not parse tool CSV"
 
     def test_portfolio_chart_uses_fn_attribute(self):
         """Verify portfolio_chart uses .fn attribute."""
@@ -472,7 +488,9 @@ class TestFunctionToolCallability:
         assert callable(fn)
         source = inspect.getsource(fn)
 
-        assert "market_prices.fn" in source, "portfolio_chart should use market_prices.fn"
+        assert "_reprice(" in source, "portfolio_chart should use the batched quote pass"
+        assert "load_quotes(" in inspect.getsource(portfolio._reprice)
+        assert "read_csv" not in source, "portfolio_chart should not parse tool CSV"
 
 
 if __name__ == "__main__":
@@ -0,0 +1,162 @@
+"""Tests for the range-aware bar history store."""
+
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+from mcp_aktools.cache import CacheKey, is_stale
+from mcp_aktools.shared.history import HISTORY_START, HISTORY_VERSION, history_version, load_history
+
+
+def make_fetcher(calls, fail=False, offset=0):
+    bars = pd.DataFrame(
+        {
+            "日期": pd.date_range("2024-01-01", "2024-03-31").date,
+            "开盘": range(offset, offset + 91),
+            "收盘": range(offset, offset + 91),
+        }
+    )
+
+    def fetch(symbol, start_date, end_date="22220101"):
+        calls.append((start_date, end_date))
+        if fail:
+            raise Exception("API Error")
+        dates = pd.to_datetime(bars["日期"])
+        mask = (dates >= pd.Timestamp(start_date)) & (dates <= pd.Timestamp(end_date))
+        return bars.loc[mask].reset_index(drop=True)
+
+    return fetch
+
+
+class TestLoadHistory:
+    def setup_method(self):
+        self.key = f"test-{id(self)}"
+
+    def teardown_method(self):
+        cache = CacheKey.ALL.pop(f"history-{self.key}", None)
+        if cache is not None:
+            cache.delete()
+
+    def test_narrower_request_is_served_by_slicing(self):
+        calls = []
+        fetch = make_fetcher(calls)
+
+        wide = load_history(fetch, self.key, "20240201", symbol="X")
+        narrow = load_history(fetch, self.key, "20240301", symbol="X")
+
+        assert calls == [("20240201", "22220101")]
+        assert len(wide) == 60
+        assert len(narrow) == 31
+        assert str(narrow["日期"].iloc[0]) == "2024-03-01"
+
+    def test_wider_request_fetches_only_missing_head(self):
+        calls = []
+        fetch = make_fetcher(calls)
+
+        load_history(fetch, self.key, "20240301", symbol="X")
+        wide = load_history(fetch, self.key, "20240115", symbol="X")
+
+        assert calls == [("20240301", "22220101"), ("20240115", "20240229")]
+        assert len(wide) == 77
+        assert wide["日期"].is_monotonic_increasing
+        assert wide.attrs[HISTORY_START] == "20240115"
+
+    def test_unranged_source_refetches_widest_range(self):
+        calls = []
+        fetch = make_fetcher(calls)
+
+        load_history(fetch, self.key, "20240301", ranged=False, symbol="X")
+        load_history(fetch, self.key, "20240115", ranged=False, symbol="X")
+
+        assert calls == [("20240301", "22220101"), ("20240115", "22220101")]
+
+    def test_upstream_error_serves_stale_history(self):
+        calls = []
+        load_history(make_fetcher(calls), self.key, "20240301", symbol="X")
+        cache = CacheKey.ALL[f"history-{self.key}"]
+        stored = cache.get()
+
+        with mock.patch.object(CacheKey, "lookup", return_value=(stored, "expired")):
+            result = load_history(make_fetcher(calls, fail=True), self.key, "20240310", symbol="X")
+
+        assert is_stale(result)
+        assert len(result) == 22
+
+    def test_expired_ranged_history_appends_tail_only(self):
+        calls = []
+        load_history(make_fetcher(calls), self.key, "20240301", symbol="X")
+        stored = CacheKey.ALL[f"history-{self.key}"].get().iloc[:-5]
+
+        with mock.patch.object(CacheKey, "lookup", return_value=(stored, "expired")):
+            result = load_history(make_fetcher(calls), self.key, "20240301", symbol="X")
+
+        assert calls[-1] == ("20240325", "22220101")
+        assert len(result) == 31
+        assert result["日期"].is_unique
+        assert result.attrs[HISTORY_START] == "20240301"
+
+    def test_revised_history_triggers_full_refetch(self):
+        calls = []
+        load_history(make_fetcher(calls), self.key, "20240301", symbol="X")
+        stored = CacheKey.ALL[f"history-{self.key}"].get().iloc[:-5]
+
+        with mock.patch.object(CacheKey, "lookup", return_value=(stored, "expired")):
+            result = load_history(make_fetcher(calls, offset=100), self.key, "20240301", symbol="X")
+
+        assert calls[-2:] == [("20240325", "22220101"), ("20240301", "22220101")]
+        assert result["收盘"].iloc[0] == 160
+
+    def test_columns_projected(self):
+        calls = []
+        fetch = make_fetcher(calls)
+
+        fetched = load_history(fetch, self.key, "20240301", columns=["收盘"], symbol="X")
+        with mock.patch.object(CacheKey, "lookup", autospec=True, side_effect=CacheKey.lookup) as lookup:
+            served = load_history(fetch, self.key, "20240310", columns=["收盘"], symbol="X")
+
+        assert len(calls) == 1
+        assert lookup.call_args.args[1] == ["日期", "收盘"]
+        assert list(fetched.columns) == list(served.columns) == ["日期", "收盘"]
+        assert len(served) == 22
+
+    def test_version_tracks_content(self):
+        calls = []
+        first = load_history(make_fetcher(calls), self.key, "20240301", symbol="X")
+        version = first.attrs[HISTORY_VERSION]
+        assert version.startswith("31-2024-03-31-")
+        assert history_version(self.key, "20240301") == version
+        assert history_version(self.key, "20240310") != version
+        # 未覆盖的区间需要拉取，不给出版本
+        assert history_version(self.key, "20240201") is None
+
+        stored = CacheKey.ALL[f"history-{self.key}"].get().iloc[:-5]
+        with mock.patch.object(CacheKey, "lookup", return_value=(stored, "expired")):
+            assert history_version(self.key, "20240310") is None
+            revised = load_history(make_fetcher(calls, offset=100), self.key, "20240301", symbol="X")
+        assert revised.attrs[HISTORY_VERSION] != version
+        assert history_version(self.key, "20240301") == revised.attrs[HISTORY_VERSION]
+
+    def test_version_scoped_to_window(self):
+        calls = []
+        fetch = make_fetcher(calls)
+        stored = load_history(fetch, self.key, "20240301", symbol="X").iloc[:-5]
+        stored.attrs = {HISTORY_START: "20240301"}
+        with mock.patch.object(CacheKey, "lookup", return_value=(stored, "fresh")):
+            before = history_version(self.key, "20240310")
+        # 追加新 K 线后窗口变化
+        with mock.patch.object(CacheKey, "lookup", return_value=(stored, "expired")):
+            appended = load_history(fetch, self.key, "20240301", symbol="X")
+        assert calls[-1] == ("20240325", "22220101")
+        assert history_version(self.key, "20240310") not in (None, before)
+        assert history_version(self.key, "20240301") == appended.attrs[HISTORY_VERSION]
+
+        # 向前扩展存储区间不影响已有窗口的版本
+        window = history_version(self.key, "20240310")
+        load_history(fetch, self.key, "20240115", symbol="X")
+        assert calls[-1] == ("20240115", "20240229")
+        assert history_version(self.key, "20240310") == window
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
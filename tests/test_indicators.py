@@ -0,0 +1,226 @@
+"""Parity tests for the incremental technical indicator engine."""
+
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mcp_aktools.shared import indicators, kernels
+from mcp_aktools.shared.indicators import (
+    COLUMNS,
+    IndicatorState,
+    add_technical_indicators,
+    compute_pandas,
+    select_indicators,
+)
+
+
+def bars(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 10 + rng.standard_normal(n).cumsum() * 0.1
+    low = close - rng.random(n) * 0.2
+    high = close + rng.random(n) * 0.2
+    # 停牌/一字板: 价格不变且最高等于最低
+    close[100:130] = low[100:130] = high[100:130] = close[100]
+    close[200] = np.nan
+    low[201] = high[202] = np.nan
+    # pandas 的 ewm/rolling 将 ±inf 视为缺失值
+    high[250] = close[260] = np.inf
+    return pd.DataFrame(
+        {
+            "时间": pd.date_range("2025-01-01", periods=n, freq="min"),
+            "收盘": close,
+            "最低": low,
+            "最高": high,
+        }
+    )
+
+
+def reference(df):
+    return compute_pandas(df["收盘"], df["最低"], df["最高"])
+
+
+def incremental(df, key="test"):
+    out = df.reset_index(drop=True).copy()
+    add_technical_indicators(out, out["收盘"], out["最低"], out["最高"], key=key, times=out["时间"])
+    return out
+
+
+def assert_parity(result, expected):
+    for col in COLUMNS:
+        np.testing.assert_allclose(result[col].to_numpy(), expected[col].to_numpy(), rtol=1e-9, atol=1e-9)
+
+
+class TestKernels:
+    @pytest.mark.parametrize("alpha", [2 / 13, 2 / 27, 1 / 3])
+    @pytest.mark.parametrize(
+        "holes",
+        [[], [0, 1, 2], [50, 51, 300], list(range(0, 400, 3))],
+        ids=["dense", "leading", "gaps", "sparse"],
+    )
+    def test_ewm_matches_pandas(self, alpha, holes):
+        x = 10 + np.random.default_rng(0).standard_normal(400).cumsum()
+        x[holes] = np.nan
+        expected = pd.Series(x).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+        np.testing.assert_allclose(kernels.ewm_mean(x, alpha), expected, rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(kernels._ewm_loop(x, alpha, np.empty(400)), expected, rtol=1e-12)
+
+    def test_ewm_non_finite_input(self):
+        x = np.array([1.0, np.inf, 2.0, np.nan, -np.inf, 3.0])
+        expected = pd.Series(x).ewm(alpha=1 / 3, adjust=False).mean().to_numpy()
+        np.testing.assert_allclose(kernels.ewm_mean(x, 1 / 3), expected, rtol=1e-12)
+
+    @pytest.mark.parametrize("n", [1, 5, 25, 10_000])
+    def test_block_matches_pandas(self, n):
+        df = bars(max(n, 400)).iloc[:n]
+        block, _ = kernels.indicator_block(df["收盘"], df["最低"], df["最高"])
+        assert block.shape == (n, len(COLUMNS))
+        assert_parity(pd.DataFrame(block, columns=COLUMNS), reference(df))
+
+    def test_writes_all_columns(self):
+        df = bars()
+        add_technical_indicators(df, df["收盘"], df["最低"], df["最高"])
+        assert_parity(df, reference(df))
+
+
+class TestIndicatorSelection:
+    def setup_method(self):
+        indicators._STATES.clear()
+
+    @pytest.mark.parametrize(
+        ("spec", "expected"),
+        [
+            ("all", COLUMNS),
+            ("", COLUMNS),
+            ("none", []),
+            ("macd, rsi", ["DIF", "DEA", "MACD", "RSI"]),
+            ("RSI，kdj_k", ["KDJ.K", "RSI"]),
+            ("boll_u", ["BOLL.U"]),
+        ],
+    )
+    def test_select(self, spec, expected):
+        assert select_indicators(spec) == expected
+
+    def test_unknown_name(self):
+        with pytest.raises(ValueError, match="unknown indicator: foo"):
+            select_indicators("macd,foo")
+
+    def test_subset_only_computes_dependencies(self):
+        df = bars()
+        block, values = kernels.indicator_block(df["收盘"], df["最低"], df["最高"], ["RSI"])
+        assert block.shape == (len(df), 1)
+        assert "ema12" not in values and "rsv" not in values and "BOLL.M" not in values
+        np.testing.assert_allclose(block[:, 0], reference(df)["RSI"].to_numpy(), rtol=1e-9, atol=1e-9)
+
+    @pytest.mark.parametrize("key", [None, "test"])
+    def test_writes_only_selected_columns(self, key):
+        df = bars()
+        columns = select_indicators("kdj")
+        add_technical_indicators(df, df["收盘"], df["最低"], df["最高"], key=key, times=df["时间"], columns=columns)
+        assert [col for col in COLUMNS if col in df.columns] == columns
+        for col in columns:
+            np.testing.assert_allclose(df[col].to_numpy(), reference(df)[col].to_numpy(), rtol=1e-9, atol=1e-9)
+
+    def test_none_writes_nothing(self):
+        df = bars()
+        add_technical_indicators(df, df["收盘"], df["最低"], df["最高"], columns=[])
+        assert list(df.columns) == ["时间", "收盘", "最低", "最高"]
+
+
+class TestIncrementalIndicators:
+    def setup_method(self):
+        indicators._STATES.clear()
+
+    def teardown_method(self):
+        indicators._STATES.clear()
+
+    @pytest.mark.parametrize("step", [1, 5, 37])
+    def test_appended_bars_match_full_recompute(self, step):
+        df = bars()
+        for end in [*range(30, len(df), step), len(df)]:
+            result = incremental(df.iloc[:end])
+        assert_parity(result, reference(df))
+
+    def test_revised_last_bar_recomputed(self):
+        df = bars()
+        incremental(df.iloc[:300])
+        revised = df.iloc[:300].copy()
+        revised.loc[299, ["收盘", "最高"]] = [revised.loc[299, "收盘"] + 1, revised.loc[299, "收盘"] + 1.1]
+        assert_parity(incremental(revised), reference(revised))
+
+    def test_sliding_window_steps_only_new_bar(self):
+        df = bars()
+        incremental(df.iloc[:300])
+        # 固定数量的最新 K 线 (如 OKX) 向前滑动一根: 只计算新的一根
+        window = df.iloc[1:301].reset_index(drop=True)
+        with mock.patch.object(IndicatorState, "step", autospec=True, side_effect=IndicatorState.step) as step:
+            result = incremental(window)
+        assert step.call_count == 1
+        # 结果从已保存历史的首根 K 线起算
+        assert_parity(result, reference(df.iloc[:301]).iloc[1:].reset_index(drop=True))
+
+    def test_window_inside_history_is_sliced(self):
+        df = bars()
+        incremental(df)
+        window = df.iloc[-30:].reset_index(drop=True)
+        with mock.patch.object(IndicatorState, "step", autospec=True, side_effect=IndicatorState.step) as step:
+            result = incremental(window)
+        assert step.call_count == 0
+        assert_parity(result, reference(df).iloc[-30:].reset_index(drop=True))
+
+    def test_window_before_history_recomputed(self):
+        df = bars()
+        incremental(df.iloc[100:])
+        assert_parity(incremental(df), reference(df))
+
+    def test_only_new_bars_stepped(self):
+        df = bars()
+        incremental(df.iloc[:390])
+        with mock.patch.object(IndicatorState, "step", autospec=True, side_effect=IndicatorState.step) as step:
+            incremental(df)
+        # 上次的最后一根未变化，只计算 10 根新 K 线
+        assert step.call_count == 10
+
+    def test_history_bounded(self):
+        df = bars()
+        with mock.patch.object(indicators, "MAX_STATE_BARS", 120):
+            for end in range(100, len(df)):
+                result = incremental(df.iloc[end - 100 : end + 1])
+        assert len(indicators._STATES["test"].times) == 120
+        assert_parity(result, reference(df).iloc[-101:].reset_index(drop=True))
+
+    def test_subset_cold_start_skips_state(self):
+        df = bars()
+        columns = select_indicators("rsi")
+        with mock.patch.object(indicators, "indicator_block", wraps=kernels.indicator_block) as block:
+            add_technical_indicators(
+                df, df["收盘"], df["最低"], df["最高"], key="test", times=df["时间"], columns=columns
+            )
+        assert block.call_args.args[3] == columns
+        assert "test" not in indicators._STATES
+        np.testing.assert_allclose(df["RSI"].to_numpy(), reference(df)["RSI"].to_numpy(), rtol=1e-9, atol=1e-9)
+
+    def test_rewritten_history_recomputed(self):
+        df = bars()
+        incremental(df)
+        adjusted = df.copy()
+        adjusted[["收盘", "最低", "最高"]] *= 0.9
+        assert_parity(incremental(adjusted), reference(adjusted))
+
+    def test_unordered_times_use_full_recompute(self):
+        df = bars().iloc[::-1].reset_index(drop=True)
+        result = incremental(df)
+        assert_parity(result, reference(df))
+        assert "test" not in indicators._STATES
+
+    def test_keys_are_independent(self):
+        a, b = bars(seed=1), bars(seed=2)
+        incremental(a, key="a")
+        incremental(b, key="b")
+        assert_parity(incremental(a, key="a"), reference(a))
+        assert_parity(incremental(b, key="b"), reference(b))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,98 @@
+"""Tests for the SQLite portfolio store."""
+
+import json
+import sqlite3
+import threading
+
+import pytest
+
+from mcp_aktools.shared.ledger import Ledger
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    store = Ledger(str(tmp_path / "portfolio.db"))
+    yield store
+    store.close()
+
+
+class TestLedger:
+    def test_wal_and_index(self, ledger):
+        conn = sqlite3.connect(ledger.path)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM trades WHERE market = 'sh' AND symbol = 'x'").fetchall()
+        assert "trades_holding" in str(plan)
+
+    def test_journal_and_positions(self, ledger):
+        ledger.add_trade("000001", "sh", 10.0, 100, "2025-01-02T10:00:00")
+        ledger.add_trade("AAPL", "us", 200.0, 5, "2025-01-03T10:00:00")
+        ledger.add_trade("000001", "sh", 13.0, 200, "2025-01-04T10:00:00")
+
+        trades = ledger.trades()
+        assert trades["id"].tolist() == [1, 2, 3]
+        assert ledger.trades("000001", "sh")["price"].tolist() == [10.0, 13.0]
+        positions = ledger.positions()
+        assert list(positions) == ["000001.sh", "AAPL.us"]
+        assert positions["000001.sh"] == {
+            "symbol": "000001",
+            "price": pytest.approx(12.0),
+            "volume": 300.0,
+            "market": "sh",
+            "lots": 2,
+            "time": "2025-01-04T10:00:00",
+        }
+
+    def test_concurrent_writers_lose_nothing(self, ledger):
+        def write(n):
+            for i in range(50):
+                ledger.add_trade(f"{n:06d}", "sz", 1.0 + i, 10)
+
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        # 写入进行中读取不阻塞
+        ledger.positions()
+        for thread in threads:
+            thread.join()
+        assert len(ledger.trades()) == 400
+        assert all(p["lots"] == 50 for p in ledger.positions().values())
+
+    def test_separate_stores_share_the_file(self, ledger):
+        other = Ledger(ledger.path)
+        other.add_trade("00700", "hk", 380.0, 100)
+        assert "00700.hk" in ledger.positions()
+        other.close()
+
+
+class TestMigration:
+    def test_imports_legacy_json_once(self, tmp_path):
+        legacy = tmp_path / "portfolio.json"
+        holdings = {
+            "000001.sh": {"symbol": "000001", "price": 10.5, "volume": 100, "market": "sh", "time": "2025-01-02"},
+            "BTC.crypto": {"symbol": "BTC", "price": 90000, "volume": 0.5, "market": "crypto"},
+            "broken": {"symbol": "X"},
+        }
+        legacy.write_text(json.dumps(holdings))
+        path = str(tmp_path / "portfolio.db")
+
+        first = Ledger(path, legacy=str(legacy))
+        assert list(first.positions()) == ["000001.sh", "BTC.crypto"]
+        first.close()
+        # 再次打开不重复导入，JSON 文件保留
+        second = Ledger(path, legacy=str(legacy))
+        assert len(second.trades()) == 2
+        assert legacy.exists()
+        second.close()
+
+    def test_missing_legacy_file(self, tmp_path):
+        store = Ledger(str(tmp_path / "portfolio.db"), legacy=str(tmp_path / "portfolio.json"))
+        assert store.positions() == {}
+        (tmp_path / "portfolio.json").write_text(
+            json.dumps({"a": {"symbol": "a", "market": "sh", "price": 1, "volume": 1}})
+        )
+        store.close()
+        assert Ledger(str(tmp_path / "portfolio.db"), legacy=str(tmp_path / "portfolio.json")).positions() == {}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,119 @@
+"""Tests for the long-only portfolio optimizers."""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mcp_aktools.shared.optimize import (
+    Moments,
+    allocate,
+    describe,
+    estimate_moments,
+    max_sharpe,
+    min_variance,
+    project_simplex,
+    risk_parity,
+)
+from mcp_aktools.shared.performance import TRADING_DAYS
+
+
+def covariance(n=6, seed=0):
+    rng = np.random.default_rng(seed)
+    loadings = rng.standard_normal((n, 2)) * 0.1
+    return loadings @ loadings.T + np.diag(0.02 + rng.random(n) * 0.05)
+
+
+class TestProjection:
+    def test_simplex(self):
+        np.testing.assert_allclose(project_simplex(np.array([0.2, 0.3, 0.5])), [0.2, 0.3, 0.5])
+        np.testing.assert_allclose(project_simplex(np.array([2.0, 0.0, -1.0])), [1, 0, 0])
+        np.testing.assert_allclose(project_simplex(np.array([0.5, 0.5, 0.5])), [1 / 3] * 3)
+
+
+class TestSolvers:
+    def test_min_variance_interior_matches_closed_form(self):
+        cov = np.diag([0.04, 0.09, 0.16])
+        expected = np.linalg.solve(cov, np.ones(3))
+        np.testing.assert_allclose(min_variance(cov), expected / expected.sum(), atol=1e-8)
+
+    def test_min_variance_long_only(self):
+        cov = covariance()
+        w = min_variance(cov)
+        assert w.min() >= 0 and w.sum() == pytest.approx(1)
+        # KKT: 持仓标的的边际方差相等，未持仓标的不低于它
+        marginal = cov @ w
+        held = w > 1e-8
+        assert np.ptp(marginal[held]) < 1e-8
+        assert (marginal[~held] >= marginal[held].mean() - 1e-8).all()
+        rng = np.random.default_rng(1)
+        assert w @ cov @ w <= min(x @ cov @ x for x in rng.dirichlet(np.ones(6), 2000))
+
+    def test_max_sharpe_matches_tangency(self):
+        cov = covariance()
+        mean = cov @ np.array([1.0, 2.0, 1.0, 3.0, 0.5, 1.0])
+        tangency = np.linalg.solve(cov, mean)
+        np.testing.assert_allclose(max_sharpe(mean, cov), tangency / tangency.sum(), atol=1e-6)
+
+    def test_max_sharpe_drops_losers(self):
+        cov = covariance()
+        mean = np.array([0.1, 0.08, -0.2, 0.12, -0.05, 0.06])
+        w = max_sharpe(mean, cov, risk_free=0.02)
+        assert w[2] == 0 and w[4] == 0
+        sharpe = (mean @ w - 0.02) / np.sqrt(w @ cov @ w)
+        rng = np.random.default_rng(2)
+        assert sharpe >= max((mean @ x - 0.02) / np.sqrt(x @ cov @ x) for x in rng.dirichlet(np.ones(6), 5000))
+
+    def test_max_sharpe_edge_cases(self):
+        cov = np.diag([0.04, 0.0, 0.09])
+        np.testing.assert_array_equal(max_sharpe(np.array([0.1, 0.03, 0.2]), cov), [0, 1, 0])
+        with pytest.raises(ValueError, match="risk-free"):
+            max_sharpe(np.array([0.01, 0.02, 0.0]), cov, risk_free=0.03)
+
+    def test_max_sharpe_constant_price_holding(self):
+        # 价格不变的标的方差为 0，不产生除零警告
+        cov = np.diag([0.04, 0.0, 0.09])
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            w = max_sharpe(np.array([0.1, 0.0, 0.2]), cov, risk_free=0.02)
+        assert w[1] == 0 and w.sum() == pytest.approx(1)
+
+    def test_risk_parity_equalizes_contributions(self):
+        cov = covariance(20)
+        w = risk_parity(cov)
+        contribution = w * (cov @ w)
+        assert w.min() > 0 and w.sum() == pytest.approx(1)
+        assert np.ptp(contribution) / contribution.mean() < 1e-8
+        # 无相关时为波动率倒数加权
+        vol = np.array([0.1, 0.2, 0.4])
+        np.testing.assert_allclose(risk_parity(np.diag(vol**2)), (1 / vol) / (1 / vol).sum())
+
+    def test_allocate(self):
+        moments = Moments(["a", "b"], np.array([0.1, 0.2]), np.diag([0.04, 0.09]), 252)
+        np.testing.assert_allclose(allocate(moments, "risk_parity"), [0.6, 0.4])
+        summary = describe(moments, np.array([0.6, 0.4]))
+        assert summary["expected_return"] == pytest.approx(0.14)
+        assert summary["volatility"] == pytest.approx(np.sqrt(0.36 * 0.04 + 0.16 * 0.09))
+        with pytest.raises(ValueError, match="unknown objective"):
+            allocate(moments, "max_return")
+
+
+class TestMoments:
+    def test_estimate_and_subset(self):
+        rng = np.random.default_rng(0)
+        prices = 10 * np.exp(rng.standard_normal((120, 3)).cumsum(axis=0) * 0.01)
+        close = pd.DataFrame(prices, index=pd.bdate_range("2024-01-01", periods=120), columns=["a", "b", "c"])
+        moments = estimate_moments(close)
+        returns = close.pct_change().iloc[1:].to_numpy()
+        assert moments.days == 119
+        np.testing.assert_allclose(moments.cov, np.cov(returns, rowvar=False) * TRADING_DAYS)
+        subset = moments.subset(["c", "a"])
+        assert subset.names == ["c", "a"] and subset.cov[0, 1] == moments.cov[2, 0]
+        np.testing.assert_allclose(subset.mean, moments.mean[[2, 0]])
+        with pytest.raises(ValueError, match="common trading days"):
+            estimate_moments(close.iloc[:2])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
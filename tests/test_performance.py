@@ -0,0 +1,134 @@
+"""Tests for the portfolio equity curve."""
+
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mcp_aktools.shared.performance import TRADING_DAYS, performance
+
+
+def panel(days=60, holdings=3, seed=0):
+    rng = np.random.default_rng(seed)
+    prices = 10 * np.exp(rng.standard_normal((days, holdings)).cumsum(axis=0) * 0.01)
+    dates = pd.bdate_range("2024-01-01", periods=days)
+    return pd.DataFrame(prices, index=dates, columns=[f"{600000 + i}.sh" for i in range(holdings)])
+
+
+def journal(rows):
+    return pd.DataFrame(rows, columns=["holding", "date", "price", "volume"])
+
+
+def replay(close, trades):
+    # 逐日循环的参考实现: 当日买入计入收益基数
+    shares = dict.fromkeys(close.columns, 0.0)
+    value, returns = 0.0, []
+    when = pd.to_datetime(trades["date"], format="ISO8601").dt.normalize()
+    for date, row in close.iterrows():
+        flow = 0.0
+        for trade, day in zip(trades.itertuples(), when):
+            if day == date:
+                shares[trade.holding] += trade.volume
+                flow += trade.price * trade.volume
+        new = sum(shares[name] * row[name] for name in close.columns)
+        if value + flow > 0:
+            returns.append((new - value - flow) / (value + flow))
+        value = new
+    return np.array(returns)
+
+
+class TestPerformance:
+    def test_matches_daily_replay(self):
+        close = panel()
+        dates = close.index
+        trades = journal(
+            [
+                ("600000.sh", f"{dates[5].date()}T10:31:00", 9.8, 100),
+                ("600001.sh", str(dates[5].date()), 10.2, 50),
+                ("600000.sh", str(dates[20].date()), 11.0, 200),
+                ("600002.sh", f"{dates[33].date()}T14:00:00.123456", 9.5, 300),
+            ]
+        )
+        perf = performance(close, trades)
+        expected = replay(close, trades)
+        np.testing.assert_allclose(perf.result.returns, expected, rtol=1e-12)
+        assert perf.result.cumulative_return == pytest.approx(np.prod(1 + expected) - 1)
+        assert perf.result.bars == len(close) - 5
+        assert perf.volatility == pytest.approx(np.std(expected, ddof=1) * np.sqrt(TRADING_DAYS))
+        assert perf.sharpe == pytest.approx(expected.mean() / expected.std(ddof=1) * np.sqrt(TRADING_DAYS))
+        assert perf.invested[-1] == pytest.approx(980 + 510 + 2200 + 2850)
+        # 各持仓贡献之和等于组合日收益之和
+        assert perf.positions["contribution"].sum() == pytest.approx(expected.sum())
+
+    def test_adding_capital_is_not_performance(self):
+        close = pd.DataFrame({"a.sh": 10.0, "b.hk": 20.0}, index=pd.bdate_range("2024-01-01", periods=10))
+        trades = journal([("a.sh", "2024-01-01", 10.0, 100), ("b.hk", "2024-01-05", 20.0, 1000)])
+        perf = performance(close, trades)
+        assert np.all(perf.result.returns == 0)
+        assert perf.value[-1] == 21000 and perf.invested[0] == 1000
+
+    def test_positions(self):
+        close = panel(holdings=2)
+        dates = close.index
+        trades = journal(
+            [
+                ("600000.sh", str(dates[0].date()), 10.0, 100),
+                ("600000.sh", str(dates[10].date()), 13.0, 200),
+                ("600001.sh", str(dates[3].date()), 8.0, 10),
+                ("999999.sh", str(dates[3].date()), 8.0, 10),
+            ]
+        )
+        positions = performance(close, trades).positions
+        last = close.iloc[-1]
+        row = positions.loc["600000.sh"]
+        assert row["volume"] == 300 and row["cost"] == pytest.approx(12.0)
+        assert row["pnl"] == pytest.approx(300 * last["600000.sh"] - 3600)
+        assert row["return"] == pytest.approx(300 * last["600000.sh"] / 3600 - 1)
+        assert positions["weight"].sum() == pytest.approx(1)
+        assert "999999.sh" not in positions.index
+
+    def test_carried_in_at_first_close(self):
+        close = panel(holdings=1)
+        trades = journal([("600000.sh", "2020-06-01", 5.0, 100), ("600000.sh", "", 6.0, 100)])
+        perf = performance(close, trades)
+        first = close["600000.sh"].iloc[0]
+        # 窗口外买入不产生首日收益，盈亏仍按真实成本计算
+        assert perf.result.returns[0] == 0
+        assert perf.result.cumulative_return == pytest.approx(close["600000.sh"].iloc[-1] / first - 1)
+        assert perf.positions.loc["600000.sh", "pnl"] == pytest.approx(200 * close["600000.sh"].iloc[-1] - 1100)
+
+    def test_gaps_and_late_trades(self):
+        close = panel(holdings=2)
+        close.iloc[:5, 1] = np.nan
+        close.iloc[30:33, 0] = np.nan
+        trades = journal(
+            [
+                ("600000.sh", "2024-01-01", 10.0, 100),
+                ("600001.sh", "2024-01-01", 10.0, 100),
+                ("600000.sh", "2030-01-01", 1.0, 1),
+            ]
+        )
+        perf = performance(close, trades)
+        assert np.isfinite(perf.result.returns).all()
+        assert perf.positions.loc["600000.sh", "volume"] == 100
+
+    def test_hundreds_of_positions_fast(self):
+        close = panel(days=756, holdings=300)
+        rng = np.random.default_rng(1)
+        trades = journal(
+            {
+                "holding": close.columns[rng.integers(0, 300, 3000)],
+                "date": close.index[rng.integers(0, 756, 3000)].strftime("%Y-%m-%dT10:00:00"),
+                "price": 10.0,
+                "volume": 100.0,
+            }
+        )
+        start = time.perf_counter()
+        perf = performance(close, trades)
+        assert time.perf_counter() - start < 0.5
+        assert len(perf.positions) == 300
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,90 @@
+"""Tests for Monte Carlo VaR / expected shortfall."""
+
+from statistics import NormalDist
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mcp_aktools.shared import risk
+from mcp_aktools.shared.risk import check_options, estimate, return_panel, simulate_pnl, value_at_risk
+
+
+def returns(days=500, holdings=4, seed=0):
+    rng = np.random.default_rng(seed)
+    market = rng.standard_normal((days, 1)) * 0.01
+    return market + rng.standard_normal((days, holdings)) * 0.01
+
+
+class TestReturnPanel:
+    def test_holidays_and_listing(self):
+        close = pd.DataFrame(
+            {"a.sh": [10.0, 11.0, np.nan, 12.1, 12.1], "b.hk": [np.nan, 20.0, 22.0, 22.0, 11.0]},
+            index=pd.bdate_range("2024-01-01", periods=5),
+        )
+        # b 上市前的日期剔除，a 休市日收益为 0
+        np.testing.assert_allclose(return_panel(close), [[0, 0.1], [0.1, 0], [0, -0.5]])
+
+
+class TestSimulation:
+    @pytest.mark.parametrize("method", risk.METHODS)
+    def test_seeded_and_chunk_independent(self, method):
+        r, values = returns(), np.array([1e4, 2e4, 3e4, 4e4])
+        first = simulate_pnl(r, values, method, 5000, 5, seed=7)
+        np.testing.assert_array_equal(first, simulate_pnl(r, values, method, 5000, 5, seed=7))
+        with mock.patch.object(risk, "CHUNK_ELEMENTS", 333):
+            np.testing.assert_array_equal(first, simulate_pnl(r, values, method, 5000, 5, seed=7))
+        assert not np.array_equal(first, simulate_pnl(r, values, method, 5000, 5, seed=8))
+
+    def test_historical_one_day_is_empirical(self):
+        r, values = returns(), np.array([1e4, 2e4, 3e4, 4e4])
+        pnl = simulate_pnl(r, values, "historical", 100_000, 1, seed=0)
+        var, _ = value_at_risk(pnl, 0.95)
+        assert var == pytest.approx(-np.quantile(r @ values, 0.05), rel=0.05)
+
+    def test_parametric_matches_lognormal(self):
+        r = returns(days=2000, holdings=1)
+        result = estimate(r, np.array([1e4]), "parametric", 100_000, 10, 0.99, seed=0)
+        log = np.log1p(r[:, 0])
+        z = NormalDist().inv_cdf(0.01)
+        assert result.var == pytest.approx(
+            -1e4 * np.expm1(10 * log.mean() + z * np.sqrt(10) * log.std(ddof=1)), rel=0.02
+        )
+        assert result.es > result.var > 0
+
+    def test_parametric_keeps_correlation(self):
+        r = returns(holdings=1)
+        # 完全相关的两个持仓与合并后的单个持仓风险相同
+        pair = simulate_pnl(np.column_stack([r, r]), np.array([1e4, 1e4]), "parametric", 20_000, 5, seed=0)
+        single = simulate_pnl(r, np.array([2e4]), "parametric", 20_000, 5, seed=1)
+        assert value_at_risk(pair)[0] == pytest.approx(value_at_risk(single)[0], rel=0.03)
+
+    def test_singular_covariance(self):
+        r = returns(holdings=2)
+        r = np.column_stack([r, r[:, 0], np.zeros(len(r))])
+        pnl = simulate_pnl(r, np.ones(4), "parametric", 1000, 1, seed=0)
+        assert np.isfinite(pnl).all()
+
+    def test_value_at_risk(self):
+        pnl = np.arange(-50, 50, dtype=float)
+        var, es = value_at_risk(pnl, 0.9)
+        assert var == pytest.approx(40.1) and es == pytest.approx(45.5)
+
+    @pytest.mark.parametrize(
+        ("args", "message"),
+        [
+            (("bootstrap", 100, 1, 0.95), "unknown method"),
+            (("historical", 0, 1, 0.95), "paths"),
+            (("historical", 200_000, 1, 0.95), "paths"),
+            (("historical", 100, 0, 0.95), "horizon"),
+            (("historical", 100, 1, 95), "confidence"),
+        ],
+    )
+    def test_invalid_options(self, args, message):
+        with pytest.raises(ValueError, match=message):
+            check_options(*args)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
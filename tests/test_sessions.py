@@ -0,0 +1,95 @@
+"""Tests for trading-session aware cache TTLs."""
+
+import time
+from datetime import date, datetime, timedelta
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+import pytest
+
+from mcp_aktools.shared import sessions
+
+SHANGHAI = ZoneInfo("Asia/Shanghai")
+NEW_YORK = ZoneInfo("America/New_York")
+
+
+def calendar(holidays=()):
+    days = [date(2025, 1, 1) + timedelta(days=i) for i in range(31)]
+    days = frozenset(d for d in days if d.weekday() < 5 and d not in holidays)
+    return (time.monotonic(), days, max(days))
+
+
+@pytest.fixture
+def trade_calendar():
+    with mock.patch.object(sessions, "_calendar", calendar()):
+        yield
+
+
+@pytest.mark.usefixtures("trade_calendar")
+class TestMarketTtl:
+    def test_open_market_uses_short_ttl(self):
+        now = datetime(2025, 1, 7, 10, 0, tzinfo=SHANGHAI)
+        assert sessions.market_ttl("sh", 1200, now) == 1200
+
+    def test_open_ttl_capped_at_session_end(self):
+        now = datetime(2025, 1, 7, 11, 25, tzinfo=SHANGHAI)
+        assert sessions.market_ttl("a", 1200, now) == 5 * 60 + sessions.SETTLE_SECONDS
+
+    def test_closed_market_lasts_until_next_open(self):
+        now = datetime(2025, 1, 10, 16, 0, tzinfo=SHANGHAI)
+        expected = datetime(2025, 1, 13, 9, 15, tzinfo=SHANGHAI) - now
+        assert sessions.market_ttl("sz", 1200, now) == int(expected.total_seconds())
+
+    def test_closed_ttl_caps_end_of_day_data(self):
+        # 收盘后发布的数据在休市期间仍按上限刷新
+        now = datetime(2025, 1, 10, 15, 0, tzinfo=SHANGHAI)
+        assert sessions.market_ttl("a", 3600, now, closed_ttl=3600) == sessions.SETTLE_SECONDS
+        now = datetime(2025, 1, 10, 16, 0, tzinfo=SHANGHAI)
+        assert sessions.market_ttl("a", 3600, now, closed_ttl=3600) == 3600
+        now = datetime(2025, 1, 13, 9, 0, tzinfo=SHANGHAI)
+        assert sessions.market_ttl("a", 3600, now, closed_ttl=3600) == 15 * 60
+
+    def test_holiday_skipped_by_calendar(self):
+        now = datetime(2025, 1, 10, 16, 0, tzinfo=SHANGHAI)
+        with mock.patch.object(sessions, "_calendar", calendar(holidays={date(2025, 1, 13)})):
+            ttl = sessions.market_ttl("a", 1200, now)
+        assert now + timedelta(seconds=ttl) == datetime(2025, 1, 14, 9, 15, tzinfo=SHANGHAI)
+
+    def test_us_market_uses_new_york_time(self):
+        now = datetime(2025, 1, 11, 12, 0, tzinfo=NEW_YORK)
+        ttl = sessions.market_ttl("us", 3600, now)
+        assert now + timedelta(seconds=ttl) == datetime(2025, 1, 13, 9, 30, tzinfo=NEW_YORK)
+
+    def test_sge_night_session_crosses_midnight(self):
+        now = datetime(2025, 1, 8, 1, 0, tzinfo=SHANGHAI)
+        assert sessions.market_ttl("sge", 3600, now) == 3600
+
+    def test_crypto_always_open(self):
+        now = datetime(2025, 1, 11, 3, 0, tzinfo=SHANGHAI)
+        assert sessions.market_ttl("crypto", 300, now) == 300
+
+
+class TestTradingDays:
+    def test_cold_start_falls_back_to_weekdays(self):
+        with (
+            mock.patch.object(sessions, "_calendar", (None, frozenset(), None)),
+            mock.patch.object(sessions.inflight, "submit") as submit,
+        ):
+            assert sessions.is_trading_day("a", date(2025, 1, 13))
+            assert not sessions.is_trading_day("a", date(2025, 1, 11))
+        submit.assert_called()
+
+    def test_calendar_loaded_from_akshare(self):
+        dfs = pd.DataFrame({"trade_date": [date(2025, 1, 2), date(2025, 1, 3)]})
+        with (
+            mock.patch.object(sessions, "_calendar", (None, frozenset(), None)),
+            mock.patch.object(sessions, "ak_cache", return_value=dfs),
+        ):
+            sessions._load_calendar()
+            assert sessions._calendar[2] == date(2025, 1, 3)
+            assert not sessions.is_trading_day("a", date(2025, 1, 1))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -12,9 +12,11 @@ import pandas as pd
 
 from mcp_aktools.shared.utils import (
     ak_cache,
+    ak_cache_async,
+    inflight,
     recent_trade_date,
     load_portfolio,
-    save_portfolio,
+    portfolio_ledger,
     ak_search,
 )
 from mcp_aktools.shared.constants import PORTFOLIO_FILE
@@ -67,6 +69,8 @@ class TestAkCache:
         """Test that ak_cache returns cached value on second call."""
         df = pd.DataFrame({"col": [1, 2, 3]})
         mock_fun = mock.Mock(return_value=df)
+        # Drop entries persisted on disk by earlier runs, which may be stale
+        CacheKey.init("cache_test_key", ttl=60).delete()
 
         # First call should hit the function
         result1 = ak_cache(mock_fun, key="cache_test_key", ttl=60)
@@ -79,6 +83,119 @@ class TestAkCache:
         assert result2.equals(df)
         assert mock_fun.call_count == call_count  # No additional calls
 
+    def test_ak_cache_coalesces_concurrent_misses(self):
+        """Test that concurrent misses on one key share a single upstream call."""
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow_fun():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return pd.DataFrame({"col": [1]})
+
+        key = f"single_flight_sync_{id(self)}"
+        before = inflight.coalesced
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            futures = [pool.submit(ak_cache, slow_fun, key=key, ttl=60)]
+            started.wait(5)
+            futures += [pool.submit(ak_cache, slow_fun, key=key, ttl=60) for _ in range(4)]
+            while inflight.coalesced - before < 4:
+                threading.Event().wait(0.01)
+            release.set()
+            results = [f.result(5) for f in futures]
+
+        assert len(calls) == 1
+        assert all(r is results[0] for r in results)
+        CacheKey.ALL[key].delete()
+
+    def test_ak_cache_serves_stale_and_revalidates(self):
+        """Test that a stale entry is returned at once and refreshed in the background."""
+        import time
+
+        key = f"swr_{id(self)}"
+        old_df = pd.DataFrame({"col": [1]})
+        new_df = pd.DataFrame({"col": [2]})
+        cache = CacheKey.init(key, ttl=60)
+        cache.set(old_df)
+        mock_fun = mock.Mock(return_value=new_df)
+
+        with mock.patch.object(CacheKey, "lookup", side_effect=[(old_df, "stale"), (old_df, "stale")]):
+            result = ak_cache(mock_fun, key=key, ttl=60)
+            while inflight.inflight():
+                time.sleep(0.01)
+
+        assert result is old_df
+        assert mock_fun.call_count == 1
+        assert cache.get() is new_df
+        cache.delete()
+
+    def test_ak_cache_serves_stale_on_upstream_error(self):
+        """Test that an expired entry is served with a stale marker when upstream fails."""
+        from mcp_aktools.cache import is_stale
+
+        key = f"sie_{id(self)}"
+        old_df = pd.DataFrame({"col": [1]})
+        CacheKey.init(key, ttl=60).set(old_df)
+
+        def failing():
+            raise Exception("API Error")
+
+        with mock.patch.object(CacheKey, "lookup", return_value=(old_df, "expired")):
+            result = ak_cache(failing, key=key, ttl=60)
+
+        assert result.equals(old_df)
+        assert is_stale(result)
+        assert not is_stale(old_df)
+        CacheKey.ALL[key].delete()
+
+    @pytest.mark.asyncio
+    async def test_ak_cache_async_coalesces_concurrent_misses(self):
+        """Test that concurrent async misses on one key share a single upstream call."""
+        import asyncio
+        import time
+
+        calls = []
+
+        def slow_fun():
+            calls.append(1)
+            time.sleep(0.2)
+            return pd.DataFrame({"col": [1]})
+
+        key = f"single_flight_async_{id(self)}"
+        before = inflight.coalesced
+        results = await asyncio.gather(*[ak_cache_async(slow_fun, key=key, ttl=60) for _ in range(5)])
+
+        assert len(calls) == 1
+        assert inflight.coalesced - before == 4
+        assert all(r is results[0] for r in results)
+        CacheKey.ALL[key].delete()
+
+    @pytest.mark.asyncio
+    async def test_ak_cache_async_cancelled_waiter_keeps_others(self):
+        """Test that cancelling one coalesced caller does not cancel the shared load."""
+        import asyncio
+        import time
+
+        def slow_fun():
+            time.sleep(0.2)
+            return pd.DataFrame({"col": [1]})
+
+        key = f"single_flight_cancel_{id(self)}"
+        first = asyncio.create_task(ak_cache_async(slow_fun, key=key, ttl=60))
+        second = asyncio.create_task(ak_cache_async(slow_fun, key=key, ttl=60))
+        await asyncio.sleep(0.05)
+        first.cancel()
+
+        result = await second
+        assert first.cancelled()
+        assert result["col"].tolist() == [1]
+        CacheKey.ALL[key].delete()
+
 
 class TestRecentTradeDate:
     """Test the recent_trade_date function."""
@@ -121,46 +238,34 @@ class TestPortfolioOperations:
         with mock.patch("mcp_aktools.shared.utils.PORTFOLIO_FILE", str(self.temp_portfolio)):
             result = load_portfolio()
             assert result == {}
+            assert portfolio_ledger().path == str(Path(self.temp_dir) / "portfolio.db")
 
-    def test_save_and_load_portfolio(self):
-        """Test saving and then loading portfolio data."""
-        test_data = {
-            "000001.sh": {
-                "symbol": "000001",
-                "price": 10.5,
-                "volume": 100,
-                "market": "sh",
-                "time": datetime.now().isoformat(),
-            }
-        }
-
+    def test_add_and_load_portfolio(self):
+        """Test recording trades and then loading positions."""
         with mock.patch("mcp_aktools.shared.utils.PORTFOLIO_FILE", str(self.temp_portfolio)):
-            save_portfolio(test_data)
+            portfolio_ledger().add_trade("000001", "sh", 10.5, 100, datetime.now().isoformat())
             result = load_portfolio()
 
             assert result["000001.sh"]["symbol"] == "000001"
             assert result["000001.sh"]["price"] == 10.5
 
-    def test_save_portfolio_creates_directory(self):
-        """Test that save_portfolio creates directory if needed."""
-        from mcp_aktools.shared import constants
-        from mcp_aktools.shared import utils as utils_module
+    def test_legacy_json_imported_once(self):
+        """Test that an existing portfolio.json is migrated on first open."""
+        legacy = {"000001.sh": {"symbol": "000001", "price": 10.5, "volume": 100, "market": "sh", "time": ""}}
+        with open(self.temp_portfolio, "w") as f:
+            json.dump(legacy, f)
+
+        with mock.patch("mcp_aktools.shared.utils.PORTFOLIO_FILE", str(self.temp_portfolio)):
+            assert load_portfolio()["000001.sh"]["volume"] == 100
+            assert load_portfolio()["000001.sh"]["volume"] == 100
 
+    def test_ledger_creates_directory(self):
+        """Test that the portfolio database creates its directory if needed."""
         nested_dir = Path(self.temp_dir) / "nested" / "dir"
-        portfolio_file = nested_dir / "portfolio.json"
-
-        orig_file = utils_module.PORTFOLIO_FILE
-        orig_const = constants.PORTFOLIO_FILE
-        try:
-            utils_module.PORTFOLIO_FILE = str(portfolio_file)
-            constants.PORTFOLIO_FILE = str(portfolio_file)
-            save_portfolio({"test": "data"})
-            # Check that both directory and file exist
-            assert nested_dir.exists(), "Directory should be created"
-            assert portfolio_file.exists(), "Portfolio file should exist"
-        finally:
-            utils_module.PORTFOLIO_FILE = orig_file
-            constants.PORTFOLIO_FILE = orig_const
+
+        with mock.patch("mcp_aktools.shared.utils.PORTFOLIO_FILE", str(nested_dir / "portfolio.json")):
+            portfolio_ledger().add_trade("000001", "sh", 10.5, 100)
+        assert (nested_dir / "portfolio.db").exists(), "Portfolio database should exist"
 
 
 class TestAkSearch:
@@ -0,0 +1,169 @@
+"""Tests for parameter sweeps."""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mcp_aktools.shared import sweep as sweep_module
+from mcp_aktools.shared.backtest import STRATEGIES, Strategy, backtest_frame
+from mcp_aktools.shared.kernels import indicator_block
+from mcp_aktools.shared.normalize import PriceFrame
+from mcp_aktools.shared.sweep import combinations, parse_grid, rank, sweep
+from mcp_aktools.tools import analysis as analysis_module
+
+backtest_sweep_fn = analysis_module.backtest_sweep.fn
+
+
+def ohlc(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 10 + rng.standard_normal(n).cumsum() * 0.1
+    return close, close - rng.random(n) * 0.2, close + rng.random(n) * 0.2
+
+
+def indicator_frame(close, low, high):
+    names = {"DIF": "dif", "DEA": "dea", "KDJ.K": "kdj_k", "KDJ.D": "kdj_d", "RSI": "rsi"}
+    names.update({"BOLL.U": "boll_u", "BOLL.L": "boll_l"})
+    block, _ = indicator_block(close, low, high, list(names))
+    return pd.DataFrame(block, columns=list(names.values())).assign(close=close)
+
+
+class TestParseGrid:
+    def test_ranges_lists_and_defaults(self):
+        grid = parse_grid("RSI", "window=10:14:2; lower=20,25  upper=80")
+        assert grid == {"window": [10, 12, 14], "lower": [20.0, 25.0], "upper": [80.0]}
+        assert parse_grid("SMA", "") == {"short": [5], "long": [20]}
+        assert parse_grid("BOLL", "width=1.5:2.5:0.5")["width"] == [1.5, 2.0, 2.5]
+
+    @pytest.mark.parametrize(
+        ("strategy", "spec", "message"),
+        [
+            ("SMA", "fast=3", "unknown parameter: fast"),
+            ("SMA", "short", "unknown parameter"),
+            ("SMA", "short=a:b", "invalid values for short"),
+            ("SMA", "short=1:5:0", "invalid values for short"),
+            ("SMA", "short=2.5", "short must be positive integers"),
+            ("RSI", "window=0,14", "window must be positive integers"),
+        ],
+    )
+    def test_invalid(self, strategy, spec, message):
+        with pytest.raises(ValueError, match=message):
+            parse_grid(strategy, spec)
+
+    def test_invalid_combinations_dropped(self):
+        combos = combinations("SMA", parse_grid("SMA", "short=5:30:5 long=10,20"))
+        assert all(p["short"] < p["long"] for p in combos)
+        assert len(combos) == 1 + 3
+
+    def test_too_many_combinations(self):
+        with pytest.raises(ValueError, match="too many combinations"):
+            combinations("RSI", parse_grid("RSI", "window=2:100 lower=1:60 upper=61:99"))
+
+
+class TestSweep:
+    @pytest.mark.parametrize("strategy", ["SMA", "RSI", "MACD", "BOLL", "MA_CROSS", "KDJ"])
+    def test_defaults_match_backtest(self, strategy):
+        close, low, high = ohlc()
+        grid = parse_grid(strategy, "")
+        row = sweep(strategy, grid, close, low, high).iloc[0]
+        expected = backtest_frame(indicator_frame(close, low, high), STRATEGIES[strategy])
+        assert row["return"] == expected.cumulative_return
+        assert row["max_drawdown"] == expected.max_drawdown
+        assert row["win_rate"] == expected.win_rate
+
+    def test_window_computed_once(self):
+        close, low, high = ohlc()
+        grid = parse_grid("RSI", "window=10,14 lower=20:35 upper=65:80")
+        with mock.patch.object(sweep_module.kernels, "rolling_mean", wraps=sweep_module.kernels.rolling_mean) as mean:
+            results = sweep("RSI", grid, close, low, high)
+        assert len(results) == 2 * 16 * 16
+        # 每个窗口: 平均涨幅与平均跌幅各一次
+        assert mean.call_count == 2 * 2
+
+    def test_evaluates_last_bars_after_warmup(self):
+        close, low, high = ohlc()
+        grid = parse_grid("SMA", "short=3:6 long=20,30")
+        tail = sweep("SMA", grid, close, low, high, bars=200)
+        for _, row in tail.iterrows():
+            ma_s = pd.Series(close).rolling(int(row["short"])).mean().to_numpy()[-200:]
+            ma_l = pd.Series(close).rolling(int(row["long"])).mean().to_numpy()[-200:]
+            expected = backtest_frame(
+                pd.DataFrame({"close": close[-200:], "s": ma_s, "l": ma_l}),
+                Strategy("", "none", ("s", "l"), lambda v: (v["s"] > v["l"]).astype(float)),
+            )
+            assert row["return"] == expected.cumulative_return
+
+    def test_sharded_matches_inline(self):
+        close, low, high = ohlc()
+        grid = parse_grid("MACD", "fast=5:12 slow=20:30:5 signal=5,9")
+        inline = sweep("MACD", grid, close, low, high)
+        with (
+            ThreadPoolExecutor(3) as pool,
+            mock.patch.object(sweep_module, "POOL_WORKERS", 2),
+            mock.patch.object(pool, "submit", wraps=pool.submit) as submit,
+        ):
+            sharded = sweep("MACD", grid, close, low, high, executor=pool)
+        # 分片数按进程池大小划分，与传入的执行器无关
+        assert submit.call_count == 8
+        pd.testing.assert_frame_equal(inline, sharded)
+
+    def test_process_pool(self):
+        close, low, high = ohlc()
+        grid = parse_grid("BOLL", "window=10:30:5 width=1.5,2,2.5")
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(2, mp_context=ctx) as pool:
+            pooled = sweep("BOLL", grid, close, low, high, executor=pool)
+        pd.testing.assert_frame_equal(pooled, sweep("BOLL", grid, close, low, high))
+
+    def test_rank(self):
+        results = pd.DataFrame(
+            {
+                "short": [3, 4, 5],
+                "return": [0.1, 0.3, 0.3],
+                "max_drawdown": [-0.05, -0.2, -0.1],
+                "win_rate": [0.6, 0.5, None],
+            }
+        )
+        assert rank(results)["short"].tolist() == [5, 4, 3]
+        assert rank(results, "drawdown")["short"].tolist() == [3, 5, 4]
+        assert rank(results, "win_rate")["short"].tolist() == [3, 4, 5]
+        with pytest.raises(ValueError, match="unknown sort key"):
+            rank(results, "sharpe")
+
+
+class TestBacktestSweepTool:
+    def frame(self, n=300):
+        close, low, high = ohlc(n)
+        data = pd.DataFrame({"date": pd.date_range("2024-01-01", periods=n), "close": close, "low": low, "high": high})
+        return PriceFrame(data, source="akshare", currency="CNY")
+
+    def test_ranked_table(self):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=self.frame()) as load:
+            result = backtest_sweep_fn("000001", "sh", "SMA", "short=3:8 long=20:40:10", 200, "return", 5)
+        # 预热: 最长的两个窗口
+        assert load.call_args.kwargs["limit"] == 200 + 8 + 40
+        lines = result.splitlines()
+        assert "18 组" in lines[0] and "样本 200" in lines[0]
+        assert lines[1] == "short,long,return,max_drawdown,win_rate,trades"
+        returns = [float(line.split(",")[2]) for line in lines[2:]]
+        assert len(returns) == 5 and returns == sorted(returns, reverse=True)
+
+    def test_invalid_params(self):
+        with mock.patch.object(analysis_module, "load_market_prices") as load:
+            result = backtest_sweep_fn("000001", "sh", "RSI", "period=5", 200, "return", 5)
+            assert result.startswith("error,") and "unknown parameter: period" in result
+            assert backtest_sweep_fn("000001", "sh", "RSI", "", 200, "sharpe", 5).startswith("error,")
+            assert "不支持" in backtest_sweep_fn("000001", "sh", "FOO", "", 200, "return", 5)
+        load.assert_not_called()
+
+    def test_not_found(self):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=None):
+            result = backtest_sweep_fn("000001", "sh", "SMA", "", 200, "return", 5)
+        assert "未找到" in result
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,228 @@
+"""Tests for the indexed symbol resolver."""
+
+import asyncio
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+from mcp_aktools.cache import CacheKey
+from mcp_aktools.shared import symbols
+from mcp_aktools.shared.symbols import SearchEngine, SymbolIndex, find_symbol, search_engine, symbol_index
+from mcp_aktools.shared.utils import ak_search, ak_search_async, ak_search_ranked
+
+
+def listing():
+    return pd.DataFrame(
+        {
+            "code": ["600519", "000001", "601318", "000002", "600036"],
+            "name": ["贵州茅台", "平安银行", "中国平安", "万科A", "招商银行"],
+        }
+    )
+
+
+def scan(df, symbol=None, keyword=None):
+    """Reference implementation: the previous iterrows matching rules."""
+    for _, v in df.iterrows():
+        code, name = str(v["code"]).upper(), str(v["name"]).upper()
+        if symbol and symbol.upper() == code:
+            return v
+        if keyword and keyword.upper() in [code, name]:
+            return v
+    if keyword:
+        for _, v in df.iterrows():
+            name = str(v["name"])
+            if len(keyword) >= 4 and keyword in name:
+                return v
+            if name.startswith(keyword):
+                return v
+    return None
+
+
+class TestSymbolIndex:
+    def setup_method(self):
+        symbols._INDEXES.clear()
+
+    def teardown_method(self):
+        for key in list(CacheKey.ALL):
+            if key.startswith("symbol-index-"):
+                CacheKey.ALL.pop(key).delete()
+        symbols._INDEXES.clear()
+
+    @pytest.mark.parametrize(
+        "symbol, keyword",
+        [
+            ("600519", None),
+            (None, "000002"),
+            (None, "万科a"),
+            (None, "平安"),
+            (None, "招商银行"),
+            (None, "国平安"),
+            (None, "银行"),
+            (None, "不存在"),
+        ],
+    )
+    def test_matches_iterrows_scan(self, symbol, keyword):
+        df = listing()
+        expected = scan(df, symbol, keyword)
+        result = find_symbol(df, "test", "code", "name", symbol, keyword)
+
+        if expected is None:
+            assert result is None
+        else:
+            assert result.name == expected.name
+
+    def test_substring_requires_four_chars(self):
+        df = pd.DataFrame({"code": ["1", "2"], "name": ["ABCDEFG", "XBCD"]})
+        index = SymbolIndex.build(df, "code", "name")
+
+        assert index.match("BCD") is None
+        assert index.match("BCDE") == 0
+        assert index.match("XB") == 1
+
+    def test_index_reused_until_listing_changes(self):
+        df = listing()
+        first = symbol_index("test", df, "code", "name")
+        assert symbol_index("test", df, "code", "name") is first
+
+        with mock.patch.object(SymbolIndex, "build", wraps=SymbolIndex.build) as build:
+            symbols._INDEXES.clear()
+            assert symbol_index("test", df.copy(), "code", "name").fingerprint == first.fingerprint
+            build.assert_not_called()
+
+            changed = pd.concat([df, pd.DataFrame({"code": ["300750"], "name": ["宁德时代"]})])
+            assert symbol_index("test", changed, "code", "name").codes["300750"] == 5
+            build.assert_called_once()
+
+    def test_missing_columns_skip_listing(self):
+        assert find_symbol(listing(), "test", "证券代码", "证券简称", keyword="平安") is None
+
+    def test_ak_search_uses_index(self):
+        with mock.patch("mcp_aktools.shared.utils.ak_cache", return_value=listing()):
+            result = ak_search(keyword="贵州", market="sh")
+
+        assert result["code"] == "600519"
+
+
+class TestSearchAsync:
+    def teardown_method(self):
+        TestSymbolIndex.teardown_method(self)
+
+    @pytest.mark.asyncio
+    async def test_returns_before_slow_sources(self):
+        blocked = asyncio.Event()
+        calls = []
+
+        async def fetch(fun, **kwargs):
+            calls.append(fun)
+            if fun is symbols.LISTINGS[0][1]:
+                return listing()
+            await blocked.wait()
+
+        with mock.patch("mcp_aktools.shared.utils.ak_cache_async", side_effect=fetch):
+            result = await asyncio.wait_for(ak_search_async(keyword="贵州"), timeout=1)
+        blocked.set()
+
+        assert result["code"] == "600519"
+        assert len(calls) == len(set(calls)) == len({m[1] for m in symbols.LISTINGS})
+
+    @pytest.mark.asyncio
+    async def test_priority_order_over_completion_order(self):
+        first = asyncio.Event()
+
+        async def fetch(fun, **kwargs):
+            if fun is symbols.LISTINGS[0][1]:
+                await first.wait()
+                return listing()
+            first.set()
+            return pd.DataFrame({"code": ["000002"], "name": ["贵州万科"]}).rename(
+                columns={"code": "证券代码", "name": "证券简称"}
+            )
+
+        with mock.patch("mcp_aktools.shared.utils.ak_cache_async", side_effect=fetch):
+            result = await ak_search_async(keyword="贵州", market="sh")
+
+        assert result["code"] == "600519"
+
+    @pytest.mark.asyncio
+    async def test_failed_source_skipped(self):
+        async def fetch(fun, **kwargs):
+            if fun is symbols.LISTINGS[0][1]:
+                raise RuntimeError("upstream down")
+            return listing().rename(columns={"code": "证券代码", "name": "证券简称"})
+
+        with mock.patch("mcp_aktools.shared.utils.ak_cache_async", side_effect=fetch):
+            result = await ak_search_async(keyword="贵州", market="sh")
+
+        assert result["证券代码"] == "600519"
+
+
+class TestSearchEngine:
+    def setup_method(self):
+        symbols._ENGINE = None
+
+    def teardown_method(self):
+        if "symbol-search-engine" in CacheKey.ALL:
+            CacheKey.ALL.pop("symbol-search-engine").delete()
+        symbols._ENGINE = None
+
+    def engine(self):
+        us = pd.DataFrame({"symbol": ["AAPL", "TSLA"], "cname": ["苹果公司", "特斯拉"]})
+        return SearchEngine.build([("sh", listing(), "code", "name"), ("us", us, "symbol", "cname")])
+
+    def codes(self, engine, query, market=None, limit=5):
+        return [engine.codes[pos] for pos, _ in engine.search(query, market, limit)]
+
+    def test_exact_code_ranks_first(self):
+        engine = self.engine()
+        hits = engine.search("600519")
+        assert engine.codes[hits[0][0]] == "600519"
+        assert hits[0][1] == 100.0
+
+    def test_prefix_and_substring_ranked(self):
+        engine = self.engine()
+        assert self.codes(engine, "平安") == ["000001", "601318"]
+        assert self.codes(engine, "茅台") == ["600519"]
+
+    def test_abbreviation_matches_subsequence(self):
+        assert self.codes(self.engine(), "招行") == ["600036"]
+
+    def test_market_inferred_and_filtered(self):
+        engine = self.engine()
+        assert engine.markets[engine.codes.index("000001")] == "sz"
+        assert self.codes(engine, "平安", market="sh") == ["601318"]
+        assert self.codes(engine, "aapl", market="us") == ["AAPL"]
+
+    def test_limit_and_empty_query(self):
+        engine = self.engine()
+        assert len(engine.search("6", limit=2)) == 2
+        assert engine.search("  ") == []
+
+    def test_pinyin_initials(self):
+        engine = self.engine()
+        hits = engine.search("gzmt")
+        assert engine.codes[hits[0][0]] == "600519"
+        assert hits[0][1] == 92.0
+        assert self.codes(engine, "zsy") == ["600036"]
+
+    def test_engine_reused_until_listing_changes(self):
+        listings = [("sh", listing(), "code", "name")]
+        first = search_engine(listings)
+        assert search_engine(listings) is first
+
+        with mock.patch.object(SearchEngine, "build", wraps=SearchEngine.build) as build:
+            symbols._ENGINE = None
+            assert search_engine([("sh", listing(), "code", "name")]).fingerprint == first.fingerprint
+            build.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_ak_search_ranked_batch(self):
+        with mock.patch("mcp_aktools.shared.utils.ak_cache_async", return_value=listing()):
+            result = await ak_search_ranked(["贵州", "万科"], limit=3)
+
+        assert result["query"].tolist() == ["贵州", "万科"]
+        assert result["code"].tolist() == ["600519", "000002"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
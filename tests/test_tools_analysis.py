@@ -1,15 +1,25 @@
 """Tests for analysis module tools."""
 
 import pytest
+import numpy as np
 import pandas as pd
+from io import StringIO
 from unittest import mock
 
+from mcp_aktools.cache import RESULTS
+from mcp_aktools.shared.normalize import PriceFrame
 from mcp_aktools.tools import analysis as analysis_module
 
 composite_diag_fn = analysis_module.composite_stock_diagnostic.fn
 draw_chart_fn = analysis_module.draw_ascii_chart.fn
 backtest_fn = analysis_module.backtest_strategy.fn
 trading_suggest_fn = analysis_module.trading_suggest.fn
+backtest_portfolio_fn = analysis_module.backtest_portfolio.fn
+
+
+def frame(csv_text):
+    """PriceFrame as returned by the typed price loader."""
+    return PriceFrame(pd.read_csv(StringIO(csv_text)), source="akshare", currency="CNY")
 
 
 class TestCompositeStockDiagnostic:
@@ -47,7 +57,7 @@ class TestDrawAsciiChart:
             ]
         )
 
-        with mock.patch.object(analysis_module.market_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=frame(mock_prices)):
             result = draw_chart_fn(symbol="000001", market="sh")
 
             assert isinstance(result, str)
@@ -57,7 +67,7 @@ class TestDrawAsciiChart:
 
     def test_handles_empty_data(self):
         """Test that function handles empty price data."""
-        with mock.patch.object(analysis_module.market_prices, "fn", return_value=""):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=None):
             result = draw_chart_fn(symbol="000001", market="sh")
 
             assert isinstance(result, str)
@@ -66,6 +76,50 @@ class TestDrawAsciiChart:
 class TestBacktestStrategy:
     """Test the backtest_strategy tool."""
 
+    def setup_method(self):
+        """Drop memoized reports so each test loads its own mocked bars."""
+        RESULTS.clear()
+
+    def test_repeat_served_from_cache_until_bars_change(self):
+        """Test repeat calls on unchanged bars skip loading and run in well under a millisecond."""
+        import time
+
+        mock_prices = "date,open,high,low,close\n" + "\n".join(
+            f"2024-01-{i + 1:02d},10,11,9.5,{10.5 + i * 0.1}" for i in range(30)
+        )
+        version = ["30-aaaa"]
+        with (
+            mock.patch.object(analysis_module, "market_prices_version", side_effect=lambda *a, **k: version[0]),
+            mock.patch.object(analysis_module, "load_market_prices") as load,
+        ):
+            load.side_effect = lambda *a, **k: PriceFrame(
+                pd.read_csv(StringIO(mock_prices)), source="akshare", currency="CNY", version=version[0]
+            )
+            first = backtest_fn(symbol="600000", market="sh", strategy="SMA", days=30)
+            start = time.perf_counter()
+            for _ in range(100):
+                assert backtest_fn(symbol="600000", market="sh", strategy="SMA", days=30) == first
+            assert (time.perf_counter() - start) / 100 < 0.001
+            assert load.call_count == 1
+            # 新 K 线到达: 版本变化后重新计算
+            version[0] = "31-bbbb"
+            backtest_fn(symbol="600000", market="sh", strategy="SMA", days=30)
+            assert load.call_count == 2
+
+    def test_unversioned_bars_not_memoized(self):
+        """Test bars without a version are recomputed every call."""
+        mock_prices = "date,open,high,low,close\n" + "\n".join(
+            f"2024-01-{i + 1:02d},10,11,9.5,{10.5 + i * 0.1}" for i in range(30)
+        )
+        with (
+            mock.patch.object(analysis_module, "market_prices_version", return_value=None),
+            mock.patch.object(analysis_module, "load_market_prices", return_value=frame(mock_prices)) as load,
+        ):
+            backtest_fn(symbol="600000", market="sh", strategy="SMA", days=30)
+            backtest_fn(symbol="600000", market="sh", strategy="SMA", days=30)
+        assert load.call_count == 2
+        assert len(RESULTS) == 0
+
     def test_sma_strategy_returns_report(self):
         """Test SMA strategy backtest."""
         dates = pd.date_range("2024-01-01", periods=30)
@@ -76,7 +130,7 @@ class TestBacktestStrategy:
             ]
         )
 
-        with mock.patch.object(analysis_module.market_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=frame(mock_prices)):
             result = backtest_fn(symbol="000001", market="sh", strategy="SMA", days=30)
 
             assert isinstance(result, str)
@@ -94,7 +148,7 @@ class TestBacktestStrategy:
             ]
         )
 
-        with mock.patch.object(analysis_module.market_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=frame(mock_prices)):
             result = backtest_fn(symbol="000001", market="sh", strategy="RSI", days=30)
 
             assert isinstance(result, str)
@@ -110,7 +164,7 @@ class TestBacktestStrategy:
             ]
         )
 
-        with mock.patch.object(analysis_module.market_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=frame(mock_prices)):
             result = backtest_fn(symbol="000001", market="sh", strategy="MACD", days=30)
 
             assert isinstance(result, str)
@@ -126,7 +180,7 @@ class TestBacktestStrategy:
             ]
         )
 
-        with mock.patch.object(analysis_module.market_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=frame(mock_prices)):
             result = backtest_fn(symbol="000001", market="sh", strategy="INVALID", days=30)
 
             assert isinstance(result, str)
@@ -134,9 +188,7 @@ class TestBacktestStrategy:
 
     def test_not_found_symbol(self):
         """Test backtest when symbol not found."""
-        with mock.patch.object(
-            analysis_module.market_prices, "fn", return_value="error,source,fallback\nempty data,akshare,"
-        ):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=None):
             result = backtest_fn(symbol="NONEXISTENT", market="sh", strategy="SMA", days=30)
 
             assert isinstance(result, str)
@@ -152,7 +204,7 @@ class TestBacktestStrategy:
             ]
         )
 
-        with mock.patch.object(analysis_module.market_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=frame(mock_prices)):
             result = backtest_fn(symbol="000001", market="sh", strategy="BOLL", days=30)
 
             assert isinstance(result, str)
@@ -169,7 +221,7 @@ class TestBacktestStrategy:
             ]
         )
 
-        with mock.patch.object(analysis_module.market_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=frame(mock_prices)):
             result = backtest_fn(symbol="000001", market="sh", strategy="MA_CROSS", days=40)
 
             assert isinstance(result, str)
@@ -186,7 +238,7 @@ class TestBacktestStrategy:
             ]
         )
 
-        with mock.patch.object(analysis_module.market_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=frame(mock_prices)):
             result = backtest_fn(symbol="000001", market="sh", strategy="KDJ", days=30)
 
             assert isinstance(result, str)
@@ -203,7 +255,7 @@ class TestBacktestStrategy:
             ]
         )
 
-        with mock.patch.object(analysis_module.market_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=frame(mock_prices)):
             result = backtest_fn(symbol="000001", market="sh", strategy="RSI", days=30)
 
             assert "缺少 RSI" in result
@@ -218,7 +270,7 @@ class TestBacktestStrategy:
             ]
         )
 
-        with mock.patch.object(analysis_module.market_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=frame(mock_prices)):
             result = backtest_fn(symbol="000001", market="sh", strategy="MACD", days=30)
 
             assert "缺少 MACD" in result
@@ -233,7 +285,7 @@ class TestBacktestStrategy:
             ]
         )
 
-        with mock.patch.object(analysis_module.market_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=frame(mock_prices)):
             result = backtest_fn(symbol="000001", market="sh", strategy="BOLL", days=30)
 
             assert "缺少 BOLL" in result
@@ -248,14 +300,14 @@ class TestBacktestStrategy:
             ]
         )
 
-        with mock.patch.object(analysis_module.market_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=frame(mock_prices)):
             result = backtest_fn(symbol="000001", market="sh", strategy="KDJ", days=30)
 
             assert "缺少 KDJ" in result
 
     def test_parse_failure(self):
         """Test backtest when price data cannot be parsed."""
-        with mock.patch.object(analysis_module.market_prices, "fn", return_value="invalid,csv,data"):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=frame("invalid,csv,data")):
             result = backtest_fn(symbol="000001", market="sh", strategy="SMA", days=30)
 
             assert "数据不足" in result or "解析失败" in result
@@ -264,12 +316,77 @@ class TestBacktestStrategy:
         """Test backtest with empty data after header."""
         mock_prices = "date,open,high,low,close\n"
 
-        with mock.patch.object(analysis_module.market_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=frame(mock_prices)):
             result = backtest_fn(symbol="000001", market="sh", strategy="SMA", days=30)
 
             assert "数据不足" in result
 
 
+class TestBacktestPortfolio:
+    """Test the backtest_portfolio tool."""
+
+    @staticmethod
+    def fake_loader(calls):
+        def load(symbol, market, limit, indicators):
+            calls.append((symbol, market, indicators))
+            if symbol == "MISSING":
+                return None
+            n = 60 if market == "hk" else 40
+            close = 10 + np.sin(np.arange(n) / 3 + len(symbol)) + np.arange(n) * 0.05
+            data = pd.DataFrame({"date": pd.bdate_range("2024-01-01", periods=n), "close": close})
+            return PriceFrame(data, source="akshare", currency="CNY")
+
+        return load
+
+    def test_parse_symbols(self):
+        pairs = analysis_module.parse_symbols("600519.sh, 00700.HK AAPL.us 000001 600519.sh BRK.B.us", "sz")
+        assert pairs == [("600519", "sh"), ("00700", "hk"), ("AAPL", "us"), ("000001", "sz"), ("BRK.B", "us")]
+
+    @pytest.mark.asyncio
+    async def test_portfolio_report(self):
+        calls = []
+        with mock.patch.object(analysis_module, "load_market_prices", side_effect=self.fake_loader(calls)):
+            result = await backtest_portfolio_fn("600519.sh,00700.hk,MISSING.sz", "sh", "SMA", 40, "equal")
+        assert sorted(calls) == [("00700", "hk", "none"), ("600519", "sh", "none"), ("MISSING", "sz", "none")]
+        assert "组合累计收益" in result and "组合最大回撤" in result
+        assert "2 个标的" in result
+        assert "未获取到数据: MISSING.sz" in result
+        table = pd.read_csv(StringIO(result.split("\n\n", 1)[1]))
+        assert table["symbol"].tolist() == ["600519.sh", "00700.hk"]
+        assert table["weight"].tolist() == [0.5, 0.5]
+        assert table["bars"].tolist() == [40, 60]
+
+    @pytest.mark.asyncio
+    async def test_fetches_run_concurrently(self):
+        import threading
+
+        barrier = threading.Barrier(3, timeout=5)
+        load = self.fake_loader([])
+
+        def slow_load(*args, **kwargs):
+            barrier.wait()
+            return load(*args, **kwargs)
+
+        with mock.patch.object(analysis_module, "load_market_prices", side_effect=slow_load):
+            result = await backtest_portfolio_fn("a.sh b.sz c.hk", "sh", "SMA", 40, "equal")
+        assert "3 个标的" in result
+
+    @pytest.mark.asyncio
+    async def test_invalid_input(self):
+        with mock.patch.object(analysis_module, "load_market_prices") as load:
+            assert "不支持" in await backtest_portfolio_fn("a.sh", "sh", "FOO", 40, "equal")
+            result = await backtest_portfolio_fn("a.sh", "sh", "SMA", 40, "b.sh=1")
+            assert result.startswith("error,") and "unknown symbol" in result
+            assert "未提供" in await backtest_portfolio_fn(" , ", "sh", "SMA", 40, "equal")
+        load.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_nothing_found(self):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=None):
+            result = await backtest_portfolio_fn("a.sh,b.sz", "sh", "SMA", 40, "equal")
+        assert "未找到可回测数据" in result
+
+
 class TestCacheTools:
     """Test cache management tools."""
 
@@ -277,13 +394,19 @@ class TestCacheTools:
         """Test cache_status when cache is empty."""
         from mcp_aktools.tools.analysis import cache_status
         from mcp_aktools.cache import CacheKey
+        from mcp_aktools.shared.utils import inflight
 
         original_all = CacheKey.ALL.copy()
         CacheKey.ALL.clear()
 
         try:
-            result = cache_status.fn()
+            with mock.patch.object(inflight, "coalesced", 5):
+                result = cache_status.fn()
             assert "缓存为空" in result
+            # 注册表为空时仍显示合并请求与回测结果缓存统计
+            assert "合并并发请求: 5" in result
+            assert "回测结果缓存:" in result
+            assert "最近缓存键" not in result
         finally:
             CacheKey.ALL.update(original_all)
 
@@ -298,8 +421,11 @@ class TestCacheTools:
         CacheKey.ALL["test_key_2"] = mock.Mock()
 
         try:
-            result = cache_status.fn()
+            RESULTS.clear()
+            with mock.patch.multiple(RESULTS, hits=3, misses=1):
+                result = cache_status.fn()
             assert "缓存条目数: 2" in result
+            assert "回测结果缓存: 0 项, 命中 3/4 (75.0%)" in result
             assert "test_key_1" in result
         finally:
             CacheKey.ALL.clear()
@@ -355,6 +481,37 @@ class TestCacheTools:
         finally:
             CacheKey.ALL.update(original_all)
 
+    @pytest.mark.parametrize("key", ["", "expired_key"])
+    def test_cache_clear_after_memory_expiry(self, key, tmp_path):
+        """Entries released from memory are still cleared from disk."""
+        import diskcache
+
+        from mcp_aktools import cache as cache_module
+        from mcp_aktools.cache import CacheKey, MemoryCache
+        from mcp_aktools.tools.analysis import cache_clear
+
+        now = [1000.0]
+        original_all = CacheKey.ALL.copy()
+        CacheKey.ALL.clear()
+        disk = diskcache.FanoutCache(str(tmp_path), shards=2)
+        l1 = MemoryCache(1024 * 1024, timer=lambda: now[0], on_evict=CacheKey.release)
+        try:
+            with mock.patch.object(cache_module, "_L2", disk), mock.patch.object(cache_module, "L1", l1):
+                cache = CacheKey.init("expired_key", ttl=60)
+                cache.set(("A", "stale"))
+                now[0] += 120
+                # 下一次写入时清理过期项，并从注册表释放该键
+                l1.put("other_key", 1, ttl=60)
+                assert "expired_key" not in CacheKey.ALL
+
+                result = cache_clear.fn(key=key)
+                assert "已清理" in result
+                assert cache.get_stale() is None
+        finally:
+            disk.close()
+            CacheKey.ALL.clear()
+            CacheKey.ALL.update(original_all)
+
 
 class TestTradingSuggest:
     """Test the trading_suggest tool."""
@@ -2,8 +2,13 @@
 
 import pytest
 import pandas as pd
+from dataclasses import replace
+from io import StringIO
 from unittest import mock
 
+from mcp_aktools.cache import RESULTS
+from mcp_aktools.shared.normalize import PriceFrame
+
 # Import the module and access functions via .fn attribute
 from mcp_aktools.tools import crypto as crypto_module
 
@@ -18,6 +23,13 @@ draw_crypto_chart_fn = crypto_module.draw_crypto_chart.fn
 backtest_crypto_fn = crypto_module.backtest_crypto_strategy.fn
 okx_funding_fn = crypto_module.okx_funding_rate.fn
 okx_oi_fn = crypto_module.okx_open_interest.fn
+
+
+def frame(csv_text):
+    """PriceFrame as returned by the typed price loader."""
+    return PriceFrame(pd.read_csv(StringIO(csv_text)), source="okx", currency="USDT")
+
+
 fgi_fn = crypto_module.fear_greed_index.fn
 
 
@@ -102,6 +114,24 @@ class TestCryptoPrices:
             assert "date" in result
             assert "close" in result
 
+    def test_version_tracks_last_candle(self):
+        """Test that the frame version follows the last candle's time and close."""
+        candles = [
+            ["1704067200000", "42000", "42500", "41500", "42200", "100", "1", "1", "1"],
+            ["1704153600000", "42200", "43000", "42000", "42800", "150", "1", "1", "0"],
+        ]
+        mock_response = mock.Mock()
+        mock_response.json.side_effect = lambda: {"data": candles}
+
+        with mock.patch("mcp_aktools.tools.crypto.requests.get", return_value=mock_response):
+            first = crypto_module.load_crypto_prices("BTC-USDT", "1D", 2, indicators="none")
+            # 未完结的 K 线价格更新
+            candles[-1] = [*candles[-1][:4], "42900", *candles[-1][5:]]
+            revised = crypto_module.load_crypto_prices("BTC-USDT", "1D", 2, indicators="none")
+
+        assert first.version == "2024-01-02 00:00:00-42800"
+        assert revised.version == "2024-01-02 00:00:00-42900"
+
     def test_empty_response(self):
         """Test handling of empty response."""
         mock_response = mock.Mock()
@@ -213,7 +243,7 @@ class TestDrawCryptoChart:
             [f"2024-01-{i + 1:02d},42000,43000,41500,42500" for i in range(20)]
         )
 
-        with mock.patch.object(crypto_module.crypto_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(crypto_module, "load_crypto_prices", return_value=frame(mock_prices)):
             result = draw_crypto_chart_fn(symbol="BTC", bar="1D")
 
             assert isinstance(result, str)
@@ -223,7 +253,7 @@ class TestDrawCryptoChart:
 
     def test_handles_insufficient_data(self):
         """Test handling of insufficient data."""
-        with mock.patch.object(crypto_module.crypto_prices, "fn", return_value=""):
+        with mock.patch.object(crypto_module, "load_crypto_prices", return_value=None):
             result = draw_crypto_chart_fn(symbol="BTC", bar="1D")
 
             assert isinstance(result, str)
@@ -233,13 +263,37 @@ class TestDrawCryptoChart:
 class TestBacktestCryptoStrategy:
     """Test the backtest_crypto_strategy tool."""
 
+    def setup_method(self):
+        """Drop memoized reports so each test loads its own mocked bars."""
+        RESULTS.clear()
+
+    def test_repeat_on_same_bars_served_from_cache(self):
+        """Test repeat calls on unchanged bars reuse the report, and revised bars recompute."""
+        mock_prices = "date,open,high,low,close\n" + "\n".join(
+            [f"2024-01-{i + 1:02d},42000,43000,41500,{42000 + i * 100}" for i in range(30)]
+        )
+        prices = frame(mock_prices)
+        versions = [replace(prices, version="2024-01-30-44900")]
+        with (
+            mock.patch.object(crypto_module, "load_crypto_prices", side_effect=lambda *args, **kwargs: versions[0]),
+            mock.patch.object(crypto_module, "backtest_frame", wraps=crypto_module.backtest_frame) as run,
+        ):
+            first = backtest_crypto_fn(symbol="BTC", strategy="SMA", bar="4H", limit=30)
+            assert backtest_crypto_fn(symbol="BTC", strategy="SMA", bar="4H", limit=30) == first
+            assert run.call_count == 1
+            backtest_crypto_fn(symbol="BTC", strategy="SMA", bar="1H", limit=30)
+            assert run.call_count == 2
+            versions[0] = replace(prices, version="2024-01-30-45000")
+            backtest_crypto_fn(symbol="BTC", strategy="SMA", bar="4H", limit=30)
+            assert run.call_count == 3
+
     def test_sma_strategy(self):
         """Test SMA strategy backtest."""
         mock_prices = "date,open,high,low,close\n" + "\n".join(
             [f"2024-01-{i + 1:02d},42000,43000,41500,{42000 + i * 100}" for i in range(30)]
         )
 
-        with mock.patch.object(crypto_module.crypto_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(crypto_module, "load_crypto_prices", return_value=frame(mock_prices)):
             result = backtest_crypto_fn(symbol="BTC", strategy="SMA", bar="4H", limit=30)
 
             assert isinstance(result, str)
@@ -247,26 +301,25 @@ class TestBacktestCryptoStrategy:
             assert "累计收益" in result
             assert "最大回撤" in result
 
-    def test_returns_not_found_when_crypto_prices_not_string(self):
-        """Test backtest when crypto_prices returns non-string."""
-        with mock.patch.object(crypto_module.crypto_prices, "fn", return_value=pd.DataFrame()):
+    def test_returns_not_found_when_no_frame(self):
+        """Test backtest when the price loader finds no data."""
+        with mock.patch.object(crypto_module, "load_crypto_prices", return_value=None):
             result = backtest_crypto_fn(symbol="BTC", strategy="SMA", bar="4H", limit=30)
 
             assert isinstance(result, str)
             assert "未找到" in result
 
-    def test_parse_failure(self):
-        """Test backtest when price data cannot be parsed."""
-        bad_csv = 'date,close\n"unterminated'
-        with mock.patch.object(crypto_module.crypto_prices, "fn", return_value=bad_csv):
+    def test_all_missing_closes(self):
+        """Test backtest when every close is missing."""
+        with mock.patch.object(crypto_module, "load_crypto_prices", return_value=frame("date,close\n2024-01-01,\n")):
             result = backtest_crypto_fn(symbol="BTC", strategy="SMA", bar="4H", limit=30)
 
             assert isinstance(result, str)
-            assert "解析失败" in result
+            assert "数据不足" in result
 
     def test_empty_dataframe_after_parsing(self):
         """Test backtest when parsed data is empty."""
-        with mock.patch.object(crypto_module.crypto_prices, "fn", return_value="date,open,high,low,close\n"):
+        with mock.patch.object(crypto_module, "load_crypto_prices", return_value=frame("date,open,high,low,close\n")):
             result = backtest_crypto_fn(symbol="BTC", strategy="SMA", bar="4H", limit=30)
 
             assert isinstance(result, str)
@@ -275,7 +328,7 @@ class TestBacktestCryptoStrategy:
     def test_missing_close_column(self):
         """Test backtest when '收盘' column is missing."""
         mock_prices = "date,open,high,low\n2024-01-01,42000,43000,41500"
-        with mock.patch.object(crypto_module.crypto_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(crypto_module, "load_crypto_prices", return_value=frame(mock_prices)):
             result = backtest_crypto_fn(symbol="BTC", strategy="SMA", bar="4H", limit=30)
 
             assert isinstance(result, str)
@@ -286,7 +339,7 @@ class TestBacktestCryptoStrategy:
         mock_prices = "date,open,high,low,close\n" + "\n".join(
             [f"2024-01-{i + 1:02d},42000,43000,41500,{42000 + i * 10}" for i in range(30)]
         )
-        with mock.patch.object(crypto_module.crypto_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(crypto_module, "load_crypto_prices", return_value=frame(mock_prices)):
             result = backtest_crypto_fn(symbol="BTC", strategy="RSI", bar="4H", limit=30)
 
             assert isinstance(result, str)
@@ -297,7 +350,7 @@ class TestBacktestCryptoStrategy:
         mock_prices = "date,open,high,low,close\n" + "\n".join(
             [f"2024-01-{i + 1:02d},42000,43000,41500,{42000 + i * 10}" for i in range(30)]
         )
-        with mock.patch.object(crypto_module.crypto_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(crypto_module, "load_crypto_prices", return_value=frame(mock_prices)):
             result = backtest_crypto_fn(symbol="BTC", strategy="MACD", bar="4H", limit=30)
 
             assert isinstance(result, str)
@@ -308,7 +361,7 @@ class TestBacktestCryptoStrategy:
         mock_prices = "date,open,high,low,close\n" + "\n".join(
             [f"2024-01-{i + 1:02d},42000,43000,41500,{42000 + i * 10}" for i in range(30)]
         )
-        with mock.patch.object(crypto_module.crypto_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(crypto_module, "load_crypto_prices", return_value=frame(mock_prices)):
             result = backtest_crypto_fn(symbol="BTC", strategy="INVALID", bar="4H", limit=30)
 
             assert isinstance(result, str)
@@ -316,7 +369,7 @@ class TestBacktestCryptoStrategy:
 
     def test_returns_not_found_when_no_data(self):
         """Test backtest returns not-found when crypto_prices is empty."""
-        with mock.patch.object(crypto_module.crypto_prices, "fn", return_value=""):
+        with mock.patch.object(crypto_module, "load_crypto_prices", return_value=None):
             result = backtest_crypto_fn(symbol="BTC", strategy="SMA", bar="4H", limit=30)
             assert "未找到" in result
 
@@ -55,17 +55,28 @@ class TestFxHistory:
             }
         )
 
-        with mock.patch("mcp_aktools.tools.forex.ak_cache", return_value=mock_df):
+        with mock.patch("mcp_aktools.tools.forex.load_history", return_value=mock_df):
             result = fx_history_fn(symbol="USDCNY", limit=10)
 
             assert isinstance(result, str)
             assert "date" in result or "rate" in result
 
+    def test_offshore_substitute_is_labelled(self):
+        """USDCNY history comes from USDCNH and is labelled as such."""
+        mock_df = pd.DataFrame({"日期": ["2025-01-02", "2025-01-03"], "收盘价": [7.3150, 7.3210]})
+
+        with mock.patch("mcp_aktools.tools.forex.load_history", return_value=mock_df) as load:
+            result = fx_history_fn(symbol="usdcny", limit=10)
+
+        assert load.call_args.kwargs["symbol"] == "USDCNH"
+        assert "USDCNY" not in result
+        assert result.splitlines()[1].endswith(",USDCNH,akshare")
+
     def test_handles_empty_dataframe(self):
         """Test handling of empty DataFrame."""
         mock_df = pd.DataFrame()
 
-        with mock.patch("mcp_aktools.tools.forex.ak_cache", return_value=mock_df):
+        with mock.patch("mcp_aktools.tools.forex.load_history", return_value=mock_df):
             result = fx_history_fn(symbol="USDCNY", limit=10)
 
             assert isinstance(result, str)
@@ -81,7 +92,7 @@ class TestFxHistory:
             }
         )
 
-        with mock.patch("mcp_aktools.tools.forex.ak_cache", return_value=mock_df):
+        with mock.patch("mcp_aktools.tools.forex.load_history", return_value=mock_df):
             result = fx_history_fn(symbol="USDCNY", limit=10)
 
             assert isinstance(result, str)
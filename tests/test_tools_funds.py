@@ -59,7 +59,7 @@ class TestFundNav:
             }
         )
 
-        with mock.patch("mcp_aktools.tools.funds.ak_cache", return_value=mock_df):
+        with mock.patch("mcp_aktools.tools.funds.load_history", return_value=mock_df):
             result = fund_nav_fn(code="000001", limit=30)
 
             assert isinstance(result, str)
@@ -75,7 +75,7 @@ class TestFundNav:
             }
         )
 
-        with mock.patch("mcp_aktools.tools.funds.ak_cache", return_value=mock_df):
+        with mock.patch("mcp_aktools.tools.funds.load_history", return_value=mock_df):
             result = fund_nav_fn(code="000001", limit=10)
 
             csv_df = pd.read_csv(StringIO(result))
@@ -28,17 +28,18 @@ class TestFuturesPrices:
             }
         )
 
-        with mock.patch("mcp_aktools.tools.futures.ak_cache", return_value=mock_df):
+        with mock.patch("mcp_aktools.tools.futures.load_history", return_value=mock_df):
             result = futures_prices_fn(symbol="螺纹钢", limit=30)
 
             assert isinstance(result, str)
             assert "date" in result
+            assert "macd" in result.splitlines()[0]
 
     def test_handles_empty_dataframe(self):
         """Test handling of empty DataFrame."""
         mock_df = pd.DataFrame()
 
-        with mock.patch("mcp_aktools.tools.futures.ak_cache", return_value=mock_df):
+        with mock.patch("mcp_aktools.tools.futures.load_history", return_value=mock_df):
             result = futures_prices_fn(symbol="螺纹钢", limit=30)
 
             assert isinstance(result, str)
@@ -54,7 +55,7 @@ class TestFuturesPrices:
             }
         )
 
-        with mock.patch("mcp_aktools.tools.futures.ak_cache", return_value=mock_df):
+        with mock.patch("mcp_aktools.tools.futures.load_history", return_value=mock_df):
             result = futures_prices_fn(symbol="螺纹钢", limit=30)
 
             assert isinstance(result, str)
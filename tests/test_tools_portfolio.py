@@ -8,17 +8,29 @@ import uuid
 from typing import ClassVar
 from datetime import datetime
 from pathlib import Path
+from io import StringIO
 from unittest import mock
 
+import numpy as np
+import pandas as pd
+
 from mcp_aktools.shared import constants
 from mcp_aktools.shared import utils as utils_module
-from mcp_aktools.cache import CacheKey
+from mcp_aktools.cache import RESULTS, CacheKey
 
 from mcp_aktools.tools import portfolio as portfolio_module
 
 portfolio_add_fn = portfolio_module.portfolio_add.fn
 portfolio_view_fn = portfolio_module.portfolio_view.fn
 portfolio_chart_fn = portfolio_module.portfolio_chart.fn
+portfolio_performance_fn = portfolio_module.portfolio_performance.fn
+portfolio_risk_fn = portfolio_module.portfolio_risk.fn
+portfolio_optimize_fn = portfolio_module.portfolio_optimize.fn
+
+
+def quotes(price):
+    """Stand-in for the batched quote service: every holding priced at ``price``."""
+    return lambda pairs: {pair: price for pair in pairs}
 
 
 def get_unique_portfolio_file(base_dir):
@@ -68,14 +80,27 @@ class TestPortfolioAdd:
         portfolio_add_fn(symbol="000001", price=10.5, volume=100, market="sh")
         portfolio_add_fn(symbol="000002", price=20.0, volume=200, market="sz")
 
-        with open(temp_portfolio, "r") as f:
-            data = json.load(f)
+        data = utils_module.load_portfolio()
 
         assert "000001.sh" in data
         assert "000002.sz" in data
         assert data["000001.sh"]["price"] == 10.5
         assert data["000002.sz"]["price"] == 20.0
 
+    def test_add_same_holding_keeps_lots(self):
+        temp_portfolio = type(self).temp_portfolio
+        utils_module.PORTFOLIO_FILE = str(temp_portfolio)
+        constants.PORTFOLIO_FILE = str(temp_portfolio)
+
+        portfolio_add_fn(symbol="000001", price=10.0, volume=100, market="sh")
+        portfolio_add_fn(symbol="000001", price=13.0, volume=200, market="sh")
+
+        data = utils_module.load_portfolio()
+        assert data["000001.sh"]["volume"] == 300
+        assert data["000001.sh"]["price"] == pytest.approx(12.0)
+        assert data["000001.sh"]["lots"] == 2
+        assert not temp_portfolio.exists()
+
 
 class TestPortfolioView:
     """Test the portfolio_view tool."""
@@ -126,11 +151,11 @@ class TestPortfolioView:
         with open(temp_portfolio, "w") as f:
             json.dump(test_data, f)
 
-        mock_prices = "date,open,high,low,close\n2024-01-01,9.5,11.5,9.0,11.0"
+        mock_price = 11.0
 
         utils_module.PORTFOLIO_FILE = str(temp_portfolio)
         constants.PORTFOLIO_FILE = str(temp_portfolio)
-        with mock.patch.object(portfolio_module.market_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(portfolio_module, "load_quotes", side_effect=quotes(mock_price)):
             result = portfolio_view_fn()
 
             assert isinstance(result, str)
@@ -154,12 +179,9 @@ class TestPortfolioView:
         with open(temp_portfolio, "w") as f:
             json.dump(test_data, f)
 
-        def mock_error(*args, **kwargs):
-            raise Exception("API Error")
-
         utils_module.PORTFOLIO_FILE = str(temp_portfolio)
         constants.PORTFOLIO_FILE = str(temp_portfolio)
-        with mock.patch.object(portfolio_module.market_prices, "fn", side_effect=mock_error):
+        with mock.patch.object(portfolio_module, "load_quotes", side_effect=quotes(None)):
             result = portfolio_view_fn()
 
             assert isinstance(result, str)
@@ -216,11 +238,11 @@ class TestPortfolioChart:
         with open(temp_portfolio, "w") as f:
             json.dump(test_data, f)
 
-        mock_prices = "date,open,high,low,close\n2024-01-01,9.5,12.5,9.0,12.0"
+        mock_price = 12.0
 
         utils_module.PORTFOLIO_FILE = str(temp_portfolio)
         constants.PORTFOLIO_FILE = str(temp_portfolio)
-        with mock.patch.object(portfolio_module.market_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(portfolio_module, "load_quotes", side_effect=quotes(mock_price)):
             result = portfolio_chart_fn()
 
             assert "持仓盈亏图表" in result
@@ -243,11 +265,11 @@ class TestPortfolioChart:
         with open(temp_portfolio, "w") as f:
             json.dump(test_data, f)
 
-        mock_prices = "date,open,high,low,close\n2024-01-01,9.5,10.0,7.5,8.0"
+        mock_price = 8.0
 
         utils_module.PORTFOLIO_FILE = str(temp_portfolio)
         constants.PORTFOLIO_FILE = str(temp_portfolio)
-        with mock.patch.object(portfolio_module.market_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(portfolio_module, "load_quotes", side_effect=quotes(mock_price)):
             result = portfolio_chart_fn()
 
             assert "持仓盈亏图表" in result
@@ -269,12 +291,9 @@ class TestPortfolioChart:
         with open(temp_portfolio, "w") as f:
             json.dump(test_data, f)
 
-        def mock_error(*args, **kwargs):
-            raise Exception("API Error")
-
         utils_module.PORTFOLIO_FILE = str(temp_portfolio)
         constants.PORTFOLIO_FILE = str(temp_portfolio)
-        with mock.patch.object(portfolio_module.market_prices, "fn", side_effect=mock_error):
+        with mock.patch.object(portfolio_module, "load_quotes", side_effect=quotes(None)):
             result = portfolio_chart_fn()
 
             assert "持仓盈亏图表" in result
@@ -303,11 +322,11 @@ class TestPortfolioChart:
         with open(temp_portfolio, "w") as f:
             json.dump(test_data, f)
 
-        mock_prices = "date,open,high,low,close\n2024-01-01,9.5,11.5,9.0,11.0"
+        mock_price = 11.0
 
         utils_module.PORTFOLIO_FILE = str(temp_portfolio)
         constants.PORTFOLIO_FILE = str(temp_portfolio)
-        with mock.patch.object(portfolio_module.market_prices, "fn", return_value=mock_prices):
+        with mock.patch.object(portfolio_module, "load_quotes", side_effect=quotes(mock_price)):
             result = portfolio_chart_fn()
 
             assert "持仓盈亏图表" in result
@@ -315,6 +334,180 @@ class TestPortfolioChart:
             assert "000002" in result
             assert "最大波动" in result
 
+    def test_holdings_priced_in_one_batch(self):
+        test_data = {
+            f"{code}.{market}": {"symbol": code, "price": 10.0, "volume": 10, "market": market, "time": ""}
+            for code, market in [("000001", "sh"), ("000002", "sz"), ("00700", "hk"), ("AAPL", "us")]
+        }
+        temp_portfolio = type(self).temp_portfolio
+        with open(temp_portfolio, "w") as f:
+            json.dump(test_data, f)
+
+        utils_module.PORTFOLIO_FILE = str(temp_portfolio)
+        constants.PORTFOLIO_FILE = str(temp_portfolio)
+        with mock.patch.object(portfolio_module, "load_quotes", side_effect=quotes(12.0)) as load:
+            portfolio_chart_fn()
+            portfolio_view_fn()
+        assert load.call_count == 2
+        assert load.call_args.args[0] == [("000001", "sh"), ("000002", "sz"), ("00700", "hk"), ("AAPL", "us")]
+
+
+class TestPortfolioPerformance:
+    """Test the portfolio_performance tool."""
+
+    def setup_method(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.orig_file = utils_module.PORTFOLIO_FILE
+        utils_module.PORTFOLIO_FILE = str(get_unique_portfolio_file(self.temp_dir))
+
+    def teardown_method(self):
+        import shutil
+
+        utils_module.PORTFOLIO_FILE = self.orig_file
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_empty_portfolio(self):
+        assert "为空" in portfolio_performance_fn(days=252)
+
+    def test_report(self):
+        dates = pd.bdate_range("2024-01-01", periods=40)
+        close = pd.DataFrame({"000001.sz": np.linspace(10, 12, 40), "00700.hk": np.linspace(300, 330, 40)}, index=dates)
+        ledger = utils_module.portfolio_ledger()
+        ledger.add_trade("000001", "sz", 10.0, 100, "2024-01-01T10:00:00")
+        ledger.add_trade("00700", "hk", 310.0, 10, "2024-01-17T10:00:00")
+        ledger.add_trade("000001", "sz", 11.0, 100, "2024-01-24T10:00:00")
+        ledger.add_trade("AAPL", "us", 190.0, 10, "2024-01-24T10:00:00")
+
+        with mock.patch.object(portfolio_module, "load_close_panel", return_value=close) as load:
+            result = portfolio_performance_fn(days=252)
+
+        assert load.call_args.args == ([("000001", "sz"), ("00700", "hk"), ("AAPL", "us")], 252)
+        assert "2 个持仓, 4 笔交易" in result
+        assert "区间: 2024-01-01 ~ 2024-02-23" in result
+        for label in ["累计收益", "年化波动率", "最大回撤", "夏普比率"]:
+            assert label in result
+        assert "CNY/HKD" in result and "未获取到数据: AAPL.us" in result
+        table = pd.read_csv(StringIO(result.split("\n\n", 1)[1]))
+        assert table["holding"].tolist() == ["000001.sz", "00700.hk"]
+        assert table.loc[0, "volume"] == 200 and table.loc[0, "cost"] == pytest.approx(10.5)
+
+    def test_no_prices(self):
+        utils_module.portfolio_ledger().add_trade("000001", "sz", 10.0, 100)
+        with mock.patch.object(portfolio_module, "load_close_panel", return_value=pd.DataFrame()):
+            assert "未找到持仓行情: 000001.sz" in portfolio_performance_fn(days=252)
+
+
+class TestPortfolioRisk:
+    """Test the portfolio_risk tool."""
+
+    def setup_method(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.orig_file = utils_module.PORTFOLIO_FILE
+        utils_module.PORTFOLIO_FILE = str(get_unique_portfolio_file(self.temp_dir))
+
+    def teardown_method(self):
+        import shutil
+
+        utils_module.PORTFOLIO_FILE = self.orig_file
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def close(self):
+        rng = np.random.default_rng(0)
+        prices = 10 * np.exp(rng.standard_normal((253, 2)).cumsum(axis=0) * 0.01)
+        return pd.DataFrame(prices, index=pd.bdate_range("2024-01-01", periods=253), columns=["000001.sz", "600000.sh"])
+
+    def test_report_is_reproducible(self):
+        ledger = utils_module.portfolio_ledger()
+        ledger.add_trade("000001", "sz", 10.0, 100)
+        ledger.add_trade("600000", "sh", 10.0, 300)
+        ledger.add_trade("AAPL", "us", 190.0, 10)
+
+        with mock.patch.object(portfolio_module, "load_close_panel", return_value=self.close()) as load:
+            result = portfolio_risk_fn(days=252, horizon=5, confidence=0.99, paths=5000, seed=3)
+            assert portfolio_risk_fn(days=252, horizon=5, confidence=0.99, paths=5000, seed=3) == result
+        assert load.call_args.args == ([("000001", "sz"), ("600000", "sh"), ("AAPL", "us")], 253)
+        assert "2 个持仓, 样本 252 日, 持有期 5 日, 置信度 99%" in result
+        assert "随机种子: 3" in result and "未获取到数据: AAPL.us" in result
+        table = pd.read_csv(StringIO(result.split("\n\n", 1)[1]))
+        assert table["method"].tolist() == ["historical", "parametric"]
+        assert (table["es"] >= table["var"]).all() and (table["var"] > 0).all()
+        total = 100 * self.close().iloc[-1, 0] + 300 * self.close().iloc[-1, 1]
+        assert table["var_pct"].iloc[0] == pytest.approx(table["var"].iloc[0] / total, abs=1e-4)
+
+    def test_invalid_options(self):
+        with mock.patch.object(portfolio_module, "load_close_panel") as load:
+            result = portfolio_risk_fn(days=252, horizon=1, confidence=0.95, paths=500_000, seed=None)
+            assert result.startswith("error,") and "paths" in result
+            assert "为空" in portfolio_risk_fn(days=252, horizon=1, confidence=0.95, paths=1000, seed=None)
+        load.assert_not_called()
+
+
+class TestPortfolioOptimize:
+    """Test the portfolio_optimize tool."""
+
+    def setup_method(self):
+        RESULTS.clear()
+
+    def close(self, columns=("600519.sh", "00700.hk", "AAPL.us")):
+        rng = np.random.default_rng(0)
+        drift = np.array([0.001, 0.0005, 0.0008])[: len(columns)]
+        prices = 10 * np.exp((rng.standard_normal((253, len(columns))) * 0.01 + drift).cumsum(axis=0))
+        return pd.DataFrame(prices, index=pd.bdate_range("2024-01-01", periods=253), columns=list(columns))
+
+    def test_report(self):
+        with (
+            mock.patch.object(portfolio_module, "load_close_panel", return_value=self.close()) as load,
+            mock.patch.object(portfolio_module, "market_prices_version", return_value=None),
+        ):
+            result = portfolio_optimize_fn("600519.sh 00700.hk,AAPL.us", "sh", 252, "all", 0.02)
+        assert load.call_args.args == ([("600519", "sh"), ("00700", "hk"), ("AAPL", "us")], 253)
+        assert "3 个标的, 样本 252 日" in result and "协方差: 新计算" in result
+        _, weights, summary = result.split("\n\n")
+        weights = pd.read_csv(StringIO(weights))
+        assert weights.columns.tolist() == ["symbol", "min_variance", "max_sharpe", "risk_parity"]
+        assert weights["symbol"].tolist() == ["600519.sh", "00700.hk", "AAPL.us"]
+        np.testing.assert_allclose(weights.iloc[:, 1:].sum(), 1, atol=1e-3)
+        summary = pd.read_csv(StringIO(summary))
+        assert summary.columns.tolist() == ["method", "expected_return", "volatility", "sharpe"]
+        assert summary.set_index("method")["sharpe"].idxmax() == "max_sharpe"
+
+    def test_covariance_cached_per_symbol_set_and_window(self):
+        with (
+            mock.patch.object(portfolio_module, "load_close_panel", return_value=self.close()) as load,
+            mock.patch.object(portfolio_module, "market_prices_version", return_value="v1"),
+            mock.patch.object(portfolio_module, "estimate_moments", wraps=portfolio_module.estimate_moments) as fit,
+        ):
+            first = portfolio_optimize_fn("600519.sh,00700.hk,AAPL.us", "sh", 252, "min_variance", 0.0)
+            # 同一标的集合 (顺序不同) 与窗口的试算不再拉取行情与计算协方差
+            again = portfolio_optimize_fn("AAPL.us,600519.sh,00700.hk", "sh", 252, "risk_parity", 0.03)
+            assert load.call_count == 1 and fit.call_count == 1
+            assert "协方差: 新计算" in first and "协方差: 缓存命中" in again
+            assert pd.read_csv(StringIO(again.split("\n\n")[1]))["symbol"].iloc[0] == "AAPL.us"
+            portfolio_optimize_fn("600519.sh,00700.hk,AAPL.us", "sh", 126, "min_variance", 0.0)
+            assert load.call_count == 2
+        with (
+            mock.patch.object(portfolio_module, "load_close_panel", return_value=self.close()) as load,
+            mock.patch.object(portfolio_module, "market_prices_version", return_value="v2"),
+        ):
+            portfolio_optimize_fn("600519.sh,00700.hk,AAPL.us", "sh", 252, "min_variance", 0.0)
+            assert load.call_count == 1
+
+    def test_missing_and_invalid(self):
+        close = self.close(("600519.sh", "00700.hk"))
+        with (
+            mock.patch.object(portfolio_module, "load_close_panel", return_value=close) as load,
+            mock.patch.object(portfolio_module, "market_prices_version", return_value="v1"),
+        ):
+            result = portfolio_optimize_fn("600519.sh,00700.hk,FOO.us", "sh", 252, "max_sharpe", 5.0)
+            assert "未获取到数据: FOO.us" in result
+            assert "无法求解 max_sharpe" in result
+            # 缺数据的标的集合不缓存
+            portfolio_optimize_fn("600519.sh,00700.hk,FOO.us", "sh", 252, "min_variance", 0.0)
+            assert load.call_count == 2
+            result = portfolio_optimize_fn("600519.sh", "sh", 252, "max_return", 0.0)
+            assert result.startswith("error,") and "unknown method" in result
+            assert load.call_count == 2
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
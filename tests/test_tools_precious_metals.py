@@ -33,7 +33,7 @@ class TestPmSpotPrices:
             }
         )
 
-        with mock.patch("mcp_aktools.tools.precious_metals.ak_cache", return_value=mock_df):
+        with mock.patch("mcp_aktools.tools.precious_metals.load_history", return_value=mock_df):
             result = pm_spot_prices_fn(symbol="Au99.99", limit=10)
 
             assert isinstance(result, str)
@@ -43,7 +43,7 @@ class TestPmSpotPrices:
         """Test handling of empty DataFrame."""
         mock_df = pd.DataFrame()
 
-        with mock.patch("mcp_aktools.tools.precious_metals.ak_cache", return_value=mock_df):
+        with mock.patch("mcp_aktools.tools.precious_metals.load_history", return_value=mock_df):
             result = pm_spot_prices_fn(symbol="Au99.99", limit=10)
 
             assert isinstance(result, str)
@@ -61,7 +61,7 @@ class TestPmSpotPrices:
             }
         )
 
-        with mock.patch("mcp_aktools.tools.precious_metals.ak_cache", return_value=mock_df):
+        with mock.patch("mcp_aktools.tools.precious_metals.load_history", return_value=mock_df):
             result = pm_spot_prices_fn(symbol="Au99.99", limit=10)
 
             assert isinstance(result, str)
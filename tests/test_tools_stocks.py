@@ -1,13 +1,17 @@
 """Tests for stocks module tools."""
 
+import threading
+
 import pytest
 import pandas as pd
 from unittest import mock
 
+from mcp_aktools.shared.normalize import PriceFrame
 from mcp_aktools.tools import stocks as stocks_module
 
 
 search_fn = stocks_module.search.fn
+search_candidates_fn = stocks_module.search_candidates.fn
 stock_info_fn = stocks_module.stock_info.fn
 stock_news_fn = stocks_module.stock_news.fn
 inst_holding_fn = stocks_module.institutional_holding_summary.fn
@@ -32,6 +36,32 @@ class TestSearch:
         assert "Not Found" in result
 
 
+class TestSearchCandidates:
+    @pytest.mark.asyncio
+    async def test_batch_keywords_split(self):
+        ranked = pd.DataFrame(
+            {
+                "query": ["茅台", "GZMT"],
+                "rank": [1, 1],
+                "market": ["sh", "sh"],
+                "code": ["600519"] * 2,
+                "name": ["贵州茅台"] * 2,
+                "score": [65.0, 92.0],
+            }
+        )
+        with mock.patch("mcp_aktools.tools.stocks.ak_search_ranked", return_value=ranked) as search:
+            result = await search_candidates_fn(keywords="茅台，gzmt", market="", limit=3)
+        search.assert_called_once_with(["茅台", "gzmt"], market=None, limit=3)
+        assert "600519" in result
+        assert "query,rank,market,code,name,score" in result
+
+    @pytest.mark.asyncio
+    async def test_not_found(self):
+        with mock.patch("mcp_aktools.tools.stocks.ak_search_ranked", return_value=pd.DataFrame()):
+            result = await search_candidates_fn(keywords="NONEXISTENT", market="sh", limit=5)
+        assert "Not Found" in result
+
+
 class TestStockInfo:
     def test_stock_info_returns_string(self):
         mock_df = pd.DataFrame({"item": ["名称", "代码"], "value": ["平安银行", "000001"]})
@@ -131,16 +161,122 @@ class TestMarketPrices:
                 "换手率": [1.5] * 10,
             }
         )
-        with mock.patch("mcp_aktools.tools.stocks.ak_cache", return_value=mock_df):
+        with mock.patch("mcp_aktools.tools.stocks.load_history", return_value=mock_df):
             result = market_prices_fn(symbol="000001", market="sh", limit=5)
         assert isinstance(result, str)
         assert "date" in result
 
+    @pytest.mark.parametrize(
+        ("indicators", "projection"),
+        [("none", ["收盘"]), ("rsi", ["最高", "最低", "收盘"])],
+    )
+    def test_load_market_prices_projects_fields(self, indicators, projection):
+        mock_df = pd.DataFrame(
+            {
+                "日期": pd.date_range("2024-01-01", periods=30),
+                "收盘": [10.5] * 30,
+                "最高": [11.0] * 30,
+                "最低": [9.5] * 30,
+            }
+        )
+        with mock.patch("mcp_aktools.tools.stocks.load_history", return_value=mock_df) as load:
+            frame = stocks_module.load_market_prices("000001", "sh", limit=5, indicators=indicators, fields=("close",))
+        assert load.call_args.kwargs["columns"] == projection
+        assert frame.close.tolist() == [10.5] * 5
+
     def test_market_prices_not_found(self):
-        with mock.patch("mcp_aktools.tools.stocks.ak_cache", return_value=None):
+        with mock.patch("mcp_aktools.tools.stocks.load_history", return_value=None):
             result = market_prices_fn(symbol="NONEXISTENT", market="sh", limit=30)
         assert "error" in result
 
+    def test_market_prices_marks_stale_source(self):
+        from mcp_aktools.cache import mark_stale
+
+        mock_df = pd.DataFrame(
+            {
+                "日期": pd.date_range("2024-01-01", periods=3),
+                "开盘": [10.0] * 3,
+                "收盘": [10.5] * 3,
+                "最高": [11.0] * 3,
+                "最低": [9.5] * 3,
+            }
+        )
+        with mock.patch("mcp_aktools.tools.stocks.load_history", return_value=mark_stale(mock_df)):
+            result = market_prices_fn(symbol="000001", market="sh", limit=2)
+        assert "akshare:stale" in result
+
+    @pytest.mark.parametrize(
+        ("indicators", "present", "absent"),
+        [
+            ("none", [], ["macd", "rsi", "kdj_k", "boll_m"]),
+            ("rsi,kdj", ["rsi", "kdj_k", "kdj_j"], ["macd", "boll_m"]),
+            ("all", ["macd", "rsi", "kdj_k", "boll_m"], []),
+        ],
+    )
+    def test_market_prices_indicator_selection(self, indicators, present, absent):
+        mock_df = pd.DataFrame(
+            {
+                "日期": pd.date_range("2024-01-01", periods=10),
+                "开盘": [10.0] * 10,
+                "收盘": [10.5] * 10,
+                "最高": [11.0] * 10,
+                "最低": [9.5] * 10,
+            }
+        )
+        with mock.patch("mcp_aktools.tools.stocks.load_history", return_value=mock_df):
+            result = market_prices_fn(symbol="000001", market="sh", limit=5, indicators=indicators)
+        header = result.splitlines()[0].split(",")
+        assert "close" in header
+        assert all(col in header for col in present)
+        assert not any(col in header for col in absent)
+
+    def test_market_prices_unknown_indicator(self):
+        with mock.patch("mcp_aktools.tools.stocks.load_history") as load:
+            result = market_prices_fn(symbol="000001", market="sh", indicators="macd,foo")
+        assert result.startswith("error,")
+        assert "unknown indicator: foo" in result
+        load.assert_not_called()
+
+    def test_load_market_prices_keeps_full_precision(self):
+        mock_df = pd.DataFrame(
+            {
+                "日期": pd.date_range("2024-01-01", periods=3)[::-1],
+                "开盘": [10.0] * 3,
+                "收盘": [10.123456, 10.5, 10.987654],
+                "最高": [11.0] * 3,
+                "最低": [9.5] * 3,
+            }
+        )
+        with mock.patch("mcp_aktools.tools.stocks.load_history", return_value=mock_df):
+            frame = stocks_module.load_market_prices("000001", "sh", limit=2, indicators="rsi")
+            csv = market_prices_fn(symbol="000001", market="sh", limit=2, indicators="rsi")
+        assert (frame.source, frame.currency, len(frame)) == ("akshare", "CNY", 2)
+        # 按日期升序，保留原始精度，CSV 仅在工具边界格式化
+        assert frame.close.tolist() == [10.5, 10.123456]
+        assert "rsi" in frame and "macd" not in frame
+        assert csv.splitlines()[-1].split(",")[4] == "10.12"
+        assert frame.to_csv() == csv
+
+    def test_load_market_prices_carries_history_version(self):
+        from mcp_aktools.shared.history import HISTORY_VERSION
+
+        mock_df = pd.DataFrame(
+            {"日期": pd.date_range("2024-01-01", periods=3), "收盘": [10.0, 10.5, 11.0], "最高": 11.0, "最低": 9.5}
+        )
+        mock_df.attrs[HISTORY_VERSION] = "3-abcd"
+        with mock.patch("mcp_aktools.tools.stocks.load_history", return_value=mock_df):
+            frame = stocks_module.load_market_prices("000001", "sh", limit=2, indicators="none")
+        assert frame.version == "3-abcd"
+        with mock.patch.object(stocks_module, "history_version", return_value="3-abcd") as version:
+            assert stocks_module.market_prices_version("000001", "sz", limit=2) == "3-abcd"
+        assert version.call_args.args[0] == "sz-equity-000001-daily"
+
+    def test_load_market_prices_not_found(self):
+        with mock.patch("mcp_aktools.tools.stocks.load_history", return_value=None):
+            assert stocks_module.load_market_prices("NONEXISTENT", "sh") is None
+        with pytest.raises(ValueError, match="unknown indicator"):
+            stocks_module.load_market_prices("000001", "sh", indicators="foo")
+
     def test_market_prices_weekly(self):
         mock_df = pd.DataFrame(
             {
@@ -153,12 +289,81 @@ class TestMarketPrices:
                 "换手率": [1.5] * 10,
             }
         )
-        with mock.patch("mcp_aktools.tools.stocks.ak_cache", return_value=mock_df):
+        with mock.patch("mcp_aktools.tools.stocks.load_history", return_value=mock_df):
             result = market_prices_fn(symbol="000001", market="sh", period="weekly", limit=5)
         assert isinstance(result, str)
         assert "date" in result
 
 
+class TestLoadQuotes:
+    def test_a_share_spot(self):
+        snapshot = pd.DataFrame({"代码": ["000001", "600000", "600000", "000002"], "最新价": [10.5, 8.0, 8.1, None]})
+        with mock.patch("mcp_aktools.tools.stocks.ak_cache", return_value=snapshot) as cache:
+            prices = stocks_module.a_share_spot()
+        assert cache.call_args.kwargs["key"] == "stock_zh_a_spot_em"
+        assert prices.to_dict() == {"000001": 10.5, "600000": 8.0}
+
+    def test_a_shares_from_snapshot_others_fanned_out(self):
+        spot = pd.Series({"000001": 10.5, "600000": 8.0})
+        # 两个非 A 股标的必须同时在途，否则 Barrier 超时
+        barrier = threading.Barrier(2, timeout=5)
+
+        def last_close(symbol, market):
+            if market in ("hk", "us"):
+                barrier.wait()
+            return {"00700": 380.0, "AAPL": 190.0, "510300": 3.9}.get(symbol)
+
+        pairs = [("000001", "sz"), ("00700", "hk"), ("600000", "sh"), ("AAPL", "us"), ("510300", "sh")]
+        with (
+            mock.patch.object(stocks_module, "a_share_spot", return_value=spot) as snapshot,
+            mock.patch.object(stocks_module, "_last_close", side_effect=last_close) as close,
+        ):
+            quotes = stocks_module.load_quotes(pairs + [("000001", "sz")])
+        assert quotes == {
+            ("000001", "sz"): 10.5,
+            ("00700", "hk"): 380.0,
+            ("600000", "sh"): 8.0,
+            ("AAPL", "us"): 190.0,
+            ("510300", "sh"): 3.9,
+        }
+        snapshot.assert_called_once()
+        # 快照外的 A 股代码 (ETF) 单独回退
+        assert sorted(call.args[0] for call in close.call_args_list) == ["00700", "510300", "AAPL"]
+
+    def test_failures_are_none(self):
+        def last_close(symbol, market):
+            raise ConnectionError("down")
+
+        with (
+            mock.patch.object(stocks_module, "a_share_spot", side_effect=ConnectionError("down")),
+            mock.patch.object(stocks_module, "_last_close", side_effect=last_close),
+        ):
+            assert stocks_module.load_quotes([("000001", "sh"), ("AAPL", "us")]) == {
+                ("000001", "sh"): None,
+                ("AAPL", "us"): None,
+            }
+        assert stocks_module.load_quotes([]) == {}
+
+    def test_close_panel(self):
+        def load(symbol, market, limit, indicators, fields):
+            if symbol == "MISSING":
+                return None
+            dates = (
+                pd.bdate_range("2024-01-01", periods=5) if market != "us" else pd.date_range("2024-01-03", periods=5)
+            )
+            data = pd.DataFrame({"date": dates, "close": range(len(dates))}).astype({"close": float})
+            return PriceFrame(data, source="akshare", currency="CNY")
+
+        with mock.patch.object(stocks_module, "load_market_prices", side_effect=load) as loader:
+            close = stocks_module.load_close_panel([("000001", "sz"), ("AAPL", "us"), ("MISSING", "hk")], 5)
+        assert close.columns.tolist() == ["000001.sz", "AAPL.us"]
+        # 日期取各市场并集，休市处为 NaN
+        assert close.index.is_monotonic_increasing and len(close) == 7
+        assert close["AAPL.us"].isna().sum() == 2 and close["000001.sz"].isna().sum() == 2
+        assert loader.call_args.kwargs == {"limit": 5, "indicators": "none", "fields": ("close",)}
+        assert stocks_module.load_close_panel([], 5).empty
+
+
 class TestStockIndicators:
     def test_stock_indicators_a_returns_csv(self):
         mock_df = pd.DataFrame({"报告期": ["2024Q1"], "每股收益": [2.5], "净利润": [100000000]})
@@ -0,0 +1,171 @@
+"""Tests for walk-forward validation."""
+
+from io import StringIO
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mcp_aktools.cache import RESULTS
+from mcp_aktools.shared import sweep as sweep_module
+from mcp_aktools.shared.backtest import run_backtest
+from mcp_aktools.shared.normalize import PriceFrame
+from mcp_aktools.shared.sweep import SWEEPS, combinations, compute_series, parse_grid
+from mcp_aktools.shared.walkforward import check_windows, walk_forward, windows
+from mcp_aktools.tools import analysis as analysis_module
+
+backtest_walk_forward_fn = analysis_module.backtest_walk_forward.fn
+
+
+def ohlc(n=800, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 10 + rng.standard_normal(n).cumsum() * 0.1
+    return close, close - rng.random(n) * 0.2, close + rng.random(n) * 0.2
+
+
+class TestWindows:
+    def test_rolling_and_anchored(self):
+        assert windows(10, 4, 2) == [(0, 4, 6), (2, 6, 8), (4, 8, 10)]
+        assert windows(10, 4, 2, "anchored") == [(0, 4, 6), (0, 6, 8), (0, 8, 10)]
+        assert windows(5, 4, 2) == []
+
+    @pytest.mark.parametrize(
+        ("args", "message"),
+        [((120, 60, "expanding", "return"), "unknown mode"), ((120, 60, "rolling", "sharpe"), "unknown sort key")],
+    )
+    def test_invalid_options(self, args, message):
+        with pytest.raises(ValueError, match=message):
+            check_windows(*args)
+        with pytest.raises(ValueError, match="at least 2 bars"):
+            check_windows(1, 60, "rolling", "return")
+
+
+class TestWalkForward:
+    @staticmethod
+    def window_returns(strategy, params, close, low, high, start, end):
+        # 信号在整段序列上生成，窗口沿用开盘前一根 K 线的持仓
+        memo = {}
+        for key in SWEEPS[strategy].needs(params):
+            compute_series(key, close, low, high, memo)
+        signal = SWEEPS[strategy].signal(params, memo, close)
+        first = max(start - 1, 0)
+        return run_backtest(close[first:end], signal[first:end]).returns[start - first :]
+
+    @pytest.mark.parametrize(("strategy", "spec"), [("SMA", "short=3:8 long=20:40:10"), ("RSI", "lower=20:35:5")])
+    def test_windows_match_backtests(self, strategy, spec):
+        close, low, high = ohlc()
+        grid = parse_grid(strategy, spec)
+        table, _ = walk_forward(strategy, grid, close, low, high, train=120, test=60)
+        assert len(table) == (800 - 120) // 60
+        combos = combinations(strategy, grid)
+        for row in table.to_dict("records"):
+            train_start, test_start, test_end = row["train_start"], row["test_start"], row["test_end"]
+            trained = [
+                np.prod(1 + self.window_returns(strategy, p, close, low, high, train_start, test_start)) - 1
+                for p in combos
+            ]
+            assert row["train_return"] == pytest.approx(max(trained), rel=1e-12)
+            best = combos[int(np.argmax(trained))]
+            assert {name: row[name] for name in grid} == best
+            tested = self.window_returns(strategy, best, close, low, high, test_start, test_end)
+            assert row["return"] == pytest.approx(np.prod(1 + tested) - 1, rel=1e-12)
+
+    def test_warmup_bars_not_traded(self):
+        close, low, high = ohlc()
+        grid = parse_grid("SMA", "short=3:5")
+        table, result = walk_forward("SMA", grid, close, low, high, train=120, test=60, bars=500)
+        assert table["train_start"].min() >= 0 and table["test_end"].max() == 500
+        full, _ = walk_forward("SMA", grid, close[-500:], close[-500:], close[-500:], train=120, test=60)
+        assert table[["train_start", "test_start", "test_end"]].equals(full[["train_start", "test_start", "test_end"]])
+
+    def test_out_of_sample_chains_test_windows(self):
+        close, low, high = ohlc()
+        table, result = walk_forward("MACD", parse_grid("MACD", "fast=8,12"), close, low, high, train=100, test=50)
+        assert result.bars == 50 * len(table)
+        assert result.cumulative_return == pytest.approx(np.prod(1 + table["return"]) - 1)
+
+    def test_indicators_computed_once(self):
+        close, low, high = ohlc()
+        grid = parse_grid("RSI", "window=10,14 lower=20:30:5")
+        with mock.patch.object(sweep_module.kernels, "rolling_mean", wraps=sweep_module.kernels.rolling_mean) as mean:
+            table, _ = walk_forward("RSI", grid, close, low, high, train=60, test=20, mode="anchored")
+        assert len(table) > 30
+        # 与窗口数无关: 每个窗口长度的平均涨幅与平均跌幅各一次
+        assert mean.call_count == 2 * 2
+
+    def test_too_short(self):
+        close, low, high = ohlc(100)
+        table, result = walk_forward("SMA", parse_grid("SMA", ""), close, low, high, train=80, test=40)
+        assert table.empty and result.bars == 0
+
+
+class TestWalkForwardTool:
+    def setup_method(self):
+        RESULTS.clear()
+
+    def frame(self, n=500):
+        close, low, high = ohlc(n)
+        data = pd.DataFrame({"date": pd.bdate_range("2023-01-02", periods=n), "close": close, "low": low, "high": high})
+        return PriceFrame(data, source="akshare", currency="CNY")
+
+    def test_report(self):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=self.frame()) as load:
+            result = backtest_walk_forward_fn(
+                "000001", "sh", "SMA", "short=3:6 long=20,30", 400, 120, 60, "rolling", "return"
+            )
+        assert load.call_args.kwargs["limit"] == 400 + 6 + 30
+        assert "4 个窗口, 8 组参数" in result
+        assert "样本外累计收益" in result
+        table = pd.read_csv(StringIO(result.split("\n\n", 1)[1]))
+        assert table.columns[:5].tolist() == ["train_from", "test_from", "test_to", "short", "long"]
+        assert table["test_to"].iloc[-1] == str(self.frame().data["date"].iloc[-1].date())
+
+    def test_repeat_served_from_cache(self):
+        frame = self.frame()
+        with (
+            mock.patch.object(analysis_module, "load_market_prices", return_value=frame),
+            mock.patch.object(analysis_module, "walk_forward", wraps=analysis_module.walk_forward) as run,
+        ):
+            first = backtest_walk_forward_fn("600000", "sh", "RSI", "", 400, 120, 60, "rolling", "return")
+            assert backtest_walk_forward_fn("600000", "sh", "RSI", "", 400, 120, 60, "rolling", "return") == first
+            assert run.call_count == 1
+            # 其他参数与新 K 线均不命中
+            backtest_walk_forward_fn("600000", "sh", "RSI", "", 400, 120, 60, "anchored", "return")
+            assert run.call_count == 2
+        bar = frame.data.iloc[[-1]].assign(date=pd.Timestamp("2025-01-01"))
+        newer = PriceFrame(pd.concat([frame.data.iloc[1:], bar]), source="akshare", currency="CNY")
+        with (
+            mock.patch.object(analysis_module, "load_market_prices", return_value=newer),
+            mock.patch.object(analysis_module, "walk_forward", wraps=analysis_module.walk_forward) as run,
+        ):
+            backtest_walk_forward_fn("600000", "sh", "RSI", "", 400, 120, 60, "rolling", "return")
+            assert run.call_count == 1
+
+    @pytest.mark.parametrize("version", [None, "v1"])
+    def test_cold_request_counts_one_miss(self, version):
+        with (
+            mock.patch.object(analysis_module, "market_prices_version", return_value=version),
+            mock.patch.object(analysis_module, "load_market_prices", return_value=self.frame()),
+            mock.patch.multiple(RESULTS, hits=0, misses=0),
+        ):
+            backtest_walk_forward_fn("600000", "sh", "RSI", "", 400, 120, 60, "rolling", "return")
+            assert (RESULTS.hits, RESULTS.misses) == (0, 1)
+
+    def test_invalid_input(self):
+        with mock.patch.object(analysis_module, "load_market_prices") as load:
+            assert "不支持" in backtest_walk_forward_fn("000001", "sh", "FOO", "", 400, 120, 60, "rolling", "return")
+            result = backtest_walk_forward_fn("000001", "sh", "SMA", "", 400, 120, 60, "expanding", "return")
+            assert result.startswith("error,") and "unknown mode" in result
+            result = backtest_walk_forward_fn("000001", "sh", "SMA", "fast=3", 400, 120, 60, "rolling", "return")
+            assert "unknown parameter" in result
+        load.assert_not_called()
+
+    def test_not_enough_bars(self):
+        with mock.patch.object(analysis_module, "load_market_prices", return_value=self.frame(100)):
+            result = backtest_walk_forward_fn("000001", "sh", "SMA", "", 400, 120, 60, "rolling", "return")
+        assert "需要至少 180 根K线" in result
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])